@@ -11,6 +11,7 @@ from rich import print
 from sfaira.commands.annotate_dataloader import DataloaderAnnotater
 from sfaira.commands.cache_control import CacheControl
 from sfaira.commands.export_h5ad import H5adExport
+from sfaira.commands.store import StoreBuilder, StoreRechunker
 from sfaira.commands.submit_pullrequest import PullRequestHandler
 from sfaira.commands.test_dataloader import DataloaderTester
 from sfaira.commands.utils import doi_lint
@@ -20,6 +21,7 @@ from sfaira.commands.validate_h5ad import H5adValidator
 from sfaira import __version__
 from sfaira.commands.create_dataloader import DataloaderCreator
 from sfaira.commands.upgrade import UpgradeCommand
+from sfaira.data.store.io.rechunk_dao import COMPRESSION_OBJECTIVES, COMPRESSORS
 
 WD = os.path.dirname(__file__)
 log = logging.getLogger()
@@ -280,6 +282,136 @@ def validate_h5ad(h5ad, schema) -> None:
     h5ad_validator.validate()
 
 
+@sfaira_cli.group()
+def store() -> None:
+    """Manages sfaira data stores."""
+
+
+_store_options = [
+    click.option('--path-store', type=click.Path(exists=True), required=True,
+                 help='Absolute path of the dao store directory.'),
+    click.option('--compressor', type=click.Choice(COMPRESSORS), default=None,
+                 help='Compressor of .X, defaults to the compressor of each data set.'),
+    click.option('--clevel', type=int, default=None, help='Compression level, defaults to the level of the codec.'),
+    click.option('--layout', type=click.Choice(["dense", "sparse"]), default=None,
+                 help='Layout of .X, defaults to the layout of each data set.'),
+]
+
+
+def _add_options(options):
+    def wrapper(fn):
+        for option in reversed(options):
+            fn = option(fn)
+        return fn
+    return wrapper
+
+
+@store.command()
+@_add_options(_store_options)
+@click.option('--chunks-obs', type=int, multiple=True, default=[64, 128, 256, 512, 1024], show_default=True,
+              help='Observation chunk sizes to compare, can be given multiple times.')
+@click.option('--batch-size', type=int, default=128, show_default=True, help='Observations per mini-batch.')
+@click.option('--contiguous', is_flag=True, default=False,
+              help='Benchmark contiguous instead of random mini-batches.')
+def benchmark_chunks(path_store, compressor, clevel, layout, chunks_obs, batch_size, contiguous) -> None:
+    """Recommends an observation chunk size based on the mini-batch read throughput."""
+    rechunker = StoreRechunker(path_store=path_store, compressor=compressor, clevel=clevel,
+                               dense=None if layout is None else layout == "dense")
+    rechunker.benchmark(chunks_obs=tuple(chunks_obs), batch_size=batch_size, random_access=not contiguous)
+
+
+@store.command()
+@click.option('--path-store', type=click.Path(exists=True), required=True,
+              help='Absolute path of the dao store directory.')
+@click.option('--compressors', type=click.Choice([x for x in COMPRESSORS if x != "default"]), multiple=True,
+              default=["none", "lz4", "zstd", "gzip", "blosc-lz4", "blosc-zstd"], show_default=True,
+              help='Compressors to compare, can be given multiple times.')
+@click.option('--clevels', type=int, multiple=True, default=[],
+              help='Compression levels to compare, can be given multiple times. Uses the level of each codec if not '
+                   'given.')
+@click.option('--layout', type=click.Choice(["dense", "sparse"]), default=None,
+              help='Layout of .X, defaults to the layout of the benchmarked data set.')
+@click.option('--objective', type=click.Choice(COMPRESSION_OBJECTIVES), default="balanced", show_default=True,
+              help='Objective by which the compressor is recommended.')
+@click.option('--batch-size', type=int, default=128, show_default=True, help='Observations per mini-batch.')
+def benchmark_compressors(path_store, compressors, clevels, layout, objective, batch_size) -> None:
+    """Compares write time, size and read throughput of compressors and recommends one for an objective."""
+    rechunker = StoreRechunker(path_store=path_store, dense=None if layout is None else layout == "dense")
+    rechunker.benchmark_compressors(compressors=tuple(compressors), clevels=tuple(clevels) if clevels else (None, ),
+                                    objective=objective, batch_size=batch_size)
+
+
+@store.command()
+@click.option('--path-store', type=click.Path(), required=True,
+              help='Absolute path of the dao store directory, created if it does not exist.')
+@click.option('--h5ad-dir', type=click.Path(exists=True), default=None,
+              help='Directory with streamlined .h5ad files, one per data set.')
+@click.option('--path-data', type=click.Path(exists=True), default=None,
+              help='Data directory of the data loaders, builds from the data loaders if --h5ad-dir is not given.')
+@click.option('--path-meta', type=click.Path(), default=None, help='Meta data directory of the data loaders.')
+@click.option('--path-cache', type=click.Path(), default=None, help='Cache directory of the data loaders.')
+@click.option('--dataset-id', type=str, multiple=True, default=[],
+              help='Data loader data set to build, can be given multiple times. Builds all data sets if not given.')
+@click.option('--match-to-release', type=str, default="104", show_default=True,
+              help='Genome release that data loader features are streamlined to.')
+@click.option('--subset-genes-to-type', type=str, default="protein_coding", show_default=True,
+              help='Gene type that data loader features are subset to.')
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='Number of processes, each process writes one data set at a time.')
+@click.option('--max-memory', type=float, default=None,
+              help='Upper bound in MB on the memory used for data sets in all processes.')
+@click.option('--num-workers', type=int, default=1, show_default=True,
+              help='Number of threads per process that write .X.')
+@click.option('--chunks-obs', type=int, default=128, show_default=True, help='Observation chunk size of .X.')
+@click.option('--compressor', type=click.Choice(COMPRESSORS), default=None,
+              help='Compressor of .X, defaults to the zarr default compressor.')
+@click.option('--clevel', type=int, default=None, help='Compression level, defaults to the level of the codec.')
+@click.option('--layout', type=click.Choice(["dense", "sparse"]), default="sparse", show_default=True,
+              help='Layout of .X.')
+@click.option('--dtype', type=str, default=None,
+              help='Data type of .X on disk, e.g. counts or float16, defaults to the data type of each data set.')
+@click.option('--shuffle-data', is_flag=True, default=False, help='Shuffle the observations of each data set.')
+@click.option('--csc', is_flag=True, default=False, help='Write a feature-major copy of .X.')
+@click.option('--ontology-index', is_flag=True, default=False,
+              help='Write the ontology-closure index of .obs that is used to subset by ontology terms.')
+def build(path_store, h5ad_dir, path_data, path_meta, path_cache, dataset_id, match_to_release, subset_genes_to_type,
+          processes, max_memory, num_workers, chunks_obs, compressor, clevel, layout, dtype, shuffle_data,
+          csc, ontology_index) -> None:
+    """Builds a dao store from a directory of .h5ad files or from data loaders, resumes interrupted builds."""
+    if (h5ad_dir is None) == (path_data is None):
+        print("[bold red]Error: Give exactly one of --h5ad-dir and --path-data.")
+        sys.exit(1)
+    builder = StoreBuilder(path_store=path_store, compressor=compressor, clevel=clevel, processes=processes,
+                           max_memory=max_memory)
+    kwargs = {"chunks": chunks_obs, "dense": layout == "dense", "shuffle_data": shuffle_data, "csc": csc,
+              "dtype": dtype, "ontology_index": ontology_index, "num_workers": num_workers}
+    if h5ad_dir is not None:
+        complete = builder.build_from_h5ad(h5ad_dir=h5ad_dir, **kwargs)
+    else:
+        complete = builder.build_from_universe(data_path=path_data, meta_path=path_meta, cache_path=path_cache,
+                                               dataset_ids=list(dataset_id), match_to_release=match_to_release,
+                                               subset_genes_to_type=subset_genes_to_type, **kwargs)
+    if not complete:
+        sys.exit(1)
+
+
+@store.command()
+@_add_options(_store_options)
+@click.option('--chunks-obs', type=int, default=None,
+              help='Observation chunk size of .X, benchmarked with benchmark-chunks defaults if not given.')
+@click.option('--num-workers', type=int, default=1, show_default=True, help='Number of threads that write .X.')
+@click.option('--max-memory', type=float, default=None, help='Upper bound in MB on blocks of .X held in memory.')
+@click.option('--vacuum', is_flag=True, default=False, help='Delete the directories of the rechunked data sets.')
+def rechunk(path_store, compressor, clevel, layout, chunks_obs, num_workers, max_memory, vacuum) -> None:
+    """Rewrites .X of all data sets in a dao store to a new chunk size, compressor or layout."""
+    rechunker = StoreRechunker(path_store=path_store, compressor=compressor, clevel=clevel,
+                               dense=None if layout is None else layout == "dense", num_workers=num_workers,
+                               max_memory=max_memory)
+    if chunks_obs is None:
+        chunks_obs = rechunker.benchmark(chunks_obs=(64, 128, 256, 512, 1024), batch_size=128, random_access=True)
+    rechunker.rechunk(chunks_obs=chunks_obs, vacuum=vacuum)
+
+
 if __name__ == "__main__":
     traceback.install()
     sys.exit(main())  # pragma: no cover
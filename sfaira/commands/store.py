@@ -0,0 +1,177 @@
+import functools
+import logging
+
+import os
+import pandas as pd
+from rich import print
+from rich.table import Table
+from typing import List, Tuple, Union
+
+from sfaira.data.store.io.build_dao import build_dao_store
+from sfaira.data.store.io.catalog import read_catalog
+from sfaira.data.store.io.rechunk_dao import benchmark_chunks, benchmark_compressors, compression_kwargs_from_name, \
+    rechunk_store, select_compressor
+from sfaira.data.store.io.update_dao import vacuum_dao
+
+log = logging.getLogger(__name__)
+
+
+class StoreRechunker:
+
+    path_store: str
+    compressor: Union[None, str]
+    clevel: Union[None, int]
+    dense: Union[None, bool]
+    num_workers: int
+    max_memory: Union[None, float]
+
+    def __init__(self, path_store, compressor=None, clevel=None, dense=None, num_workers=1, max_memory=None):
+        self.path_store = path_store
+        self.compressor = compressor
+        self.clevel = clevel
+        self.dense = dense
+        self.num_workers = num_workers
+        self.max_memory = max_memory
+
+    @property
+    def compression_kwargs(self):
+        if self.compressor is None:
+            return None
+        return compression_kwargs_from_name(self.compressor, clevel=self.clevel)
+
+    def _largest_dataset(self) -> str:
+        catalog = read_catalog(self.path_store)
+        if catalog is None or len(catalog) == 0:
+            raise ValueError(f"did not find a dao store with a catalog in {self.path_store}")
+        name = max(catalog.keys(), key=lambda k: catalog[k]["shape"][0])
+        return name
+
+    def benchmark(self, chunks_obs: Tuple[int, ...], batch_size: int, random_access: bool) -> int:
+        """
+        Benchmarks chunk sizes on the largest data set in the store and returns the recommended chunk size.
+        """
+        name = self._largest_dataset()
+        print(f"[bold blue]Benchmarking chunk sizes on data set {name}.")
+        chunks_obs_best, throughput = benchmark_chunks(
+            store=os.path.join(self.path_store, name), chunks_obs=chunks_obs, batch_size=batch_size,
+            random_access=random_access, compression_kwargs=self.compression_kwargs, dense=self.dense)
+        table = Table(title="Mini-batch read throughput")
+        table.add_column("chunk size", justify="right")
+        table.add_column("observations / s", justify="right")
+        for k, v in throughput.items():
+            table.add_row(str(k), f"{v:.0f}", style="green" if k == chunks_obs_best else None)
+        print(table)
+        print(f"[bold blue]Recommended chunk size: {chunks_obs_best}")
+        return chunks_obs_best
+
+    def benchmark_compressors(self, compressors: Tuple[str, ...], clevels: Tuple[Union[None, int], ...],
+                              objective: str, batch_size: int) -> Tuple[str, Union[None, int]]:
+        """
+        Benchmarks compressors on the largest data set in the store and returns the compressor and compression level
+        that are best for the objective.
+        """
+        name = self._largest_dataset()
+        print(f"[bold blue]Benchmarking compressors on data set {name}.")
+        results = benchmark_compressors(x=os.path.join(self.path_store, name), compressors=compressors,
+                                        clevels=clevels, dense=self.dense, batch_size=batch_size)
+        compressor_best, clevel_best = select_compressor(results=results, objective=objective)
+        table = Table(title="Compressors")
+        for column in ["compressor", "level", "write (s)", "size (MB)", "ratio", "random reads (obs / s)",
+                       "sequential reads (obs / s)"]:
+            table.add_column(column, justify="left" if column == "compressor" else "right")
+        for _, x in results.iterrows():
+            clevel = None if pd.isna(x["clevel"]) else int(x["clevel"])
+            best = x["compressor"] == compressor_best and clevel == clevel_best
+            table.add_row(x["compressor"], "default" if clevel is None else str(clevel), f"{x['write_s']:.2f}",
+                          f"{x['size_mb']:.2f}", f"{x['ratio']:.2f}", f"{x['random_obs_per_s']:.0f}",
+                          f"{x['sequential_obs_per_s']:.0f}", style="green" if best else None)
+        print(table)
+        print(f"[bold blue]Recommended compressor for objective {objective}: {compressor_best}" +
+              ("" if clevel_best is None else f" with level {clevel_best}"))
+        return compressor_best, clevel_best
+
+    def rechunk(self, chunks_obs: int, vacuum: bool = False):
+        names = rechunk_store(path_store=self.path_store, chunks_obs=chunks_obs,
+                              compression_kwargs=self.compression_kwargs, dense=self.dense,
+                              num_workers=self.num_workers, max_memory=self.max_memory)
+        print(f"[bold blue]Rechunked {len(names)} data sets to chunk size {chunks_obs}.")
+        if vacuum:
+            deleted = vacuum_dao(path_store=self.path_store)
+            print(f"[bold blue]Deleted {len(deleted)} retired data set directories.")
+
+
+def _streamline(dataset, match_to_release: Union[None, str], subset_genes_to_type: Union[None, str]):
+    """
+    Streamlines features and meta data of a loaded data set before it is written to a store.
+    """
+    dataset.streamline_features(
+        remove_gene_version=True,
+        match_to_release={"Homo sapiens": match_to_release, "Mus musculus": match_to_release}
+        if match_to_release is not None else None,
+        subset_genes_to_type=subset_genes_to_type,
+    )
+    dataset.streamline_metadata(schema="sfaira", clean_obs=True, clean_var=True, clean_uns=True, clean_obs_names=True)
+
+
+class StoreBuilder:
+
+    path_store: str
+    compressor: Union[None, str]
+    clevel: Union[None, int]
+    processes: int
+    max_memory: Union[None, float]
+
+    def __init__(self, path_store, compressor=None, clevel=None, processes=1, max_memory=None):
+        self.path_store = path_store
+        self.compressor = compressor
+        self.clevel = clevel
+        self.processes = processes
+        self.max_memory = max_memory
+
+    @property
+    def compression_kwargs(self):
+        if self.compressor is None:
+            return None
+        return compression_kwargs_from_name(self.compressor, clevel=self.clevel)
+
+    def _report(self, report: pd.DataFrame) -> bool:
+        """
+        Prints summary of a build and returns whether all data sets are in the store.
+        """
+        table = Table(title=f"Build of {self.path_store}")
+        table.add_column("status")
+        table.add_column("data sets", justify="right")
+        table.add_column("observations", justify="right")
+        for status in ["written", "skipped", "failed"]:
+            report_i = report.loc[report["status"] == status, :]
+            table.add_row(status, str(report_i.shape[0]),
+                          str(int(report_i["n_obs"].sum())) if status == "written" else "",
+                          style="red" if status == "failed" and report_i.shape[0] > 0 else None)
+        print(table)
+        failed = report.loc[report["status"] == "failed", "id"].tolist()
+        if len(failed) > 0:
+            print(f"[bold red]Failed to write {len(failed)} data sets, build again to retry: {', '.join(failed)}")
+        return len(failed) == 0
+
+    def build_from_h5ad(self, h5ad_dir: str, **kwargs) -> bool:
+        print(f"[bold blue]Building store {self.path_store} from {h5ad_dir}.")
+        report = build_dao_store(path_store=self.path_store, source=h5ad_dir, processes=self.processes,
+                                 max_memory=self.max_memory, compression_kwargs=self.compression_kwargs, **kwargs)
+        return self._report(report)
+
+    def build_from_universe(self, data_path: str, meta_path: str, cache_path: str, dataset_ids: List[str],
+                            match_to_release: Union[None, str], subset_genes_to_type: Union[None, str],
+                            **kwargs) -> bool:
+        # Import here to avoid loading data loaders for other commands.
+        from sfaira.data.dataloaders import Universe
+        universe = Universe(data_path=data_path, meta_path=meta_path, cache_path=cache_path)
+        if len(dataset_ids) > 0:
+            universe.subset(key="id", values=dataset_ids)
+        print(f"[bold blue]Building store {self.path_store} from {len(universe.datasets)} data sets.")
+        report = build_dao_store(
+            path_store=self.path_store, source=universe, processes=self.processes, max_memory=self.max_memory,
+            compression_kwargs=self.compression_kwargs, load_kwargs={"load_raw": False, "allow_caching": True},
+            prepare=functools.partial(_streamline, match_to_release=match_to_release,
+                                      subset_genes_to_type=subset_genes_to_type),
+            **kwargs)
+        return self._report(report)
@@ -2,9 +2,9 @@ from sfaira.data.dataloaders.base import DatasetBase, DatasetGroup, DatasetGroup
     DatasetSuperGroup
 from sfaira.data.store import load_store, \
     StoreSingleFeatureSpace, \
-    StoreAnndata, StoreDao, \
+    StoreAnndata, StoreDao, StoreMemmap, \
     StoreMultipleFeatureSpaceBase, \
-    StoresAnndata, StoresDao, StoresH5ad
+    StoresAnndata, StoresDao, StoresH5ad, StoresMemmap
 from . import dataloaders
 from .dataloaders import Universe
 from .interactive import DatasetInteractive
@@ -22,7 +22,11 @@ from sfaira.versions.metadata import Ontology, OntologyHierarchical, CelltypeUni
 from sfaira.consts import AdataIds, AdataIdsCellxgene_v2_0_0, AdataIdsSfaira, META_DATA_FIELDS, OCS
 from sfaira.data.dataloaders.base.utils import identify_tsv
 from sfaira.data.dataloaders.export_adaptors import cellxgene_export_adaptor
-from sfaira.data.store.io.io_dao import write_dao
+from sfaira.data.store.io.catalog import read_catalog
+from sfaira.data.store.io.io_dao import _chunks_obs, write_dao
+from sfaira.data.store.io.io_memmap import write_memmap
+from sfaira.data.store.io.rechunk_dao import auto_compression_kwargs
+from sfaira.data.store.io.update_dao import append_dao
 from sfaira.data.dataloaders.base.utils import is_child, get_directory_formatted_doi
 from sfaira.data.utils import collapse_matrix, read_yaml, subset_adata_genes
 from sfaira.consts.utils import clean_id_str
@@ -1054,7 +1058,14 @@ class DatasetBase(abc.ABC):
             dense: bool = False,
             compression_kwargs: Union[dict, None] = None,
             chunks: Union[int, None] = None,
-            shuffle_data: bool = False
+            shuffle_data: bool = False,
+            num_workers: int = 1,
+            max_memory: Union[float, None] = None,
+            incremental: bool = False,
+            csc: bool = False,
+            dtype: Union[str, None] = None,
+            compression_objective: Union[str, None] = None,
+            ontology_index: bool = False,
     ):
         """
         Write data set into a format that allows distributed access to data set on disk.
@@ -1069,7 +1080,10 @@ class DatasetBase(abc.ABC):
                 Note on compression: .h5ad supports sparse data with is a good compression that gives fast row-wise
                     access if the files are csr, so further compression potentially not necessary.
             - "dao": Distributed access optimised format, recommended for batched access in optimisation, for example.
+            - "memmap": Uncompressed, memory-mapped .X, see sfaira.data.store.io.io_memmap. Fastest random access
+                on local disks at the cost of disk space, .X is always written dense.
         :param dense: Whether to write sparse or dense store, this will be homogenously enforced.
+            For store_format=="dao", sparse stores save .X as csr matrix in a zarr group chunked along observations.
         :param compression_kwargs: Compression key word arguments to give to h5py or zarr
             For store_format=="h5ad", see also anndata.AnnData.write_h5ad:
                 - compression,
@@ -1084,6 +1098,24 @@ class DatasetBase(abc.ABC):
             Only relevant for store=="dao". The feature dimension of the chunks is always is the full feature space.
             Uses zarr default chunking across both axes if None.
         :param shuffle_data: If True -> shuffle ordering of cells in datasets before writing store
+        :param num_workers: Number of threads used to compress and write chunks of .X.
+            Only relevant for store=="dao" and store=="memmap".
+        :param max_memory: Upper bound in MB on the size of blocks of .X held in memory at the same time while writing.
+            Only relevant for store=="dao" and store=="memmap".
+        :param incremental: Whether to skip this data set if it is already in the store and to otherwise add it to the
+            store transactionally, see sfaira.data.store.io.update_dao.append_dao(). Other data sets in the store are
+            not touched. Only relevant for store=="dao".
+        :param csc: Whether to write a feature-major copy of .X for fast queries of a few features across all
+            observations, see sfaira.data.store.io.io_dao.write_dao(). Only relevant for store=="dao".
+        :param dtype: Data type of .X on disk, e.g. "counts" to pack count matrices into the smallest unsigned integer
+            type that holds the largest count, see sfaira.data.store.io.io_dao.write_dao().
+            Only relevant for store=="dao" and store=="memmap".
+        :param compression_objective: Objective by which the compressor of .X is selected, e.g. "balanced", "size" or
+            "random_read". Compressors are benchmarked on a sample of each data set and the selected compressor
+            replaces the compressor in compression_kwargs, see sfaira.data.store.io.rechunk_dao.select_compressor().
+            Uses compression_kwargs as given if None. Only relevant for store=="dao".
+        :param ontology_index: Whether to write the ontology-closure index of the cell-wise meta data that is used to
+            subset stores by ontology terms, see sfaira.data.store.io.ontology_index. Only relevant for store=="dao".
         """
         if compression_kwargs is None:
             compression_kwargs = {}
@@ -1097,14 +1129,28 @@ class DatasetBase(abc.ABC):
             print(f"writing {self.adata.shape} into {fn}")
             self.adata.write_h5ad(filename=fn, as_dense=as_dense, **compression_kwargs)
         elif store_format == "dao":
-            # Convert data object to sparse / dense as required:
-            if not dense:
-                raise ValueError("WARNING: sparse zarr array performance is not be optimal and not supported yet, "
-                                 "consider writing as dense and consider that zarr arrays are compressed on disk!")
             fn = os.path.join(dir_cache, self.doi_cleaned_id)
             chunks = (chunks, self.adata.X.shape[1]) if chunks is not None else True
-            write_dao(store=fn, adata=self.adata, chunks=chunks, compression_kwargs=compression_kwargs,
-                      shuffle_data=shuffle_data)
+            if compression_objective is not None:
+                compression_kwargs = {**compression_kwargs, **auto_compression_kwargs(
+                    x=self.adata.X, objective=compression_objective,
+                    chunks_obs=_chunks_obs(chunks=chunks, shape=self.adata.X.shape, dtype=self.adata.X.dtype),
+                    dense=dense, dir_tmp=dir_cache if os.path.isdir(dir_cache) else None)}
+            kwargs = {"chunks": chunks, "compression_kwargs": compression_kwargs, "shuffle_data": shuffle_data,
+                      "dense": dense, "num_workers": num_workers, "max_memory": max_memory, "csc": csc,
+                      "dtype": dtype, "ontology_index": ontology_index}
+            if incremental:
+                catalog = read_catalog(dir_cache)
+                if catalog is not None and self.id in [v["id"] for v in catalog.values()]:
+                    print(f"skipping {self.id}, data set is already in store {dir_cache}")
+                else:
+                    append_dao(path_store=dir_cache, adata=self.adata, name=self.doi_cleaned_id, **kwargs)
+            else:
+                write_dao(store=fn, adata=self.adata, catalog=True, **kwargs)
+        elif store_format == "memmap":
+            fn = os.path.join(dir_cache, self.doi_cleaned_id)
+            write_memmap(store=fn, adata=self.adata, shuffle_data=shuffle_data, dtype=dtype, num_workers=num_workers,
+                         max_memory=max_memory)
         else:
             raise ValueError()
 
@@ -270,6 +270,13 @@ class DatasetGroup:
             dense: bool = False,
             compression_kwargs: dict = {},
             chunks: Union[int, None] = None,
+            num_workers: int = 1,
+            max_memory: Union[float, None] = None,
+            incremental: bool = False,
+            csc: bool = False,
+            dtype: Union[str, None] = None,
+            compression_objective: Union[str, None] = None,
+            ontology_index: bool = False,
     ):
         """
         Write data set into a format that allows distributed access to data set on disk.
@@ -285,6 +292,8 @@ class DatasetGroup:
                 Note on compression: .h5ad supports sparse data with is a good compression that gives fast row-wise
                     access if the files are csr, so further compression potentially not necessary.
             - "dao": Distributed access optimised format, recommended for batched access in optimisation, for example.
+            - "memmap": Uncompressed, memory-mapped .X, see sfaira.data.store.io.io_memmap. Fastest random access
+                on local disks at the cost of disk space, .X is always written dense.
         :param dense: Whether to write sparse or dense store, this will be homogenously enforced.
         :param compression_kwargs: Compression key word arguments to give to h5py or zarr
             For store_format=="h5ad", see also anndata.AnnData.write_h5ad:
@@ -299,10 +308,31 @@ class DatasetGroup:
         :param chunks: Observation axes of chunk size of zarr array, see anndata.AnnData.write_zarr documentation.
             Only relevant for store=="dao". The feature dimension of the chunks is always is the full feature space.
             Uses zarr default chunking across both axes if None.
+        :param num_workers: Number of threads used to compress and write chunks of .X.
+            Only relevant for store=="dao" and store=="memmap".
+        :param max_memory: Upper bound in MB on the size of blocks of .X held in memory at the same time while writing.
+            Only relevant for store=="dao" and store=="memmap".
+        :param incremental: Whether to only add data sets that are not in the store yet, without rewriting the data sets
+            that are already in the store, see sfaira.data.store.io.update_dao.append_dao(). Only relevant for
+            store=="dao".
+        :param csc: Whether to write a feature-major copy of .X for fast queries of a few features across all
+            observations, see sfaira.data.store.io.io_dao.write_dao(). Only relevant for store=="dao".
+        :param dtype: Data type of .X on disk, e.g. "counts" to pack count matrices into the smallest unsigned integer
+            type that holds the largest count, see sfaira.data.store.io.io_dao.write_dao().
+            Only relevant for store=="dao" and store=="memmap".
+        :param compression_objective: Objective by which the compressor of .X is selected, e.g. "balanced", "size" or
+            "random_read". Compressors are benchmarked on a sample of each data set and the selected compressor
+            replaces the compressor in compression_kwargs, see sfaira.data.store.io.rechunk_dao.select_compressor().
+            Uses compression_kwargs as given if None. Only relevant for store=="dao".
+        :param ontology_index: Whether to write the ontology-closure index of the cell-wise meta data that is used to
+            subset stores by ontology terms, see sfaira.data.store.io.ontology_index. Only relevant for store=="dao".
         """
         for _, v in self.datasets.items():
             v.write_distributed_store(dir_cache=dir_cache, store_format=store_format, dense=dense,
-                                      compression_kwargs=compression_kwargs, chunks=chunks)
+                                      compression_kwargs=compression_kwargs, chunks=chunks,
+                                      num_workers=num_workers, max_memory=max_memory, incremental=incremental,
+                                      csc=csc, dtype=dtype, compression_objective=compression_objective,
+                                      ontology_index=ontology_index)
 
     def write_backed(
             self,
@@ -1111,6 +1141,13 @@ class DatasetSuperGroup:
             dense: bool = False,
             compression_kwargs: dict = {},
             chunks: Union[int, None] = None,
+            num_workers: int = 1,
+            max_memory: Union[float, None] = None,
+            incremental: bool = False,
+            csc: bool = False,
+            dtype: Union[str, None] = None,
+            compression_objective: Union[str, None] = None,
+            ontology_index: bool = False,
     ):
         """
         Write data set into a format that allows distributed access to data set on disk.
@@ -1126,6 +1163,8 @@ class DatasetSuperGroup:
                 Note on compression: .h5ad supports sparse data with is a good compression that gives fast row-wise
                     access if the files are csr, so further compression potentially not necessary.
             - "dao": Distributed access optimised format, recommended for batched access in optimisation, for example.
+            - "memmap": Uncompressed, memory-mapped .X, see sfaira.data.store.io.io_memmap. Fastest random access
+                on local disks at the cost of disk space, .X is always written dense.
         :param dense: Whether to write sparse or dense store, this will be homogenously enforced.
         :param compression_kwargs: Compression key word arguments to give to h5py or zarr
             For store_format=="h5ad", see also anndata.AnnData.write_h5ad:
@@ -1140,10 +1179,31 @@ class DatasetSuperGroup:
         :param chunks: Observation axes of chunk size of zarr array, see anndata.AnnData.write_zarr documentation.
             Only relevant for store=="dao". The feature dimension of the chunks is always is the full feature space.
             Uses zarr default chunking across both axes if None.
+        :param num_workers: Number of threads used to compress and write chunks of .X.
+            Only relevant for store=="dao" and store=="memmap".
+        :param max_memory: Upper bound in MB on the size of blocks of .X held in memory at the same time while writing.
+            Only relevant for store=="dao" and store=="memmap".
+        :param incremental: Whether to only add data sets that are not in the store yet, without rewriting the data sets
+            that are already in the store, see sfaira.data.store.io.update_dao.append_dao(). Only relevant for
+            store=="dao".
+        :param csc: Whether to write a feature-major copy of .X for fast queries of a few features across all
+            observations, see sfaira.data.store.io.io_dao.write_dao(). Only relevant for store=="dao".
+        :param dtype: Data type of .X on disk, e.g. "counts" to pack count matrices into the smallest unsigned integer
+            type that holds the largest count, see sfaira.data.store.io.io_dao.write_dao().
+            Only relevant for store=="dao" and store=="memmap".
+        :param compression_objective: Objective by which the compressor of .X is selected, e.g. "balanced", "size" or
+            "random_read". Compressors are benchmarked on a sample of each data set and the selected compressor
+            replaces the compressor in compression_kwargs, see sfaira.data.store.io.rechunk_dao.select_compressor().
+            Uses compression_kwargs as given if None. Only relevant for store=="dao".
+        :param ontology_index: Whether to write the ontology-closure index of the cell-wise meta data that is used to
+            subset stores by ontology terms, see sfaira.data.store.io.ontology_index. Only relevant for store=="dao".
         """
         for x in self.dataset_groups:
             x.write_distributed_store(dir_cache=dir_cache, store_format=store_format, dense=dense,
-                                      compression_kwargs=compression_kwargs, chunks=chunks)
+                                      compression_kwargs=compression_kwargs, chunks=chunks,
+                                      num_workers=num_workers, max_memory=max_memory, incremental=incremental,
+                                      csc=csc, dtype=dtype, compression_objective=compression_objective,
+                                      ontology_index=ontology_index)
 
     def streamline_metadata(
             self,
@@ -1,5 +1,5 @@
 from sfaira.data.store.io.load_store import load_store
 from sfaira.data.store.stores import StoreSingleFeatureSpace, \
-    StoreAnndata, StoreDao, \
+    StoreAnndata, StoreDao, StoreMemmap, \
     StoreMultipleFeatureSpaceBase, \
-    StoresAnndata, StoresDao, StoresH5ad
+    StoresAnndata, StoresDao, StoresH5ad, StoresMemmap
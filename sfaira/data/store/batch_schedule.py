@@ -1,42 +1,39 @@
+import random
 from random import shuffle
-from typing import List, Tuple
+from typing import List, Tuple, Union
 
 import numpy as np
-from numba import njit
 
 
 def _split_idx_along_arr_chunks(indicies: np.ndarray, chunks: Tuple[int]):
+    """
+    Splits sorted indices into the groups of indices that fall into the same chunk of an array, empty groups are
+    dropped.
+    """
     assert np.all(np.diff(indicies) >= 0.)  # make sure array is sorted
     assert indicies.dtype == np.int64
+    # Position of the first index in or after each chunk boundary:
+    bounds = np.searchsorted(indicies, np.cumsum(chunks)[:-1], side="left")
+    return [x for x in np.split(indicies, bounds) if len(x) > 0]
 
-    @njit
-    def split_along_array_boundaries(idxs: np.ndarray, arr_boundaries: np.ndarray):
-        idx_split = []  # variable to accumulate index groups
-
-        partition_ctr = 0
-        start_next_partition = arr_boundaries[partition_ctr]
-        idxs_partition = [np.int64(x) for x in range(0)]  # temporary variable to accumulate idxs for a index group
-        for idx in idxs:
-            if idx < start_next_partition:
-                # append idx to index group
-                idxs_partition.append(idx)
-            else:
-                # find next bigger partition
-                while idx >= start_next_partition:
-                    partition_ctr += 1
-                    start_next_partition = arr_boundaries[partition_ctr]
-                # start a new index group list
-                if len(idxs_partition) > 0:
-                    idx_split.append(idxs_partition)
-                    idxs_partition = [np.int64(x) for x in range(0)]
-                # append idx to index group
-                idxs_partition.append(idx)
-        if len(idxs_partition) > 0:
-            idx_split.append(idxs_partition)
 
-        return idx_split
+def _truncate(batches: List[np.ndarray], n: int) -> List[np.ndarray]:
+    """
+    Keeps the first n observations of a sequence of batches, batches that become empty are dropped.
+    """
+    n_cum = np.cumsum([0] + [len(x) for x in batches])
+    return [x[:(n - n0)] for x, n0 in zip(batches, n_cum[:-1]) if n0 < n]
+
 
-    return [np.array(xx) for xx in split_along_array_boundaries(indicies, np.cumsum(chunks))]
+def _split_largest(batches: List[np.ndarray], n_batches: int) -> List[np.ndarray]:
+    """
+    Splits the largest batch into two until there are n_batches batches, requires at least n_batches observations.
+    """
+    batches = list(batches)
+    while len(batches) < n_batches:
+        i = int(np.argmax([len(x) for x in batches]))
+        batches[i:(i + 1)] = np.array_split(batches[i], 2)
+    return batches
 
 
 class BatchDesignBase:
@@ -48,21 +45,56 @@ class BatchDesignBase:
     This class is centred on the property `.design` which yields a list of observation indices (arrays), where each
     array is the set of indices that map to a batch and the sequence of batches in the list encodes the sequence of
     batches during an epoch over the data.
+
+    In data-parallel jobs (world_size > 1), all ranks draw the same schedule and the batches of this schedule are
+    distributed over the ranks round-robin. All ranks emit the same number of batches and the same number of
+    observations, so that they take the same number of steps for any emission batch size and do not wait for each
+    other in collective operations. As batches of a schedule can differ in length, the shares of the ranks are either
+    padded or truncated (drop_last):
+
+        - Padding: Each rank is padded to the largest number of batches and of observations of any rank. The padding
+            observations are the first observations of the schedule, which are therefore emitted a second time per
+            epoch. The union of the shares of all ranks covers the full schedule, the shares overlap in the padding
+            observations.
+        - drop_last: Each rank is truncated to the smallest number of batches and of observations of any rank, the
+            last observations of each share are not emitted in this epoch. The shares of the ranks are disjoint but do
+            not cover the full schedule.
     """
 
     def __init__(self,
                  retrieval_batch_size: int,
                  randomized_batch_access: bool,
                  random_access: bool,
+                 rank: int = 0,
+                 world_size: int = 1,
+                 seed: Union[None, int] = None,
+                 drop_last: bool = False,
                  **kwargs):
+        """
+
+        :param rank: Rank of this process in a data-parallel job of world_size processes. Each rank emits a share of
+            the batches of each epoch, see .design_epoch().
+        :param world_size: Number of processes of a data-parallel job.
+        :param drop_last: Whether to drop the last batches of the schedule that cannot be distributed evenly over the
+            ranks, rather than to pad the schedule with its first batches, see above. Only used if world_size > 1.
+        :param seed: Seed of the schedule of the first epoch, later epochs use seed + the index of the epoch. All ranks
+            need to use the same seed, it defaults to 0 if world_size > 1. The schedule is drawn from the global random
+            state of python and numpy if None and world_size is 1.
+        """
         self.retrieval_batch_size = retrieval_batch_size
         self._batches = None
         self._idx = None
         self._batch_splits = None
         if randomized_batch_access and random_access:
             raise ValueError("Do not use randomized_batch_access and random_access.")
+        if world_size < 1 or not 0 <= rank < world_size:
+            raise ValueError(f"rank {rank} is not a rank in a world of size {world_size}")
         self.randomized_batch_access = randomized_batch_access
         self.random_access = random_access
+        self.rank = rank
+        self.world_size = world_size
+        self.seed = 0 if seed is None and world_size > 1 else seed
+        self.drop_last = drop_last
 
     @property
     def batchsplits(self) -> Tuple[int]:
@@ -77,7 +109,7 @@ class BatchDesignBase:
 
     @property
     def n_batches(self) -> int:
-        return len(self.design)
+        return len(self.design_epoch(epoch=0))
 
     @property
     def idx(self):
@@ -104,6 +136,77 @@ class BatchDesignBase:
         """
         raise NotImplementedError()
 
+    def _design_seeded(self, seed: Union[None, int]) -> List[np.ndarray]:
+        """
+        Draws .design from a seed.
+
+        The random number generators of python and numpy are re-seeded for this draw and restored afterwards, so that
+        random draws of the caller, e.g. in map functions of carts, are not affected.
+        """
+        if seed is None:
+            return self.design
+        state_python = random.getstate()
+        state_numpy = np.random.get_state()
+        random.seed(seed)
+        np.random.seed(seed % 2 ** 32)
+        try:
+            return self.design
+        finally:
+            random.setstate(state_python)
+            np.random.set_state(state_numpy)
+
+    def _shard_rank(self, batches: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Batches of .rank.
+
+        Batches are distributed over ranks round-robin. The share of each rank is then padded with the first
+        observations of the schedule or, if .drop_last, truncated, so that all ranks emit the same number of batches
+        and of observations, see BatchDesignBase.
+        """
+        if self.world_size == 1 or len(batches) == 0:
+            return batches
+        n_obs = np.array([len(x) for x in batches])
+        n_obs_rank = np.array([np.sum(n_obs[r::self.world_size]) for r in range(self.world_size)])
+        share = batches[self.rank::self.world_size]
+        if self.drop_last:
+            n_batches = len(batches) // self.world_size
+            # Observations of the first n_batches batches of each rank:
+            n_obs_rank = np.array([np.sum(n_obs[r::self.world_size][:n_batches]) for r in range(self.world_size)])
+            share = _split_largest(_truncate(share[:n_batches], n=int(np.min(n_obs_rank))), n_batches=n_batches)
+        else:
+            n_batches = -(-len(batches) // self.world_size)
+            n_pad = np.max(n_obs_rank) - n_obs_rank
+            if n_pad[self.rank] > 0:
+                # Ranks pad with consecutive observations of the schedule, so that padding observations are only
+                # repeated across ranks if the padding exceeds the schedule.
+                idx = np.concatenate(batches)
+                pad = idx[(np.sum(n_pad[:self.rank]) + np.arange(0, n_pad[self.rank])) % len(idx)]
+                share = share + [pad] if len(share) < n_batches else share[:-1] + [np.concatenate([share[-1], pad])]
+            share = _split_largest(share, n_batches=n_batches)
+        return share
+
+    def design_epoch(
+            self,
+            epoch: int,
+            shard: Union[None, Tuple[int, int]] = None,
+            seed: Union[None, int] = None
+    ) -> List[np.ndarray]:
+        """
+        Batches of one epoch that are emitted by this rank, or by a shard of this rank.
+
+        :param epoch: Index of the epoch, the schedule is drawn from seed + epoch.
+        :param shard: Index of a shard and number of shards of the batches of this rank, e.g. of worker processes of a
+            torch DataLoader. Shards are disjoint and differ by at most one batch.
+        :param seed: Seed of the first epoch, overrides .seed.
+        :returns: List of indices per batch, without empty batches.
+        """
+        seed = self.seed if seed is None else seed
+        batches = self._design_seeded(seed=None if seed is None else seed + epoch)
+        batches = self._shard_rank([x for x in batches if len(x) > 0])
+        if shard is not None:
+            batches = batches[shard[0]::shard[1]]
+        return batches
+
 
 class BatchDesignBasic(BatchDesignBase):
 
@@ -262,7 +365,13 @@ class BatchDesignBlocks(BatchDesignBase):
 
 class BatchDesignFull(BatchDesignBase):
 
-    """Emits full dataset as a single batch in each query."""
+    """
+    Emits full dataset as a single batch in each query.
+
+    In data-parallel jobs, the batch is split into world_size parts of equal length. Up to world_size - 1 observations
+    at the start of the batch are emitted a second time, by other ranks, or with drop_last, up to world_size - 1
+    observations at the end of the batch are not emitted.
+    """
 
     @property
     def design(self) -> List[np.ndarray]:
@@ -272,10 +381,67 @@ class BatchDesignFull(BatchDesignBase):
             idx = np.random.permutation(idx)
         return [idx]
 
+    def _shard_rank(self, batches: List[np.ndarray]) -> List[np.ndarray]:
+        """
+        Share of the full batch of .rank.
+
+        The batch is split into .world_size parts of equal length, padded with its first observations or, if
+        .drop_last, truncated.
+        """
+        if self.world_size == 1 or len(batches) == 0:
+            return batches
+        idx = batches[0]
+        if self.drop_last:
+            n = len(idx) // self.world_size * self.world_size
+        else:
+            n = -(-len(idx) // self.world_size) * self.world_size
+        return [np.resize(idx, n).reshape(self.world_size, -1)[self.rank]] if n > 0 else []
+
+
+class BatchDesignChunkShuffle(BatchDesignBase):
+
+    """
+    Batches of random groups of chunks, shuffled across the chunks of each group.
+
+    The chunks of the selected observations are drawn at random in groups of n_chunks chunks, each group is emitted as
+    one batch in which the observations of all chunks of the group are shuffled. Each chunk is therefore read once and
+    in full per epoch, while the observations in a batch are mixed across n_chunks random chunks. n_chunks trades the
+    memory of a batch against the quality of the shuffle: randomized_batch_access in BatchDesignBasic corresponds to
+    n_chunks=1, random_access approaches n_chunks=number of chunks.
+    Chunks are the chunks of the array on disk if these are known (.batchsplits), ie for dao stores, and runs of
+    retrieval_batch_size consecutive selected observations otherwise.
+    Use this schedule with observation-wise emission (batch_size=1) or mini-batch emission.
+    """
+
+    def __init__(self, n_chunks: int = 8, **kwargs):
+        """
+
+        :param n_chunks: Number of chunks that are read and shuffled together.
+        """
+        super(BatchDesignChunkShuffle, self).__init__(**kwargs)
+        if n_chunks < 1:
+            raise ValueError(f"n_chunks has to be at least 1, found {n_chunks}")
+        self.n_chunks = n_chunks
+
+    @property
+    def design(self) -> List[np.ndarray]:
+        if self.batchsplits is not None:
+            chunks = _split_idx_along_arr_chunks(self.idx, self.batchsplits)
+        else:
+            chunks = np.array_split(self.idx, max(len(self.idx) // self.retrieval_batch_size, 1))
+        shuffle(chunks)
+        batches = [
+            np.random.permutation(np.concatenate(chunks[i:(i + self.n_chunks)]))
+            for i in range(0, len(chunks), self.n_chunks)
+        ]
+
+        return batches
+
 
 BATCH_SCHEDULE = {
     "base": BatchDesignBasic,
     "balanced": BatchDesignBalanced,
     "blocks": BatchDesignBlocks,
+    "chunk_shuffle": BatchDesignChunkShuffle,
     "full": BatchDesignFull,
 }
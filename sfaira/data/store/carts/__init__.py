@@ -1,3 +1,3 @@
 from sfaira.data.store.carts.single import CartBase
 from sfaira.data.store.carts.multi import CartMulti
-from sfaira.data.store.carts.single import CartSingle, CartAnndata, CartDask
+from sfaira.data.store.carts.single import CartSingle, CartAnndata, CartDask, CartMemmap
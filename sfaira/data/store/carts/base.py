@@ -1,4 +1,5 @@
 from functools import partial
+from typing import Union
 
 import pandas as pd
 
@@ -62,9 +63,16 @@ class CartBase:
                 Important:
                     For model training in pytorch you need the "-loader" prefix. You can specify the arguments passed
                     to torch.utils.data.DataLoader by the dataset_kwargs dictionary.
+            If the cart emits mini-batches (checkout(batch_size=n) with n > 1), the emitted tensors already have a batch
+            dimension: Do not batch them again in the tensorflow input pipeline and pass batch_size=None to the
+            DataLoader of "torch-iter-loader".
         :param dataset_kwargs: Dict
             Parameters to pass to the constructor of torch Dataset.
-            Only relevant if generator_type in ['torch', 'torch-loader']
+            Only relevant if generator_type in ['torch', 'torch-loader'], except for "seed" in
+            ['torch-iter', 'torch-iter-loader'], see SfairaIterableDataset: In a DataLoader with multiple workers,
+            each worker emits a disjoint shard of the retrieval batches of each epoch. The seed defaults to the seed
+            of the batch schedule in data-parallel jobs, see .shared_seed, use SfairaIterableDataset.set_epoch() to
+            draw a new schedule in each epoch.
         :param shuffle_buffer: int
             If shuffle_buffer > 0 -> Use a shuffle buffer with size shuffle_buffer to shuffle output of self.iterator
             (this option is useful when using randomized_batch_access in the DaskCart)
@@ -97,7 +105,11 @@ class CartBase:
             # Only import this module if torch is used to avoid strict torch dependency:
             from sfaira.data.store.torch_dataset import SfairaIterableDataset
 
-            g = SfairaIterableDataset(iterator_fun=partial(self.iterator, repeat=repeat, shuffle_buffer=shuffle_buffer))
+            # Ranks of data-parallel jobs share the seed of their schedules, rather than the base seeds of their
+            # DataLoaders, so that their shares of each epoch are drawn from the same schedule:
+            seed = dataset_kwargs.get("seed", None)
+            g = SfairaIterableDataset(iterator_fun=partial(self.iterator, repeat=repeat, shuffle_buffer=shuffle_buffer),
+                                      seed=self.shared_seed if seed is None else seed)
             if generator_type == "torch-iter-loader":
                 g = DataLoader(g, **kwargs)
         else:
@@ -111,9 +123,19 @@ class CartBase:
         """
         raise NotImplementedError()
 
-    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0):
+    @property
+    def shared_seed(self) -> Union[None, int]:
+        """
+        Seed of the batch schedule that all ranks of a data-parallel job share, None outside of data-parallel jobs.
+        """
+        raise NotImplementedError()
+
+    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0, shard=None, seed=None):
         """
         Iterator over data matrix and meta data table, yields batches of data points.
+
+        :param shard: Index of a shard and number of shards, only retrieval batches of this shard are emitted.
+        :param seed: Seed of the batch schedule, which needs to be the same in all shards.
         """
         raise NotImplementedError()
 
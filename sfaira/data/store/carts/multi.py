@@ -1,4 +1,4 @@
-from typing import Dict
+from typing import Dict, Union
 
 import anndata
 import numpy as np
@@ -35,7 +35,7 @@ class CartMulti(CartBase):
         """
         return dict([(k, v.adata) for k, v in self.carts.items()])
 
-    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0):
+    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0, shard=None, seed=None):
         keep_repeating = True
         num_repetitions = 0
 
@@ -45,7 +45,9 @@ class CartMulti(CartBase):
                 print(f"GENERATOR: intercalating generators at ratios {ratios}")
                 # Document which generators are still yielding batches:
                 yielding = np.ones((ratios.shape[0],)) == 1.
-                iterators = [v.iterator(repeat=1, shuffle_buffer=shuffle_buffer) for v in self.carts.values()]
+                seed_i = None if seed is None else seed + num_repetitions
+                iterators = [v.iterator(repeat=1, shuffle_buffer=shuffle_buffer, shard=shard, seed=seed_i)
+                             for v in self.carts.values()]
                 while np.any(yielding):
                     # Loop over one iterator length adjusted cycle of emissions.
                     for i, (gi, n) in enumerate(zip(iterators, ratios)):
@@ -60,13 +62,22 @@ class CartMulti(CartBase):
                 keep_repeating = (num_repetitions < repeat) or (repeat <= 0)
         else:
             while keep_repeating:
+                seed_i = None if seed is None else seed + num_repetitions
                 for gi in self.carts.values():
-                    for x in gi.iterator():
+                    for x in gi.iterator(shard=shard, seed=seed_i):
                         yield x
 
                 num_repetitions += 1
                 keep_repeating = (num_repetitions < repeat) or (repeat <= 0)
 
+    @property
+    def shared_seed(self) -> Union[None, int]:
+        """
+        Seed of the batch schedules that all ranks of a data-parallel job share, None outside of data-parallel jobs.
+        """
+        seeds = [v.shared_seed for v in self.carts.values() if v.shared_seed is not None]
+        return seeds[0] if len(seeds) > 0 else None
+
     @property
     def n_batches(self) -> int:
         return int(np.sum([v.n_batches for v in self.carts.values()]))
@@ -1,15 +1,40 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import os
 import random
 from typing import Dict, List, Tuple, Union
 
 import anndata
+from anndata._core.sparse_dataset import SparseDataset
 import dask.array
+import h5py
 import numpy as np
 import pandas as pd
 import scipy.sparse
 
 from sfaira.data.store.batch_schedule import BATCH_SCHEDULE, BatchDesignBase
 from sfaira.data.store.carts.base import CartBase
-from sfaira.data.store.carts.utils import split_batch
+from sfaira.data.store.carts.utils import decode_x, rebatch, split_batch
+from sfaira.data.store.io.io_dao import _get_rows_coalesced, VirtualRowConcat
+from sfaira.data.store.obs_table import obs_to_arrow, ObsTable
+
+# Threads per cart that decode the chunks of a batch of a dao store, see CartDask:
+NUM_THREADS_DEFAULT = min(4, os.cpu_count() or 1)
+
+
+def _obs_columns(obs: Union[ObsTable, pd.DataFrame], obs_keys: List[str]) -> pd.DataFrame:
+    """
+    Columns obs_keys of .obs of the observations of a cart, indexed by increasing integers starting with zero.
+
+    Only the emitted columns of the shared .obs table of a store are converted to pandas, see
+    sfaira.data.store.obs_table.ObsTable.
+    """
+    if isinstance(obs, ObsTable):
+        return obs.select(obs_keys).to_pandas()
+    obs = obs[obs_keys]
+    # Redefine index so that .loc indexing can be used instead of .iloc indexing:
+    obs.index = np.arange(0, obs.shape[0])
+    return obs
 
 
 class _ShuffleBuffer:
@@ -48,12 +73,16 @@ class CartSingle(CartBase):
     _obs_idx: Union[np.ndarray, None]
     _batch_schedule_name: str
     batch_size: int
+    deterministic: bool
+    num_workers: int
     obs_keys: List[str]
+    prefetch: int
     schedule: BatchDesignBase
     var: pd.DataFrame
     var_idx: Union[None, np.ndarray]
 
-    def __init__(self, obs_idx, obs_keys, var, var_idx=None, batch_schedule="base", batch_size=1, map_fn=None, **kwargs):
+    def __init__(self, obs_idx, obs_keys, var, var_idx=None, batch_schedule="base", batch_size=1, map_fn=None,
+                 prefetch=0, num_workers=1, deterministic=True, **kwargs):
         """
 
         :param batch_schedule: A valid batch schedule name or a class that inherits from BatchDesignBase.
@@ -61,22 +90,34 @@ class CartSingle(CartBase):
             - "base": sfaira.data.store.batch_schedule.BatchDesignBasic
             - "balanced": sfaira.data.store.batch_schedule.BatchDesignBalanced
             - "blocks": sfaira.data.store.batch_schedule.BatchDesignBlocks
+            - "chunk_shuffle": sfaira.data.store.batch_schedule.BatchDesignChunkShuffle, the number of chunks that
+                are shuffled together is set by the keyword argument n_chunks.
             - "full":  sfaira.data.store.batch_schedule.BatchDesignFull
             - class: batch_schedule needs to be a class (not instance), subclassing BatchDesignBase.
 
-        :param batch_size: Emission batch size. Must be 1 or 0.
+        :param batch_size: Emission batch size: 0 emits the batches of the batch schedule (retrieval batches), 1 emits
+            single observations and larger values emit mini-batches of batch_size observations that are sliced from
+            the retrieval batches, see sfaira.data.store.carts.utils.rebatch().
         :param map_fn: Map function to apply to output tuple of raw generator. Each draw i from the generator is then:
             `yield map_fn(x[i, var_idx], obs[i, obs_keys])`
         :param obs_idx: np.ndarray: The observations to emit.
         :param obs_keys: .obs columns to return in the generator. These have to be a subset of the columns available
             in self.adata_by_key.
         :param var_idx: The features to emit.
+        :param prefetch: Number of retrieval batches that are read and passed through map_fn ahead of the consumer of
+            the iterator, on a thread pool of num_workers threads. Batches are read in the consumer's thread if 0.
+        :param num_workers: Number of threads that read retrieval batches if prefetch > 0.
+        :param deterministic: Whether retrieval batches are emitted in the order of the batch schedule if prefetch > 0.
+            Otherwise, batches are emitted as soon as they are read.
         :parm split_to_obs: Whether to split tensors to observation-wise slices at the emission stage of the generator.
         """
         self._obs_idx = None
         self._batch_schedule_name = batch_schedule
         self.batch_size = batch_size
+        self.deterministic = deterministic
         self.map_fn = map_fn
+        self.num_workers = num_workers
+        self.prefetch = prefetch
         self.obs_keys = obs_keys
         self.var = var
         self.var_idx = var_idx
@@ -125,6 +166,101 @@ class CartSingle(CartBase):
         """
         raise NotImplementedError()
 
+    def _map_batch(self, idx: np.ndarray) -> List[Union[Tuple, Dict]]:
+        """
+        Reads a retrieval batch and passes it through map_fn.
+
+        :param idx: Indices of observations in cart.
+        :return: Outputs of map_fn that are emitted for this batch.
+        """
+        raise NotImplementedError()
+
+    def _map_batches(self, batches: iter) -> iter:
+        """
+        Yields the outputs of ._map_batch() for a sequence of retrieval batches.
+
+        If .prefetch > 0, up to .prefetch batches are read ahead of the consumer on a thread pool, so that reading and
+        decoding of the next batches overlaps with the consumption of the current batch. The pool is owned by this
+        generator and shut down when the generator is exhausted or closed.
+        """
+        if self.prefetch <= 0:
+            for idx in batches:
+                yield self._map_batch(idx)
+            return
+        pool = ThreadPoolExecutor(max_workers=max(self.num_workers, 1))
+        in_flight = deque()
+        try:
+            for idx in batches:
+                if len(in_flight) >= self.prefetch:
+                    if self.deterministic:
+                        yield in_flight.popleft().result()
+                    else:
+                        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for x in done:
+                            in_flight.remove(x)
+                            yield x.result()
+                in_flight.append(pool.submit(self._map_batch, idx))
+            while len(in_flight) > 0:
+                if self.deterministic:
+                    yield in_flight.popleft().result()
+                else:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for x in done:
+                        in_flight.remove(x)
+                        yield x.result()
+        finally:
+            for x in in_flight:
+                x.cancel()
+            pool.shutdown(wait=False)
+
+    def _iterator(self, repeat: int, shard: Union[None, Tuple[int, int]] = None, seed: Union[None, int] = None):
+        """
+        Iterator over data matrix and meta data table, yields batches of data points.
+
+        :param shard: Index of a shard and number of shards, see BatchDesignBase.design_epoch().
+        :param seed: Seed of the schedule of the first epoch, later epochs use seed + the index of the epoch.
+        """
+        def batches():
+            keep_repeating = True
+            num_repetitions = 0
+            while keep_repeating:
+                for idx in self.schedule.design_epoch(epoch=num_repetitions, shard=shard, seed=seed):
+                    yield idx
+                num_repetitions += 1
+                keep_repeating = (num_repetitions < repeat) or (repeat <= 0)
+
+        data_tuples = (x for data_tuples in self._map_batches(batches()) for x in data_tuples)
+        if self.batch_size == 1:
+            for data_tuple in data_tuples:
+                for data_tuple_i in split_batch(x=data_tuple):
+                    yield data_tuple_i
+        elif self.batch_size > 1:
+            for data_tuple in rebatch(x=data_tuples, batch_size=self.batch_size):
+                yield data_tuple
+        else:
+            for data_tuple in data_tuples:
+                yield data_tuple
+
+    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0, shard: Union[None, Tuple[int, int]] = None,
+                 seed: Union[None, int] = None):
+        """
+        Iterator over data matrix and meta data table, yields batches of data points.
+
+        :param repeat: Number of epochs, epochs are repeated until the iterator is closed if <= 0.
+        :param shuffle_buffer: Size of a shuffle buffer on the emitted observations, only used if .batch_size is 1.
+        :param shard: Index of a shard and number of shards, e.g. of a worker process of a torch DataLoader. The
+            retrieval batches of each epoch of this rank are distributed over the shards round-robin, so that shards
+            are disjoint and differ by at most one retrieval batch. All shards need to draw the same schedule, ie use
+            the same seed, if the schedule is random.
+        :param seed: Seed of the schedule of the first epoch, later epochs use seed + the index of the epoch. Defaults
+            to the seed of the schedule, see BatchDesignBase.
+        """
+        g = self._iterator(repeat=repeat, shard=shard, seed=seed)
+        if shuffle_buffer > 2 and self.batch_size == 1:
+            return _ShuffleBuffer(g, shuffle_buffer).generator()
+        else:
+            return g
+
     @property
     def adata(self) -> anndata.AnnData:
         """
@@ -142,6 +278,13 @@ class CartSingle(CartBase):
         """Total number of selected observations in cart."""
         return len(self.obs_idx)
 
+    @property
+    def shared_seed(self) -> Union[None, int]:
+        """
+        Seed of the batch schedule that all ranks of a data-parallel job share, None outside of data-parallel jobs.
+        """
+        return self.schedule.seed if self.schedule.world_size > 1 else None
+
     @property
     def obs_idx(self):
         """
@@ -168,27 +311,51 @@ class CartAnndata(CartSingle):
 
     """
     Cart for a DistributedStoreAnndata().
+
+    Observations of backed data sets are read from the backing file in runs of contiguous observations, see
+    ._get_x().
     """
 
     adata_dict: Dict[str, anndata._core.views.ArrayView]
+    max_gap: int
     return_dense: bool
     single_object: bool
+    _obs: pd.DataFrame
+    _offsets: Dict[str, int]
+
+    def __init__(self, adata_dict, obs_keys, obs=None, return_dense=False, max_gap=16, **kwargs):
+        """
 
-    def __init__(self, adata_dict, return_dense=False, **kwargs):
+        :param obs: .obs of the concatenation of the observations in adata_dict as .obs table of the store, see
+            sfaira.data.store.obs_table.ObsTable. Assembled from adata_dict if None.
+        :param max_gap: Largest number of unselected observations between two selected observations of a backed data
+            set that are read and discarded to read both observations with one slice.
+        """
         self.return_dense = return_dense
+        self.max_gap = max_gap
         self.single_object = len(adata_dict.keys()) == 1
         self.adata_dict = adata_dict
-        super(CartAnndata, self).__init__(**kwargs)
+        if obs is None:
+            obs = ObsTable.concat(tables=dict([(k, obs_to_arrow(v.obs[obs_keys])) for k, v in adata_dict.items()]),
+                                  n_obs=[v.n_obs for v in adata_dict.values()])
+        self._obs = _obs_columns(obs=obs, obs_keys=obs_keys)
+        n_obs = [v.n_obs for v in adata_dict.values()]
+        self._offsets = dict(zip(adata_dict.keys(), np.concatenate([[0], np.cumsum(n_obs)[:-1]]).astype(np.int64)))
+        super(CartAnndata, self).__init__(obs_keys=obs_keys, **kwargs)
 
     @property
     def _obs_full(self):
         """
         Full meta data matrix (cells x meta data) that is emitted in batches by .iterator().
         """
-        return pd.concat([
-            v.obs[self.obs_keys]
-            for v in self.adata_dict.values()
-        ], axis=0, join="inner", ignore_index=True, copy=False)
+        return self._obs
+
+    def _obs_by_key(self, idx_dict: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        Rows of .obs of observations by data set key, see ._obs_idx_dict_query().
+        """
+        idx = [self._offsets[k] + np.asarray(v, dtype=np.int64) for k, v in idx_dict.items()]
+        return self._obs.iloc[np.concatenate(idx) if len(idx) > 0 else np.array([], dtype=np.int64), :]
 
     @property
     def _x_full(self):
@@ -203,64 +370,33 @@ class CartAnndata(CartSingle):
             x = x.todense()
         return x
 
-    def _iterator(self, repeat: int):
-        """
-        Iterator over data matrix and meta data table, yields batches of data points.
-        """
-        keep_repeating = True
-        num_repetitions = 0
-
-        # Speed up access to single object by skipping index overlap operations:
-        while keep_repeating:
-            batches = self.schedule.design
-            for idx_i in batches:
-                if len(idx_i) > 0:
-                    # Match adata objects that overlap to batch:
-                    idx_i_dict = self._obs_idx_dict_query(idx=idx_i)
-                    if self.batch_size == 1:
-                        # Emit each data set separately and avoid concatenation into larger chunks for emission.
-                        for k, v in idx_i_dict.items():
-                            # I) Prepare data matrix.
-                            x = self.adata_dict[k].X[v, :]
-                            x = self._parse_array(x=x, return_dense=self.return_dense)
-                            # Prepare .obs.
-                            obs = self.adata_dict[k].obs[self.obs_keys].iloc[v, :]
-                            data_tuple = self.map_fn(x, obs)
-                            for data_tuple_i in split_batch(x=data_tuple):
-                                yield data_tuple_i
-                    else:
-                        # Concatenates slices first before returning. Note that this is likely slower than emitting by
-                        # observation in most scenarios.
-                        # I) Prepare data matrix.
-                        x = [
-                            self._parse_array(self.adata_dict[k].X[v, :], return_dense=self.return_dense)
-                            for k, v in idx_i_dict.items()
-                        ]
-                        is_dense = isinstance(x[0], np.ndarray)
-                        # Concatenate blocks in observation dimension:
-                        if len(x) > 1:
-                            if is_dense:
-                                x = np.concatenate(x, axis=0)
-                            else:
-                                x = scipy.sparse.vstack(x)
-                        else:
-                            x = x[0]
-                        # Prepare .obs.
-                        obs = pd.concat([
-                            self.adata_dict[k].obs[self.obs_keys].iloc[v, :]
-                            for k, v in idx_i_dict.items()
-                        ], axis=0, join="inner", ignore_index=True, copy=False)
-                        data_tuple = self.map_fn(x, obs)
-                        yield data_tuple
-
-            num_repetitions += 1
-            keep_repeating = (num_repetitions < repeat) or (repeat <= 0)
-
-    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0):
-        if shuffle_buffer > 2 and self.batch_size == 1:
-            return _ShuffleBuffer(self._iterator(repeat=repeat), shuffle_buffer).generator()
+    def _map_batch(self, idx: np.ndarray) -> List[Union[Tuple, Dict]]:
+        """
+        Reads a retrieval batch and passes it through map_fn.
+
+        If .batch_size is 1, the observations of each data set are passed through map_fn separately to avoid the
+        concatenation of blocks that are split into observations again for emission.
+        """
+        # Match adata objects that overlap to batch:
+        idx_dict = self._obs_idx_dict_query(idx=idx)
+        if self.batch_size == 1:
+            data_tuples = []
+            for k, v in idx_dict.items():
+                x = self._parse_array(x=self._get_x(k=k, idx=v), return_dense=self.return_dense)
+                data_tuples.append(self.map_fn(x, self._obs_by_key(idx_dict={k: v})))
+            return data_tuples
+        # Concatenates slices first before returning. Note that this is likely slower than emitting by observation in
+        # most scenarios.
+        x = [
+            self._parse_array(self._get_x(k=k, idx=v), return_dense=self.return_dense)
+            for k, v in idx_dict.items()
+        ]
+        # Concatenate blocks in observation dimension:
+        if len(x) > 1:
+            x = np.concatenate(x, axis=0) if isinstance(x[0], np.ndarray) else scipy.sparse.vstack(x)
         else:
-            return self._iterator(repeat=repeat)
+            x = x[0]
+        return [self.map_fn(x, self._obs_by_key(idx_dict=idx_dict))]
 
     def move_to_memory(self):
         """
@@ -286,11 +422,7 @@ class CartAnndata(CartSingle):
         """
         Selected meta data matrix (cells x meta data) that is emitted in batches by .iterator().
         """
-        idx_dict = self._obs_idx_dict_query(idx=self.obs_idx)
-        return pd.concat([
-            self.adata_dict[k].obs[self.obs_keys].iloc[v, :]
-            for k, v in idx_dict.items()
-        ], axis=0, join="inner", ignore_index=True, copy=False)
+        return self._obs_by_key(idx_dict=self._obs_idx_dict_query(idx=self.obs_idx))
 
     @property
     def x(self):
@@ -300,7 +432,7 @@ class CartAnndata(CartSingle):
         # Assumes that .X are scipy.sparse.csr or coo
         idx_dict = self._obs_idx_dict_query(idx=self.obs_idx)
         x = scipy.sparse.vstack([
-            self._parse_array(self.adata_dict[k].X[v, :], return_dense=False)
+            self._parse_array(self._get_x(k=k, idx=v), return_dense=False)
             for k, v in idx_dict.items()
         ])
         if self.return_dense and isinstance(x, scipy.sparse.spmatrix):
@@ -309,44 +441,63 @@ class CartAnndata(CartSingle):
 
     # Methods that are specific to this child class:
 
-    @property
-    def _idx_dict_global(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
-        """
-        Indexing helper for selecting cells across a dictionary of anndata instances.
-
-        Increasing indices across data sets which can be concatenated into a single index vector with unique entries
-        for cells.
-
-        E.g.: For two data sets of 10 cells each, the return value would be
-
-            {A: ([0..9], [0..9]), B: ([0..9], [10..19])}.
-        """
-        counter = 0
-        indices = {}
-        for k, v in self.adata_dict.items():
-            indices[k] = (np.arange(0, v.n_obs), np.arange(counter, counter + v.n_obs))
-            counter += len(v)
-        return indices
-
     def _obs_idx_dict_query(self, idx: np.ndarray) -> Dict[str, np.ndarray]:
         """
         Dictionary of indices of selected observations by data set key.
 
+        Observations are routed to data sets by the offsets of the data sets in the global index, so that the cost of a
+        query only depends on the number of queried observations and data sets, not on the number of observations in
+        the data sets.
+
         :param idx: Array (global indexing) of selected observations.
+        :return: Sorted indices of observations in each data set, by data set key. Data sets without observations are
+            omitted.
         """
+        idx = np.sort(np.asarray(idx, dtype=np.int64))
         if self.single_object:
-            idx_dict = dict([(k, np.sort(idx)) for k in self.adata_dict.keys()])
-        else:
-            idx_set = set(idx)
-            # Return data set-wise index if global index is in target set.
-            idx_dict = dict([
-                (k, np.sort([x1 for x1, x2 in zip(v1, v2) if x2 in idx_set]))
-                for k, (v1, v2) in self._idx_dict_global.items()
-            ])
-            # Only retain non-empty.
-            idx_dict = dict([(k, v) for k, v in idx_dict.items() if len(v) > 0])
+            return dict([(k, idx) for k in self.adata_dict.keys()])
+        offsets = np.asarray(list(self._offsets.values()), dtype=np.int64)
+        # Position of the first queried observation of each data set:
+        bounds = np.searchsorted(idx, offsets[1:], side="left")
+        idx_dict = dict([
+            (k, v - offset)
+            for k, offset, v in zip(self._offsets.keys(), offsets, np.split(idx, bounds))
+            if len(v) > 0
+        ])
         return idx_dict
 
+    def _get_x(self, k: str, idx: np.ndarray):
+        """
+        Reads observations of .X of a data set.
+
+        Backed data sets are read from the backing file rather than through the anndata view, in runs of contiguous
+        observations of the backing file that are merged over gaps of up to .max_gap observations, see
+        sfaira.data.store.io.io_dao._get_rows_coalesced().
+
+        :param k: Data set key.
+        :param idx: Indices of observations in data set.
+        :return: Observations as numpy array or scipy.sparse matrix.
+        """
+        adata = self.adata_dict[k]
+        if not adata.isbacked:
+            return adata.X[idx, :]
+        if not adata.file.is_open:
+            adata.file.open()
+        x = adata.file["X"]
+        if isinstance(x, h5py.Group):
+            x = SparseDataset(x)
+        rows = np.asarray(idx)
+        var_idx = slice(None)
+        if adata.is_view:
+            # Map observations of the view to observations of the backing file:
+            oidx = adata._oidx
+            rows = np.arange(*oidx.indices(x.shape[0]))[rows] if isinstance(oidx, slice) else np.asarray(oidx)[rows]
+            var_idx = adata._vidx
+        x = _get_rows_coalesced(x=x, rows=rows, max_gap=self.max_gap)
+        if not (isinstance(var_idx, slice) and var_idx == slice(None)):
+            x = x[:, var_idx]
+        return x
+
     def _parse_array(self, x, return_dense):
         # Move from ArrayView to numpy if backed and dense:
         if (
@@ -368,16 +519,30 @@ class CartDask(CartSingle):
 
     """
     Cart for a DistributedStoreDao().
+
+    .X is either a virtual concatenation of the selected data sets, from which batches are read directly, see
+    sfaira.data.store.io.io_dao.VirtualRowConcat, or a dask array that is sliced and computed per batch.
+    Batches of virtual concatenations are resolved into reads of zarr chunks before they are read, and these chunks are
+    decoded on a thread pool of the cart, so that map_fn receives batches as numpy arrays or csr matrices.
     """
 
-    _x: dask.array
+    _x: Union[dask.array.Array, VirtualRowConcat]
     _obs: pd.DataFrame
+    return_dense: bool
+
+    def __init__(self, x, obs, obs_keys, return_dense=True, num_threads=NUM_THREADS_DEFAULT, **kwargs):
+        """
 
-    def __init__(self, x, obs, obs_keys, **kwargs):
+        :param obs: .obs of the observations in x, as data frame or as .obs table of the store, see
+            sfaira.data.store.obs_table.ObsTable.
+        :param num_threads: Number of threads that read and decode the zarr chunks of a batch, only used if x is a
+            virtual concatenation.
+        """
+        self.return_dense = return_dense
+        if isinstance(x, VirtualRowConcat):
+            x = x.with_threads(num_threads=num_threads)
         self._x = x
-        self._obs = obs[obs_keys]
-        # Redefine index so that .loc indexing can be used instead of .iloc indexing:
-        self._obs.index = np.arange(0, obs.shape[0])
+        self._obs = _obs_columns(obs=obs, obs_keys=obs_keys)
         super(CartDask, self).__init__(obs_keys=obs_keys, **kwargs)
 
     @property
@@ -394,48 +559,54 @@ class CartDask(CartSingle):
         """
         return self._x
 
-    def _iterator(self, repeat: int):
+    def _iterator(self, repeat: int, shard: Union[None, Tuple[int, int]] = None, seed: Union[None, int] = None):
         """
         Iterator over data matrix and meta data table, yields batches of data points.
         """
         # Can all data sets corresponding to one organism as a single array because they share the second dimension
         # and dask keeps expression data and obs out of memory.
         self.schedule.batchsplits = self._x.chunks[0]
+        x = self._x
+        if not isinstance(x, VirtualRowConcat):
+            for y in super(CartDask, self)._iterator(repeat=repeat, shard=shard, seed=seed):
+                yield y
+            return
+        # The read threads of the virtual concatenation are shared by all live iterators of this cart and are shut
+        # down once the last iterator is exhausted or closed.
+        x.acquire()
+        try:
+            for y in super(CartDask, self)._iterator(repeat=repeat, shard=shard, seed=seed):
+                yield y
+        finally:
+            x.release()
 
-        keep_repeating = True
-        num_repetitions = 0
-
-        while keep_repeating:
-            for batch_idxs in self.schedule.design:
-                if len(batch_idxs) > 0:
-                    x_i = self._x[batch_idxs, :]
-                    if self.var_idx is not None:
-                        x_i = x_i[:, self.var_idx]
-                    obs_i = self._obs.iloc[batch_idxs, :]
-                    data_tuple = self.map_fn(x_i, obs_i)
-                    if self.batch_size == 1:
-                        for data_tuple_i in split_batch(x=data_tuple):
-                            yield data_tuple_i
-                    else:
-                        yield data_tuple
+    def close(self):
+        """
+        Shuts down the read threads of the cart, also under live iterators, which create new threads on their next
+        read.
+        """
+        if isinstance(self._x, VirtualRowConcat):
+            self._x.close()
 
-            num_repetitions += 1
-            keep_repeating = (num_repetitions < repeat) or (repeat <= 0)
+    def __del__(self):
+        # ._x is not set if the constructor raised.
+        if isinstance(getattr(self, "_x", None), VirtualRowConcat):
+            self._x.close()
 
-    def iterator(self, repeat: int = 1, shuffle_buffer: int = 0):
+    def _map_batch(self, idx: np.ndarray) -> List[Union[Tuple, Dict]]:
         """
-        Iterator over data matrix and meta data table, yields batches of data points.
+        Reads a retrieval batch and passes it through map_fn.
         """
-        if shuffle_buffer > 2 and self.batch_size == 1:
-            return _ShuffleBuffer(self._iterator(repeat=repeat), shuffle_buffer).generator()
-        else:
-            return self._iterator(repeat=repeat)
+        return [self.map_fn(self._get_rows(idx), self._obs.iloc[idx, :])]
 
     def move_to_memory(self):
         """
-        Persist underlying dask array into memory in sparse.CSR format.
+        Persist underlying array into memory in sparse.CSR format.
         """
-        self._x = self._x.map_blocks(scipy.sparse.csr_matrix).persist()
+        if isinstance(self._x, VirtualRowConcat):
+            self._x = self._x.to_memory()
+        else:
+            self._x = self._x.map_blocks(scipy.sparse.csr_matrix).persist()
 
     @property
     def n_obs(self) -> int:
@@ -464,9 +635,167 @@ class CartDask(CartSingle):
 
         Note: to obtain the dask array instead of a csr matrix, use `self.x_dask`
         """
+        x = self._x[self.schedule.idx, :]
+        if self.var_idx is not None:
+            x = x[:, self.var_idx]
+        if isinstance(x, dask.array.Array):
+            x = x.compute()
+        return decode_x(x)
+
+    # Methods that are specific to this child class:
+
+    @property
+    def _x_is_sparse(self) -> bool:
+        """
+        Whether the underlying array is a sparse store, ie emits scipy.sparse matrices.
+        """
+        if isinstance(self._x, VirtualRowConcat):
+            return self._x.is_sparse
+        return isinstance(self._x._meta, scipy.sparse.spmatrix)
+
+    def _get_rows(self, idx: np.ndarray):
+        """
+        Reads a batch of observations.
+
+        :param idx: Indices of observations in cart.
+        :return: Batch as numpy array or scipy.sparse.csr_matrix, as lazy dask array if the underlying array is a dense
+            dask array.
+        """
+        x_i = self._x[idx, :]
+        if self.var_idx is not None:
+            x_i = x_i[:, self.var_idx]
+        if self._x_is_sparse:
+            # Chunks of sparse stores are csr matrices, these are emitted in memory.
+            if isinstance(x_i, dask.array.Array):
+                x_i = x_i.compute()
+            if self.return_dense:
+                x_i = x_i.toarray()
+        # Packed stores are only cast to float32 after the batch was read.
+        return decode_x(x_i)
+
+
+class CartMemmap(CartSingle):
+
+    """
+    Cart for a StoreMemmap().
+
+    Observations are routed to the memory-mapped arrays of the selected data sets, contiguous runs of observations are
+    emitted as views on these arrays.
+    """
+
+    _x: List[np.ndarray]
+    _idx: List[np.ndarray]
+    _offsets: np.ndarray
+    _obs: pd.DataFrame
+    return_dense: bool
+
+    def __init__(self, x_by_key, idx_by_key, obs, obs_keys, return_dense=True, **kwargs):
+        """
+
+        :param x_by_key: Memory-mapped .X by data set key.
+        :param idx_by_key: Selected observations by data set key, rows of the concatenation of these observations are
+            emitted.
+        :param obs: .obs of the concatenation of the selected observations, as data frame or as .obs table of the
+            store, see sfaira.data.store.obs_table.ObsTable.
+        """
+        self.return_dense = return_dense
+        self._x = [x_by_key[k] for k in idx_by_key.keys()]
+        self._idx = [np.asarray(v) for v in idx_by_key.values()]
+        self._offsets = np.concatenate([[0], np.cumsum([len(v) for v in self._idx])]).astype(np.int64)
+        self._obs = _obs_columns(obs=obs, obs_keys=obs_keys)
+        super(CartMemmap, self).__init__(obs_keys=obs_keys, **kwargs)
+
+    @property
+    def _obs_full(self):
+        """
+        Full meta data matrix (cells x meta data) that is emitted in batches by .iterator().
+        """
+        return self._obs
+
+    @property
+    def _x_full(self):
+        """
+        Full data matrix (cells x features) that is emitted in batches by .iterator().
+        """
+        return self._get_rows(np.arange(0, self.n_obs))
+
+    def _map_batch(self, idx: np.ndarray) -> List[Union[Tuple, Dict]]:
+        """
+        Reads a retrieval batch and passes it through map_fn.
+        """
+        return [self.map_fn(self._get_rows(idx), self._obs.iloc[idx, :])]
+
+    def move_to_memory(self):
+        """
+        Load selected observations of memory-mapped arrays into memory.
+        """
+        self._x = [np.asarray(x[idx, :]) for x, idx in zip(self._x, self._idx)]
+        self._idx = [np.arange(0, len(idx)) for idx in self._idx]
+
+    @property
+    def n_obs(self) -> int:
+        """Total number of observations in cart."""
+        return int(self._offsets[-1])
+
+    @property
+    def n_var(self) -> int:
+        """Total number of features defined for return in cart."""
         if self.var_idx is None:
-            return self._x[self.schedule.idx, :].compute()
+            return self._x[0].shape[1]
         else:
-            return self._x[self.schedule.idx, :][:, self.var_idx].compute()
+            return len(self.var_idx)
+
+    @property
+    def obs(self):
+        """
+        Selected meta data matrix (cells x meta data) that is emitted in batches by .iterator().
+        """
+        return self._obs.iloc[self.schedule.idx, :]
+
+    @property
+    def x(self):
+        """
+        Selected data matrix (cells x features) that is emitted in batches by .iterator().
+        """
+        return self._get_rows(self.schedule.idx)
 
     # Methods that are specific to this child class:
+
+    def _get_rows(self, idx: np.ndarray):
+        """
+        Reads observations from the memory-mapped arrays in the order of idx.
+
+        :param idx: Global indices of observations in cart.
+        :return: Observations as numpy array, or as csr matrix if not .return_dense. This is a view on a memory-mapped
+            array if idx is a contiguous run of observations in one data set, .var_idx is None and the store is not
+            saved in a packed data type.
+        """
+        idx = np.asarray(idx)
+        if len(idx) == 0:
+            x = decode_x(np.zeros((0, self._x[0].shape[1]), dtype=self._x[0].dtype))
+            x = x[:, self.var_idx] if self.var_idx is not None else x
+            return x if self.return_dense else scipy.sparse.csr_matrix(x)
+        order = np.argsort(idx, kind="stable")
+        idx_sorted = idx[order]
+        # Data set of each observation:
+        ds = np.searchsorted(self._offsets, idx_sorted, side="right") - 1
+        bounds = np.concatenate([[0], np.where(np.diff(ds) != 0)[0] + 1, [len(ds)]])
+        blocks = []
+        for s, e in zip(bounds[:-1], bounds[1:]):
+            d = ds[s]
+            rows = self._idx[d][idx_sorted[s:e] - self._offsets[d]]
+            if rows[-1] - rows[0] + 1 == len(rows):
+                # Contiguous run of observations: slice is a view on the memory-mapped array.
+                x_d = self._x[d][rows[0]:rows[-1] + 1, :]
+            else:
+                x_d = self._x[d][rows, :]
+            blocks.append(x_d)
+        x = blocks[0] if len(blocks) == 1 else np.concatenate(blocks, axis=0)
+        if np.any(order != np.arange(0, len(order))):
+            x = x[np.argsort(order), :]
+        if self.var_idx is not None:
+            x = x[:, self.var_idx]
+        x = decode_x(x)
+        if not self.return_dense:
+            x = scipy.sparse.csr_matrix(x)
+        return x
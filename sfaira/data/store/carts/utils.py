@@ -1,6 +1,88 @@
-from typing import Union, Tuple, Dict
+from typing import Callable, Iterable, List, Union, Tuple, Dict
 
+import numpy as np
 import pandas as pd
+import scipy.sparse
+
+from sfaira.data.store.io.io_dao import PACKED_COUNT_DTYPES
+
+
+def decode_x(x):
+    """
+    Casts batches of .X of stores that are saved in a packed data type to float32, see
+    sfaira.data.store.io.io_dao.write_dao(dtype=...).
+
+    :param x: Batch as numpy array, scipy.sparse matrix or dask array.
+    :return: Batch, cast to float32 if it has a packed count data type or float16.
+    """
+    if x.dtype in PACKED_COUNT_DTYPES or x.dtype == np.float16:
+        return x.astype(np.float32)
+    return x
+
+
+def _batch_dim(x: Union[Tuple, Dict]) -> int:
+    """
+    Number of observations in a data tuple or dict emitted by map_fn.
+    """
+    if isinstance(x, tuple):
+        return x[0][0].shape[0] if isinstance(x[0], tuple) else x[0].shape[0]
+    elif isinstance(x, dict):
+        return x[list(x.keys())[0]].shape[0]
+    else:
+        raise ValueError('Batches have to be either a Tuple or a Dict')
+
+
+def _map_tensors(fn: Callable, x: List[Union[Tuple, Dict]]) -> Union[Tuple, Dict]:
+    """
+    Applies fn to the lists of corresponding tensors of data tuples or dicts of the same structure.
+
+    :param fn: Function that maps a list of tensors to a tensor.
+    :param x: Data tuples of length 1 or 2 of tensors or of tuples of tensors, or dicts of tensors, see split_batch().
+    :return: Data tuple or dict of the structure of the elements of x.
+    """
+    x0 = x[0]
+    if isinstance(x0, tuple):
+        return tuple([
+            tuple([fn([z[i][j] for z in x]) for j in range(len(y))]) if isinstance(y, tuple) else fn([z[i] for z in x])
+            for i, y in enumerate(x0)
+        ])
+    elif isinstance(x0, dict):
+        return dict([(k, fn([z[k] for z in x])) for k in x0.keys()])
+    else:
+        raise ValueError('Batches have to be either a Tuple or a Dict')
+
+
+def _slice_rows(x, start: int, end: int):
+    return x.iloc[start:end] if isinstance(x, pd.DataFrame) else x[start:end]
+
+
+def _concat_rows(x: list):
+    if isinstance(x[0], pd.DataFrame):
+        return pd.concat(x, axis=0)
+    elif isinstance(x[0], scipy.sparse.spmatrix):
+        return scipy.sparse.vstack(x, format=x[0].format)
+    else:
+        return np.concatenate(x, axis=0)
+
+
+def _split_rows(x) -> list:
+    """
+    Splits a batch-dimensioned tensor into its observations in one pass.
+
+    Rows of numpy arrays are views, rows of csr matrices are assembled from the slices of .data and .indices between
+    consecutive entries of .indptr.
+    """
+    if isinstance(x, np.ndarray):
+        return list(x)
+    elif isinstance(x, pd.DataFrame):
+        return [x.iloc[i:(i + 1)] for i in range(x.shape[0])]
+    elif isinstance(x, scipy.sparse.csr_matrix):
+        data = np.split(x.data, x.indptr[1:-1])
+        indices = np.split(x.indices, x.indptr[1:-1])
+        return [scipy.sparse.csr_matrix((y, z, np.array([0, len(y)])), shape=(1, x.shape[1]))
+                for y, z in zip(data, indices)]
+    else:
+        return [x[i, :] for i in range(x.shape[0])]
 
 
 def split_batch(x: Union[Tuple, Dict]):
@@ -8,6 +90,8 @@ def split_batch(x: Union[Tuple, Dict]):
     Splits retrieval batch into consumption batches of length 1.
 
     Often, end-user consumption batches would be observation-wise, ie yield a first dimension of length 1.
+    Each tensor is split into its observations once, the observations of all tensors are then zipped into data tuples
+    or dicts.
 
     :param x: Tuple or Dict
         One of the following:
@@ -15,20 +99,46 @@ def split_batch(x: Union[Tuple, Dict]):
             but of batch-dimensioned tensors.
             * Dict
     """
-    if isinstance(x, tuple):
-        batch_dim = x[0][0].shape[0]
-        for i in range(batch_dim):
-            output = []
-            for y in x:
-                if isinstance(y, tuple):
-                    output.append(tuple([z.iloc[[i], :] if isinstance(z, pd.DataFrame) else z[i, :] for z in y]))
-                else:
-                    output.append(y.iloc[[i], :] if isinstance(y, pd.DataFrame) else y[i, :])
-            yield tuple(output)
-    elif isinstance(x, dict):
+    if isinstance(x, dict):
         keys = list(x.keys())
-        batch_dim = x[keys[0]].shape[0]
-        for i in range(batch_dim):
-            yield {key: x[key].iloc[[i], :] if isinstance(x[key], pd.DataFrame) else x[key][i, :] for key in keys}
+        for x_i in zip(*[_split_rows(x[k]) for k in keys]):
+            yield dict(zip(keys, x_i))
+    elif isinstance(x, tuple):
+        # Tensors of the data tuple in one flat list, and the range of each element of the data tuple in this list:
+        nested = [isinstance(y, tuple) for y in x]
+        tensors = [z for y in x for z in (y if isinstance(y, tuple) else (y, ))]
+        bounds = np.cumsum([0] + [len(y) if isinstance(y, tuple) else 1 for y in x]).tolist()
+        for x_i in zip(*[_split_rows(y) for y in tensors]):
+            yield tuple([x_i[s:e] if n else x_i[s] for n, s, e in zip(nested, bounds[:-1], bounds[1:])])
     else:
-        raise ValueError('Input to split_batch(x) has to be either a Tuple or a Dict')
+        raise ValueError('Batches have to be either a Tuple or a Dict')
+
+
+def rebatch(x: Iterable[Union[Tuple, Dict]], batch_size: int):
+    """
+    Re-batches retrieval batches into consumption batches of batch_size observations.
+
+    Consumption batches are slices of the retrieval batches, only the observations of consumption batches that span two
+    or more retrieval batches are copied into a new batch. The last batch may have fewer than batch_size observations.
+
+    :param x: Retrieval batches as data tuples or dicts, see split_batch().
+    :param batch_size: Number of observations per consumption batch.
+    """
+    rest = None
+    for x_i in x:
+        n = _batch_dim(x_i)
+        start = 0
+        if rest is not None:
+            start = min(batch_size - _batch_dim(rest), n)
+            rest = _map_tensors(fn=_concat_rows, x=[rest, _map_tensors(lambda y: _slice_rows(y[0], 0, start), [x_i])])
+            if _batch_dim(rest) < batch_size:
+                continue
+            yield rest
+            rest = None
+        while n - start >= batch_size:
+            yield _map_tensors(fn=lambda y: _slice_rows(y[0], start, start + batch_size), x=[x_i])
+            start += batch_size
+        if start < n:
+            rest = _map_tensors(fn=lambda y: _slice_rows(y[0], start, n), x=[x_i])
+    if rest is not None:
+        yield rest
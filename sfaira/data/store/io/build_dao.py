@@ -0,0 +1,242 @@
+import anndata
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import h5py
+import os
+import multiprocessing
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import time
+import traceback
+from typing import Callable, List, Tuple, Union
+
+from sfaira.data.store.io.update_dao import _ids_in_catalog, _read_or_create_catalog, append_dao
+
+"""
+Parallel builds of dao stores from many data sets, see build_dao_store().
+
+Each data set is written by one worker process and is added to the store transactionally with append_dao(), so that
+the store catalog only lists data sets that were written completely. A build that was interrupted is resumed by
+building the same store again: Data sets that are in the catalog are skipped and left-overs of data sets that were
+being written are overwritten.
+"""
+
+
+def _h5ad_id(fn: Union[str, Path]) -> str:
+    """
+    Data set ID of a .h5ad file, ie .uns["id"], or the file name without suffix if the file has no ID.
+    """
+    with h5py.File(fn, "r") as f:
+        if "uns" in f.keys() and "id" in f["uns"].keys():
+            dataset_id = f["uns"]["id"][()]
+            if isinstance(dataset_id, np.ndarray):
+                dataset_id = dataset_id.tolist()
+            if isinstance(dataset_id, bytes):
+                dataset_id = dataset_id.decode("utf-8")
+            return str(dataset_id)
+    return Path(fn).stem
+
+
+def _build_h5ad(path_store: Union[str, Path], fn: Union[str, Path], dataset_id: str, backed: bool,
+                kwargs: dict) -> int:
+    """
+    Adds a .h5ad file to a dao store, run in a worker process.
+
+    :return: Number of observations written.
+    """
+    adata = anndata.read_h5ad(fn, backed="r" if backed else None)
+    try:
+        adata.uns["id"] = dataset_id
+        chunks = (kwargs["chunks"], adata.n_vars) if kwargs["chunks"] is not None else True
+        append_dao(path_store=path_store, adata=adata, **{**kwargs, "chunks": chunks})
+        return adata.n_obs
+    finally:
+        if backed:
+            adata.file.close()
+
+
+def _build_dataset(path_store: Union[str, Path], dataset, load_kwargs: dict,
+                   prepare: Union[None, Callable], kwargs: dict) -> int:
+    """
+    Loads a data set of a data loader group and adds it to a dao store, run in a worker process.
+
+    :return: Number of observations written.
+    """
+    dataset.load(**load_kwargs)
+    try:
+        if prepare is not None:
+            prepare(dataset)
+        dataset.write_distributed_store(dir_cache=path_store, store_format="dao", incremental=True, **kwargs)
+        return dataset.adata.n_obs
+    finally:
+        dataset.clear()
+
+
+def _file_size(fn: Union[None, str, Path]) -> float:
+    """
+    Size of a file in MB, 0 if the file is not known.
+    """
+    if fn is None or not os.path.isfile(fn):
+        return 0.
+    return os.path.getsize(fn) / np.power(1024, 2)
+
+
+def _tasks(source, backed: bool) -> List[Tuple[str, Callable, tuple, float, float]]:
+    """
+    Build tasks of a source of data sets as tuples of data set ID, worker function, its leading arguments, the size of
+    the data set in MB and the estimate of the memory in MB that the worker needs in addition to the blocks of .X that
+    it writes.
+    """
+    if isinstance(source, str) or isinstance(source, Path):
+        if not os.path.isdir(source):
+            raise ValueError(f"did not find h5ad directory {source}")
+        source = [os.path.join(source, x) for x in sorted(os.listdir(source)) if x.endswith(".h5ad")]
+    if isinstance(source, list) or isinstance(source, tuple):
+        # .h5ad files:
+        tasks = []
+        for fn in source:
+            size = _file_size(fn)
+            tasks.append((_h5ad_id(fn), _build_h5ad, (fn, ), size, 0. if backed else size))
+        return tasks
+    # Data loader group, ie DatasetGroup, DatasetSuperGroup or dictionary of Dataset instances:
+    datasets = source if isinstance(source, dict) else source.datasets
+    return [(v.id, _build_dataset, (v, ), _file_size(v.cache_fn), _file_size(v.cache_fn)) for v in datasets.values()]
+
+
+def build_dao_store(
+        path_store: Union[str, Path],
+        source,
+        processes: int = 1,
+        max_memory: Union[None, float] = None,
+        chunks: Union[None, int] = None,
+        compression_kwargs: Union[None, dict] = None,
+        dense: bool = False,
+        shuffle_data: bool = False,
+        csc: bool = False,
+        dtype: Union[None, str] = None,
+        ontology_index: bool = False,
+        num_workers: int = 1,
+        backed: bool = True,
+        load_kwargs: Union[None, dict] = None,
+        prepare: Union[None, Callable] = None,
+        verbose: bool = True,
+) -> pd.DataFrame:
+    """
+    Builds or completes a dao store from many data sets in parallel worker processes.
+
+    Data sets are distributed over the worker processes, each data set is written by one process and is added to the
+    store with append_dao(). Data sets that are already in the store are skipped, so that a build that was interrupted
+    is resumed by calling this function again with the same arguments. Data sets that fail are reported and do not stop
+    the build.
+
+    Data sets are started in order of decreasing size so that the last data sets to finish are small ones. The memory
+    budget is enforced in two ways: Each process holds at most max_memory / processes MB of blocks of .X in memory, see
+    write_dao(), and a data set that is loaded into memory is only started if the estimated memory of all running data
+    sets stays within max_memory. The memory of a data set that is loaded into memory is estimated by the size of its
+    .h5ad file, ie the input file or the cache of a data loader. At least one data set is always running.
+
+    :param path_store: Store directory, created if it does not exist yet.
+    :param source: Data sets to add to the store:
+
+            - Directory with streamlined .h5ad files, one file per data set.
+            - List of streamlined .h5ad files.
+            - Data loader group, e.g. a Universe, DatasetGroup or dictionary of Dataset instances. Each data set is
+                loaded with load_kwargs, passed to prepare, e.g. to streamline features and meta data, and written with
+                Dataset.write_distributed_store().
+
+        .uns["id"] of .h5ad files is used as data set ID, the file name is used if the file has no ID.
+    :param processes: Number of worker processes.
+    :param max_memory: Upper bound in MB on the memory used for data sets in all processes, see above. Unbounded if
+        None.
+    :param chunks: Observation axis size of chunks of .X, see Dataset.write_distributed_store().
+    :param compression_kwargs: Compression kwargs for zarr, see write_dao().
+    :param dense: Whether to write .X as a dense zarr array or as a sparse csr matrix in a zarr group.
+    :param shuffle_data: Whether to shuffle the ordering of observations of each data set, see write_dao().
+    :param csc: Whether to write a feature-major copy of .X, see write_dao().
+    :param dtype: Data type of .X on disk, e.g. "counts", see write_dao().
+    :param ontology_index: Whether to write the ontology-closure index of .obs, see write_dao().
+    :param num_workers: Number of threads per process that compress and write chunks of .X.
+    :param backed: Whether to read .h5ad files in backed mode, in which only blocks of .X are held in memory.
+    :param load_kwargs: Arguments for Dataset.load() for data loader groups.
+    :param prepare: Function that is called on each loaded Dataset of a data loader group before it is written. This
+        has to be picklable, ie a module-level function or a functools.partial thereof, if processes > 1.
+    :param verbose: Whether to print progress of each data set.
+    :return: Report with one row per data set with the columns "id", "status" ("written", "skipped" or "failed"),
+        "n_obs", "seconds" and "error".
+    """
+    load_kwargs = {} if load_kwargs is None else load_kwargs
+    tasks = _tasks(source=source, backed=backed)
+    catalog = _read_or_create_catalog(path_store)
+    ids_in_store = _ids_in_catalog(catalog).keys()
+    report = {}
+    todo = []
+    for dataset_id, fn, args, size, memory in tasks:
+        if dataset_id in report.keys():
+            raise ValueError(f"data set {dataset_id} occurs more than once in source")
+        if dataset_id in ids_in_store:
+            report[dataset_id] = {"id": dataset_id, "status": "skipped", "n_obs": np.nan, "seconds": 0., "error": None}
+        else:
+            report[dataset_id] = None
+            todo.append((dataset_id, fn, args, size, memory))
+    todo = sorted(todo, key=lambda x: -x[3])
+    n_todo = len(todo)
+    if verbose:
+        print(f"building {n_todo} data sets into {path_store} with {processes} processes, skipping "
+              f"{len(tasks) - n_todo} data sets that are already in the store")
+    kwargs = {"chunks": chunks, "compression_kwargs": {} if compression_kwargs is None else compression_kwargs,
+              "dense": dense, "shuffle_data": shuffle_data, "csc": csc, "dtype": dtype,
+              "ontology_index": ontology_index, "num_workers": num_workers,
+              "max_memory": max_memory / processes if max_memory is not None else None}
+    counter = [0]
+
+    def worker_args(dataset_id, fn, args) -> tuple:
+        if fn is _build_h5ad:
+            return (path_store, ) + args + (dataset_id, backed, kwargs)
+        else:
+            return (path_store, ) + args + (load_kwargs, prepare, kwargs)
+
+    def record(dataset_id, t0, n_obs=np.nan, error=None):
+        counter[0] += 1
+        status = "failed" if error is not None else "written"
+        report[dataset_id] = {"id": dataset_id, "status": status, "n_obs": n_obs, "seconds": time.time() - t0,
+                              "error": error}
+        if verbose:
+            print(f"[{counter[0]}/{n_todo}] {status} {dataset_id}" +
+                  (f" ({n_obs} observations, {report[dataset_id]['seconds']:.1f} s)" if error is None else
+                   f":\n{error}"))
+
+    if processes <= 1:
+        for dataset_id, fn, args, _, _ in todo:
+            t0 = time.time()
+            if verbose:
+                print(f"writing {dataset_id}")
+            try:
+                record(dataset_id, t0, n_obs=fn(*worker_args(dataset_id, fn, args)))
+            except Exception:
+                record(dataset_id, t0, error=traceback.format_exc())
+    else:
+        in_flight = {}
+        with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context()) as pool:
+            while len(todo) > 0 or len(in_flight) > 0:
+                memory_in_flight = np.sum([x[2] for x in in_flight.values()])
+                # Start the largest data set that fits into the memory budget:
+                i = None
+                if len(in_flight) < processes:
+                    for j, (_, _, _, _, memory) in enumerate(todo):
+                        if len(in_flight) == 0 or max_memory is None or memory_in_flight + memory <= max_memory:
+                            i = j
+                            break
+                if i is not None:
+                    dataset_id, fn, args, _, memory = todo.pop(i)
+                    if verbose:
+                        print(f"writing {dataset_id}")
+                    in_flight[pool.submit(fn, *worker_args(dataset_id, fn, args))] = (dataset_id, time.time(), memory)
+                else:
+                    done, _ = wait(list(in_flight.keys()), return_when=FIRST_COMPLETED)
+                    for x in done:
+                        dataset_id, t0, _ = in_flight.pop(x)
+                        try:
+                            record(dataset_id, t0, n_obs=x.result())
+                        except Exception:
+                            record(dataset_id, t0, error=traceback.format_exc())
+    return pd.DataFrame(list(report.values()), columns=["id", "status", "n_obs", "seconds", "error"])
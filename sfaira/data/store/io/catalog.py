@@ -0,0 +1,251 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Union
+
+import numpy as np
+
+"""
+The catalog is a single json file in the root directory of a dao store that describes all data sets in the store.
+
+It allows opening a store without listing the store directory and without reading meta data of each data set.
+The catalog is versioned: Each update increments the catalog version and is written atomically, so that readers that
+opened a store see a consistent snapshot of the store.
+Directories of data sets that were replaced or removed are recorded as retired and are kept on disk until they are
+deleted explicitly, see sfaira.data.store.io.update_dao.vacuum_dao().
+The catalog is a dictionary over data set directory names (relative to the store root) of dictionaries with the
+entries:
+
+    - "id": Data set ID, ie .uns["id"].
+    - "organism": Organism of data set, ie .uns["organism"].
+    - "shape": Shape of .X.
+    - "chunks_obs": Observation axis size of chunks of .X.
+    - "dense": Whether .X is dense or saved as csr matrix.
+    - "dtype": Data type of .X on disk, e.g. a packed unsigned integer type for count matrices.
+    - "csc": Whether the data set has a feature-major copy of .X for queries of a few features.
+    - "var_hash": Hash of the feature names, data sets with the same hash share the feature space.
+    - "path": Data set directory name relative to the store root.
+    - "obs_columns": Columns of .obs.
+    - "obs_categories": Levels of categorical columns of .obs, by column, used to evaluate queries on .obs.
+    - "uns": Entries of .uns that are strings or lists of strings, e.g. data set-wide meta data.
+    - "revision": Number of times the data set was replaced in the store, see sfaira.data.store.io.update_dao.
+    - "obs_offset": Index of the first observation of the data set in the store, ie the number of observations of the
+        data sets that precede it in the catalog.
+"""
+
+CATALOG_FN = "catalog.json"
+# Prefix of directories into which data sets are written before they are added to a store, see
+# sfaira.data.store.io.update_dao:
+STAGING_PREFIX = ".staging_"
+
+
+def path_catalog(path_store: Union[str, Path]) -> str:
+    return os.path.join(path_store, CATALOG_FN)
+
+
+def hash_var_names(var_names: List[str]) -> str:
+    """
+    Hash of an ordered list of feature names.
+    """
+    return hashlib.md5("\n".join([str(x) for x in var_names]).encode("utf-8")).hexdigest()
+
+
+class _CatalogLock:
+    """
+    Lock file that serialises catalog updates of concurrent writers.
+    """
+
+    def __init__(self, path_store: Union[str, Path], timeout: float = 600., poll: float = 0.05):
+        self.fn = path_catalog(path_store) + ".lock"
+        self.timeout = timeout
+        self.poll = poll
+
+    def __enter__(self):
+        t0 = time.time()
+        while True:
+            try:
+                os.close(os.open(self.fn, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                return self
+            except FileExistsError:
+                if time.time() - t0 > self.timeout:
+                    raise TimeoutError(f"could not acquire catalog lock {self.fn}, delete this file if no other "
+                                       f"process is writing to the store")
+                time.sleep(self.poll)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        os.remove(self.fn)
+
+
+def _read_catalog_file(path_store: Union[str, Path]) -> Union[None, dict]:
+    fn = path_catalog(path_store)
+    if not os.path.exists(fn):
+        return None
+    with open(fn, "r") as f:
+        catalog = json.load(f)
+    # Catalogs written before catalogs were versioned:
+    catalog.setdefault("version", 0)
+    catalog.setdefault("retired", [])
+    return catalog
+
+
+def read_catalog(path_store: Union[str, Path]) -> Union[None, Dict[str, dict]]:
+    """
+    Reads catalog of a store.
+
+    :param path_store: Store directory.
+    :return: Catalog by data set directory name or None if store has no catalog.
+    """
+    catalog = _read_catalog_file(path_store)
+    return catalog["datasets"] if catalog is not None else None
+
+
+def read_catalog_version(path_store: Union[str, Path]) -> int:
+    """
+    Reads version of catalog of a store, the version is incremented with every update of the catalog.
+
+    :param path_store: Store directory.
+    :return: Catalog version, 0 if store has no catalog.
+    """
+    catalog = _read_catalog_file(path_store)
+    return catalog["version"] if catalog is not None else 0
+
+
+def _write_catalog(path_store: Union[str, Path], catalog: Dict[str, dict], version: int,
+                   retired: Union[None, List[str]] = None):
+    """
+    Replaces catalog file atomically so that readers never see a partially written catalog.
+    """
+    fn = path_catalog(path_store)
+    fn_tmp = f"{fn}.{os.getpid()}.tmp"
+    catalog = dict(sorted(catalog.items()))
+    offset = 0
+    for v in catalog.values():
+        v["obs_offset"] = offset
+        offset += int(v["shape"][0]) if v.get("shape") is not None else 0
+    with open(fn_tmp, "w") as f:
+        json.dump({
+            "version": int(version),
+            "datasets": catalog,
+            "retired": sorted(set(retired)) if retired is not None else [],
+        }, f, indent=1)
+    os.replace(fn_tmp, fn)
+
+
+def update_catalog(path_store: Union[str, Path], entries: Union[None, Dict[str, dict]] = None,
+                   remove: Union[None, List[str]] = None, retire: bool = False,
+                   validate: Union[None, Callable[[Dict[str, dict]], None]] = None) -> int:
+    """
+    Adds, replaces or removes entries of the catalog of a store, creates catalog if it does not exist yet.
+
+    :param path_store: Store directory.
+    :param entries: Catalog entries to add or replace, by data set directory name.
+    :param remove: Data set directory names to remove from catalog.
+    :param retire: Whether to record the directories in remove as retired, see vacuum_dao().
+    :param validate: Function that is called on the current catalog before it is updated and that raises if the update
+        conflicts with the current catalog. This is called while holding the catalog lock.
+    :return: New catalog version.
+    """
+    with _CatalogLock(path_store):
+        catalog_file = _read_catalog_file(path_store)
+        if catalog_file is None:
+            catalog_file = {"version": 0, "datasets": {}, "retired": []}
+        catalog = catalog_file["datasets"]
+        retired = catalog_file["retired"]
+        if validate is not None:
+            validate(catalog)
+        if remove is not None:
+            for k in remove:
+                if k in catalog.keys():
+                    del catalog[k]
+                    if retire:
+                        retired.append(k)
+        if entries is not None:
+            catalog.update(entries)
+            retired = [x for x in retired if x not in entries.keys()]
+        version = catalog_file["version"] + 1
+        _write_catalog(path_store=path_store, catalog=catalog, version=version, retired=retired)
+    return version
+
+
+def _is_str_list(x) -> bool:
+    return (isinstance(x, list) or isinstance(x, tuple) or isinstance(x, np.ndarray)) and \
+        np.all([isinstance(y, str) for y in x])
+
+
+def catalog_entry(path: str, uns: dict, obs_columns: List[str], var_names: List[str], shape, chunks_obs: int,
+                  dense: bool, dtype, csc: bool = False,
+                  obs_categories: Union[None, Dict[str, List[str]]] = None) -> dict:
+    """
+    Assembles the catalog entry of a data set.
+
+    :param path: Data set directory name relative to the store root.
+    :param uns: .uns of data set.
+    :param obs_columns: Columns of .obs of data set.
+    :param var_names: Feature names of data set.
+    :param shape: Shape of .X.
+    :param chunks_obs: Observation axis size of chunks of .X.
+    :param dense: Whether .X is dense or saved as csr matrix.
+    :param dtype: Data type of .X.
+    :param csc: Whether the data set has a feature-major copy of .X.
+    :param obs_categories: Levels of categorical columns of .obs by column.
+    """
+    organism = uns["organism"] if "organism" in uns.keys() else None
+    if isinstance(organism, np.ndarray):
+        organism = organism.tolist()
+    return {
+        "id": uns["id"] if "id" in uns.keys() else path,
+        "organism": organism,
+        "shape": [int(x) for x in shape],
+        "chunks_obs": int(chunks_obs),
+        "dense": bool(dense),
+        "dtype": np.dtype(dtype).str,
+        "csc": bool(csc),
+        "var_hash": hash_var_names(var_names),
+        "path": path,
+        "obs_columns": [str(x) for x in obs_columns],
+        "obs_categories": dict([(str(k), [str(x) for x in v]) for k, v in obs_categories.items()])
+        if obs_categories is not None else {},
+        "uns": dict([(k, v if isinstance(v, str) else list(v)) for k, v in uns.items()
+                     if isinstance(v, str) or _is_str_list(v)]),
+    }
+
+
+def _is_dao_dir(path: Union[str, Path]) -> bool:
+    """
+    Whether a directory holds a completely written dao data set, ie .X, .obs, .var and .uns.
+
+    The parquet tables are written last by write_dao(), so directories that are still being written, e.g. by a
+    concurrent update of the store, are not complete.
+    """
+    return os.path.isfile(os.path.join(path, "zarr", ".zgroup")) and \
+        os.path.isfile(os.path.join(path, "pickle", "uns.pickle")) and \
+        os.path.isfile(os.path.join(path, "parquet", "obs.parquet")) and \
+        os.path.isfile(os.path.join(path, "parquet", "var.parquet"))
+
+
+def write_catalog(path_store: Union[str, Path]):
+    """
+    (Re-)writes the catalog of a store from the data sets found in the store directory.
+
+    Directories that are recorded as retired in an existing catalog, staging directories of writers and directories
+    that do not hold a completely written data set are skipped.
+    The catalog is read, the store directory is listed and the catalog is written while holding the catalog lock, so
+    that concurrent updates of the catalog, see sfaira.data.store.io.update_dao, are not overwritten.
+
+    Use this to add a catalog to stores that were written before catalogs were maintained by the store writer.
+
+    :param path_store: Store directory.
+    """
+    # Import here to avoid circular import.
+    from sfaira.data.store.io.io_dao import read_dao_entry
+    with _CatalogLock(path_store):
+        catalog_file = _read_catalog_file(path_store)
+        version = catalog_file["version"] if catalog_file is not None else 0
+        retired = catalog_file["retired"] if catalog_file is not None else []
+        catalog = {}
+        for f in np.sort(os.listdir(path_store)):
+            if f not in retired and not f.startswith(STAGING_PREFIX) and _is_dao_dir(os.path.join(path_store, f)):
+                catalog[f] = read_dao_entry(store=os.path.join(path_store, f))
+        _write_catalog(path_store=path_store, catalog=catalog, version=version + 1, retired=retired)
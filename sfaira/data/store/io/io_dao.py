@@ -1,15 +1,44 @@
+from collections.abc import Mapping
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import anndata
+from anndata._core.sparse_dataset import SparseDataset
 import dask.array
 import dask.dataframe
+from dask.base import tokenize
+import h5py
 import numpy as np
 import os
 import pandas as pd
 from pathlib import Path
 import pickle
+import pyarrow as pa
+import pyarrow.parquet as pq
 import scipy.sparse
-from typing import List, Tuple, Union
+import tempfile
+import threading
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 import zarr
 
+from sfaira.data.store.io.catalog import catalog_entry, hash_var_names, read_catalog, update_catalog, \
+    write_catalog
+from sfaira.data.store.io.ontology_index import read_ontology_index, write_ontology_index, OntologyIndex
+from sfaira.data.store.obs_table import normalise_categorical_order, obs_to_arrow
+
+
+CSC_CHUNKS_VAR = 16
+# Per-cell statistics, see write_stats():
+STATS_TOTAL_COUNTS = "total_counts"
+STATS_N_GENES = "n_genes_detected"
+STATS_SIZE_FACTORS = "size_factors"
+STATS_COLUMNS = [STATS_TOTAL_COUNTS, STATS_N_GENES, STATS_SIZE_FACTORS]
+SIZE_FACTOR_SCALE = 1e4
+# Categorical .obs columns with up to this many levels are declared in the store catalog:
+OBS_MAX_CATEGORIES = 1000
+# Packed count storage of .X, see write_dao(dtype="counts"):
+DTYPE_COUNTS = "counts"
+PACKED_COUNT_DTYPES = [np.uint8, np.uint16, np.uint32]
+
 
 def _invert_permutation(p: np.ndarray):
     s = np.empty_like(p)
@@ -43,32 +72,991 @@ def path_uns(path):
     return _buffered_path(path_base=path, path="pickle", fn="uns.pickle")
 
 
+def path_stats(path):
+    return _buffered_path(path_base=path, path="parquet", fn="stats.parquet")
+
+
 def path_x(path):
     if not os.path.exists(path):
         os.makedirs(path)
     return os.path.join(path, "zarr")
 
 
+def _chunks_obs(chunks: Union[bool, Tuple[int, int]], shape: Tuple[int, int], dtype) -> int:
+    """
+    Observation axis size of zarr chunks, resolves zarr default chunking if chunks is True.
+    """
+    return int(zarr.util.normalize_chunks(chunks, shape, np.dtype(dtype).itemsize)[0])
+
+
+def _is_sparse(x) -> bool:
+    return isinstance(x, scipy.sparse.spmatrix) or isinstance(x, SparseDataset) or isinstance(x, _ZarrCsr)
+
+
+def _get_rows(x, rows: Union[None, np.ndarray], start: int, end: int):
+    """
+    Reads observations start to end of an in-memory or backed array, optionally in a permuted order.
+
+    :param x: In-memory (numpy, scipy.sparse) or backed (h5py.Dataset, anndata SparseDataset) array.
+    :param rows: Permutation of observations to apply before slicing, no permutation if None.
+    :param start: First observation of block in (permuted) array.
+    :param end: End of block in (permuted) array, exclusive.
+    :return: Block as numpy array or scipy.sparse.csr_matrix.
+    """
+    if rows is None:
+        x_block = x[start:end, :]
+    else:
+        # Backed arrays only support increasing indices: read block in sorted order and restore order in memory.
+        rows = rows[start:end]
+        order = np.argsort(rows)
+        x_block = x[rows[order], :][_invert_permutation(order), :]
+    if isinstance(x_block, scipy.sparse.spmatrix):
+        x_block = scipy.sparse.csr_matrix(x_block)
+    else:
+        x_block = np.asarray(x_block)
+    return x_block
+
+
+def _get_rows_coalesced(x, rows: np.ndarray, max_gap: int = 0):
+    """
+    Reads observations of an in-memory or backed array as slices over runs of contiguous observations.
+
+    Observations are sorted and neighbouring observations that are at most max_gap + 1 apart are read with one slice,
+    the observations in the gaps are read and discarded. This replaces one seek per observation by one seek per run on
+    backed arrays.
+
+    :param x: In-memory (numpy, scipy.sparse) or backed (h5py.Dataset, anndata SparseDataset) array.
+    :param rows: Observations to read, in any order.
+    :param max_gap: Largest number of unselected observations between two selected observations that are read to merge
+        the runs of these observations.
+    :return: Observations in the order of rows as numpy array or scipy.sparse.csr_matrix.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    if len(rows) == 0:
+        return _get_rows(x=x, rows=None, start=0, end=0)
+    order = np.argsort(rows, kind="stable")
+    rows_sorted = rows[order]
+    breaks = np.where(np.diff(rows_sorted) > max_gap + 1)[0] + 1
+    blocks = []
+    for run in np.split(rows_sorted, breaks):
+        x_run = _get_rows(x=x, rows=None, start=int(run[0]), end=int(run[-1]) + 1)
+        blocks.append(x_run if len(run) == run[-1] - run[0] + 1 else x_run[run - run[0], :])
+    if len(blocks) == 1:
+        x_rows = blocks[0]
+    elif isinstance(blocks[0], scipy.sparse.spmatrix):
+        x_rows = scipy.sparse.vstack(blocks, format="csr")
+    else:
+        x_rows = np.concatenate(blocks, axis=0)
+    if np.any(np.diff(order) != 1):
+        x_rows = x_rows[_invert_permutation(order), :]
+    return x_rows
+
+
+def _row_nnz(x, block_size: int) -> np.ndarray:
+    """
+    Number of non-zero entries per observation of an in-memory or backed array.
+
+    Uses indptr of csr matrices and counts non-zero entries in blocks of observations otherwise.
+    """
+    if isinstance(x, scipy.sparse.csr_matrix):
+        return np.diff(x.indptr)
+    elif isinstance(x, SparseDataset) and x.format_str == "csr":
+        return np.diff(x.group["indptr"][...])
+    elif isinstance(x, _ZarrCsr):
+        return np.diff(x.group["indptr"][...])
+    else:
+        return np.concatenate([
+            scipy.sparse.csr_matrix(_get_rows(x=x, rows=None, start=s, end=min(s + block_size, x.shape[0]))).getnnz(
+                axis=1)
+            for s in range(0, x.shape[0], block_size)
+        ] + [np.zeros((0,), dtype=np.int64)])
+
+
+def _map_blocks(n: int, block_size: int, fn: Callable[[int, int], None], num_workers: int = 1,
+                max_memory: Union[None, float] = None, block_memory: float = 0.):
+    """
+    Calls fn(start, end) on consecutive blocks of size block_size that cover range(n), optionally on a thread pool.
+
+    :param n: Size of range to cover.
+    :param block_size: Size of blocks.
+    :param fn: Function to call on each block, return values are ignored.
+    :param num_workers: Number of threads to call fn from.
+    :param max_memory: Upper bound in MB on the size of the blocks that are processed at the same time. The number of
+        blocks in flight is not bounded by memory if None.
+    :param block_memory: Size of one block in memory in MB.
+    """
+    bounds = [(s, min(s + block_size, n)) for s in range(0, n, block_size)]
+    if num_workers <= 1:
+        for s, e in bounds:
+            fn(s, e)
+    else:
+        max_in_flight = 2 * num_workers
+        if max_memory is not None:
+            max_in_flight = max(min(max_in_flight, int(max_memory // max(block_memory, 1e-12))), 1)
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=num_workers) as pool:
+            for s, e in bounds:
+                if len(in_flight) >= max_in_flight:
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for x in done:
+                        x.result()  # Raise errors from worker.
+                in_flight.add(pool.submit(fn, s, e))
+            for x in wait(in_flight)[0]:
+                x.result()
+
+
+def _dtype_range(dtype: np.dtype) -> Union[None, Tuple[float, float]]:
+    """
+    Smallest and largest finite value of a numeric data type, None for other data types.
+    """
+    dtype = np.dtype(dtype)
+    if np.issubdtype(dtype, np.floating):
+        return float(np.finfo(dtype).min), float(np.finfo(dtype).max)
+    if np.issubdtype(dtype, np.integer):
+        return int(np.iinfo(dtype).min), int(np.iinfo(dtype).max)
+    return None
+
+
+def _packed_dtype(x, dtype: Union[None, str, np.dtype], block_size: int = 4096) -> np.dtype:
+    """
+    Resolves the data type of .X on disk, see write_dao().
+
+    For dtype "counts", x is scanned in blocks of observations for the largest entry and the smallest unsigned integer
+    type in PACKED_COUNT_DTYPES that holds it is chosen.
+
+    For other numeric data types that cannot represent the range of x.dtype, e.g. "float16" for float32 data, x is
+    scanned in blocks of observations for entries that are out of the range of the data type.
+
+    :raises ValueError: If dtype is "counts" and x has negative or non-integer entries, or if x has finite entries that
+        are out of the range of dtype.
+    """
+    if dtype is None:
+        return np.dtype(x.dtype)
+    if not (isinstance(dtype, str) and dtype == DTYPE_COUNTS):
+        dtype = np.dtype(dtype)
+        if _dtype_range(dtype) is not None and _dtype_range(x.dtype) is not None and \
+                not (_dtype_range(dtype)[0] <= _dtype_range(x.dtype)[0] and
+                     _dtype_range(x.dtype)[1] <= _dtype_range(dtype)[1]):
+            dtype_min, dtype_max = _dtype_range(dtype)
+            for s in range(0, x.shape[0], block_size):
+                x_block = _get_rows(x=x, rows=None, start=s, end=min(s + block_size, x.shape[0]))
+                values = x_block.data if isinstance(x_block, scipy.sparse.spmatrix) else np.asarray(x_block)
+                values = values[np.isfinite(values)]
+                if values.size > 0 and (np.min(values) < dtype_min or np.max(values) > dtype_max):
+                    raise ValueError(f"entries of .X in [{np.min(values)}, {np.max(values)}] are out of the range "
+                                     f"[{dtype_min}, {dtype_max}] of dtype={dtype}")
+        return dtype
+    x_max = 0
+    for s in range(0, x.shape[0], block_size):
+        x_block = _get_rows(x=x, rows=None, start=s, end=min(s + block_size, x.shape[0]))
+        values = x_block.data if isinstance(x_block, scipy.sparse.spmatrix) else x_block
+        if values.size > 0:
+            if np.min(values) < 0 or np.any(np.mod(values, 1) != 0):
+                raise ValueError(f"dtype={DTYPE_COUNTS} requires non-negative integer entries in .X")
+            x_max = max(x_max, np.max(values))
+    for dtype_i in PACKED_COUNT_DTYPES:
+        if x_max <= np.iinfo(dtype_i).max:
+            return np.dtype(dtype_i)
+    raise ValueError(f"largest entry {x_max} of .X exceeds {PACKED_COUNT_DTYPES[-1]}")
+
+
+def _write_x_dense(f: zarr.Group, x, rows: Union[None, np.ndarray], chunks: Union[bool, Tuple[int, int]],
+                   compression_kwargs: dict, num_workers: int = 1, max_memory: Union[None, float] = None,
+                   dtype: Union[None, np.dtype] = None):
+    """
+    Writes observations of a matrix into a dense zarr array.
+
+    The array is filled in blocks that are aligned to the chunks of the array along observations, so that each chunk is
+    compressed and written exactly once and only a few blocks of x are held in memory as dense arrays at any time.
+    Blocks touch disjoint sets of chunks so that they can be written from a thread pool without synchronisation.
+    Entries are cast to dtype, which defaults to the data type of x.
+    """
+    dtype = x.dtype if dtype is None else dtype
+    arr = f.create_dataset("X", shape=x.shape, dtype=dtype, fill_value=0, chunks=chunks, **compression_kwargs)
+
+    def write_block(start, end):
+        x_block = _get_rows(x=x, rows=rows, start=start, end=end)
+        if isinstance(x_block, scipy.sparse.spmatrix):
+            x_block = x_block.toarray()
+        arr[start:end, :] = np.asarray(x_block, dtype=arr.dtype)
+
+    block_memory = arr.chunks[0] * x.shape[1] * arr.dtype.itemsize / np.power(1024, 2)
+    _map_blocks(n=x.shape[0], block_size=arr.chunks[0], fn=write_block, num_workers=num_workers,
+                max_memory=max_memory, block_memory=block_memory)
+
+
+def _write_x_sparse(f: zarr.Group, x, rows: Union[None, np.ndarray], chunks: Union[bool, Tuple[int, int]],
+                    compression_kwargs: dict, num_workers: int = 1, max_memory: Union[None, float] = None,
+                    dtype: Union[None, np.dtype] = None):
+    """
+    Writes observations of a matrix as csr matrix into a zarr group with the arrays indptr, indices and data.
+
+    The chunking of indices and data is chosen such that one chunk covers roughly as many non-zero entries as are
+    expected in one observation chunk of indptr.
+    Indices and data are filled in blocks that are aligned to their chunks, each block only reads the observations of x
+    that overlap with it. Entries are cast to dtype, which defaults to the data type of x.
+    """
+    shape = x.shape
+    dtype = np.dtype(x.dtype if dtype is None else dtype)
+    chunks_obs = _chunks_obs(chunks=chunks, shape=shape, dtype=dtype)
+    row_nnz = _row_nnz(x=x, block_size=chunks_obs)
+    if rows is not None:
+        row_nnz = row_nnz[rows]
+    indptr = np.concatenate([np.zeros((1,), dtype=np.int64), np.cumsum(row_nnz, dtype=np.int64)])
+    nnz = int(indptr[-1])
+    chunks_nnz = max(int(np.ceil(nnz / max(shape[0], 1) * chunks_obs)), 1)
+    g = f.create_group("X")
+    g.attrs.update({"encoding-type": "csr_matrix", "shape": list(shape), "chunks_obs": chunks_obs})
+    g.create_dataset("indptr", data=indptr, chunks=(chunks_obs + 1,), **compression_kwargs)
+    arr_indices = g.create_dataset("indices", shape=(nnz,), dtype=np.int32, chunks=(chunks_nnz,),
+                                   **compression_kwargs)
+    arr_data = g.create_dataset("data", shape=(nnz,), dtype=dtype, chunks=(chunks_nnz,), **compression_kwargs)
+
+    def write_block(start, end):
+        # Observations that overlap with entries start to end:
+        obs_start = int(np.searchsorted(indptr, start, side="right")) - 1
+        obs_end = int(np.searchsorted(indptr, end, side="left"))
+        x_block = scipy.sparse.csr_matrix(_get_rows(x=x, rows=rows, start=obs_start, end=obs_end))
+        offset = int(indptr[obs_start])
+        arr_indices[start:end] = x_block.indices[(start - offset):(end - offset)]
+        arr_data[start:end] = x_block.data[(start - offset):(end - offset)].astype(dtype, copy=False)
+
+    block_memory = 2 * chunks_nnz * (dtype.itemsize + 4) / np.power(1024, 2)
+    _map_blocks(n=nnz, block_size=chunks_nnz, fn=write_block, num_workers=num_workers, max_memory=max_memory,
+                block_memory=block_memory)
+
+
+def _write_stats(store: Union[str, Path], x, rows: Union[None, np.ndarray], num_workers: int = 1,
+                 max_memory: Union[None, float] = None, block_size: int = 4096):
+    """
+    Computes per-cell statistics of a matrix in blocks of observations and saves them as parquet table next to .obs.
+
+    The table has one row per observation in the order of the store and the columns:
+
+        - STATS_TOTAL_COUNTS: Sum of counts across all features.
+        - STATS_N_GENES: Number of features with non-zero counts.
+        - STATS_SIZE_FACTORS: Total counts divided by SIZE_FACTOR_SCALE.
+
+    :param store: Directory of the data set.
+    :param x: In-memory or backed array, see _get_rows().
+    :param rows: Permutation of observations to apply before computing statistics, see _get_rows().
+    :param num_workers: Number of threads that process blocks of observations.
+    :param max_memory: Upper bound in MB on the size of the blocks of x that are held in memory at the same time.
+    :param block_size: Number of observations read at once.
+    """
+    total_counts = np.zeros((x.shape[0],), dtype=np.float64)
+    n_genes = np.zeros((x.shape[0],), dtype=np.int64)
+
+    def stats_block(start, end):
+        x_block = scipy.sparse.csr_matrix(_get_rows(x=x, rows=rows, start=start, end=end))
+        total_counts[start:end] = np.asarray(x_block.sum(axis=1)).flatten()
+        n_genes[start:end] = x_block.getnnz(axis=1)
+
+    block_memory = block_size * x.shape[1] * np.dtype(x.dtype).itemsize / np.power(1024, 2)
+    _map_blocks(n=x.shape[0], block_size=block_size, fn=stats_block, num_workers=num_workers, max_memory=max_memory,
+                block_memory=block_memory)
+    pd.DataFrame({
+        STATS_TOTAL_COUNTS: total_counts,
+        STATS_N_GENES: n_genes,
+        STATS_SIZE_FACTORS: total_counts / SIZE_FACTOR_SCALE,
+    }).to_parquet(path=path_stats(store), engine='pyarrow', compression='snappy', index=None)
+
+
+def write_stats(store: Union[str, Path], num_workers: int = 1, max_memory: Union[None, float] = None):
+    """
+    Adds per-cell statistics to a data set in a dao or memory-mapped store, see _write_stats().
+
+    Stores written with sfaira already contain these statistics, use this for stores written before statistics were
+    saved.
+
+    :param store: Directory of the data set.
+    :param num_workers: Number of threads that process blocks of observations.
+    :param max_memory: Upper bound in MB on the size of the blocks of .X that are held in memory at the same time.
+    """
+    fn_memmap = os.path.join(store, "X.npy")
+    x = np.load(fn_memmap, mmap_mode="r") if os.path.isfile(fn_memmap) else _open_x(store)
+    _write_stats(store=store, x=x, rows=None, num_workers=num_workers, max_memory=max_memory)
+
+
+def read_stats(store: Union[str, Path]) -> Union[None, pd.DataFrame]:
+    """
+    Reads per-cell statistics of a data set, see write_stats().
+
+    :param store: Directory of the data set.
+    :return: Statistics with one row per observation or None if the data set has no statistics.
+    """
+    fn = os.path.join(store, "parquet", "stats.parquet")
+    return pd.read_parquet(fn, engine="pyarrow") if os.path.isfile(fn) else None
+
+
+def _read_csr_block(g: zarr.Group, start: int, end: int) -> scipy.sparse.csr_matrix:
+    """
+    Reads observations start to end from a csr matrix saved as zarr group, see _write_x_sparse().
+    """
+    indptr = g["indptr"][start:(end + 1)]
+    data = g["data"][indptr[0]:indptr[-1]]
+    indices = g["indices"][indptr[0]:indptr[-1]]
+    return scipy.sparse.csr_matrix((data, indices, indptr - indptr[0]), shape=(end - start, g.attrs["shape"][1]))
+
+
+class _ZarrCsr:
+    """
+    Backed csr matrix saved as zarr group, see _write_x_sparse(), that supports reading blocks of observations.
+
+    This allows using sparse dao stores as input of the block-wise writers, e.g. to rechunk a store.
+    """
+
+    def __init__(self, group: zarr.Group):
+        self.group = group
+        self.shape = tuple(group.attrs["shape"])
+        self.dtype = group["data"].dtype
+
+    def __getitem__(self, key) -> scipy.sparse.csr_matrix:
+        rows = key[0] if isinstance(key, tuple) else key
+        if isinstance(rows, slice):
+            start, end, _ = rows.indices(self.shape[0])
+            return _read_csr_block(g=self.group, start=start, end=end)
+        else:
+            # Increasing indices, read the covering block and select observations in memory.
+            rows = np.asarray(rows)
+            if len(rows) == 0:
+                return scipy.sparse.csr_matrix((0, self.shape[1]), dtype=self.dtype)
+            start = int(rows[0])
+            return _read_csr_block(g=self.group, start=start, end=int(rows[-1]) + 1)[rows - start, :]
+
+
+def _dask_from_zarr_csr(g: zarr.Group, url: str) -> dask.array.Array:
+    """
+    Lazy dask array of a csr matrix saved as zarr group, see _write_x_sparse().
+
+    Each dask chunk is a scipy.sparse.csr_matrix that corresponds to one observation chunk on disk.
+    """
+    n_obs, n_var = g.attrs["shape"]
+    chunks_obs = g.attrs["chunks_obs"]
+    bounds = [(s, min(s + chunks_obs, n_obs)) for s in range(0, n_obs, chunks_obs)]
+    dtype = g["data"].dtype
+    name = "sfaira-dao-csr-" + tokenize(url, g.path)
+    dsk = dict([((name, i, 0), (_read_csr_block, g, s, e)) for i, (s, e) in enumerate(bounds)])
+    return dask.array.Array(dsk, name, chunks=(tuple([e - s for s, e in bounds]), (n_var,)), dtype=dtype,
+                            meta=scipy.sparse.csr_matrix((0, 0), dtype=dtype))
+
+
+def _write_x_csc(f: zarr.Group, x, chunks_var: int, compression_kwargs: dict, max_memory: Union[None, float] = None,
+                 block_size: int = 4096, dir_tmp: Union[None, str, Path] = None):
+    """
+    Writes a feature-major copy of a matrix as csc matrix into a zarr group "X_csc" with the arrays indptr, indices and
+    data, see write_dao().
+
+    indices and data are chunked along features so that reading a few features only reads the chunks of these features.
+    The matrix is transposed out of core: Each block of observations is read once, transposed and appended to an
+    uncompressed temporary copy. Features are then collected from the copy in groups of feature chunks whose non-zero
+    entries fit into max_memory, each group reads one contiguous range of the copy per block of observations.
+
+    :param f: Zarr group of data set.
+    :param x: In-memory or backed array with observations in rows, see _get_rows().
+    :param chunks_var: Number of features per chunk.
+    :param compression_kwargs: Compression kwargs for zarr.
+    :param max_memory: Upper bound in MB on the non-zero entries held in memory, all features are collected at once
+        and the transposed blocks are kept in memory if None.
+    :param block_size: Number of observations read at once.
+    :param dir_tmp: Directory of the temporary copy, only used if max_memory is not None, defaults to the system
+        temporary directory.
+    """
+    n_obs, n_var = x.shape
+    bounds_obs = [(s, min(s + block_size, n_obs)) for s in range(0, n_obs, block_size)]
+    with tempfile.TemporaryDirectory(dir=dir_tmp, prefix=".sfaira_csc_") as d:
+        # Transposed blocks: feature pointers by block and entries of all blocks, in memory or in the temporary copy.
+        block_indptr = []
+        block_offsets = [0]
+        blocks_indices = []
+        blocks_data = []
+        for s, e in bounds_obs:
+            x_block = scipy.sparse.csc_matrix(_get_rows(x=x, rows=None, start=s, end=e))
+            x_block.sort_indices()
+            block_indptr.append(x_block.indptr.astype(np.int64))
+            block_offsets.append(block_offsets[-1] + x_block.nnz)
+            indices_block = (x_block.indices + s).astype(np.int32)
+            data_block = x_block.data.astype(x.dtype)
+            if max_memory is None:
+                blocks_indices.append(indices_block)
+                blocks_data.append(data_block)
+            else:
+                with open(os.path.join(d, "indices"), "ab") as f_tmp:
+                    f_tmp.write(indices_block.tobytes())
+                with open(os.path.join(d, "data"), "ab") as f_tmp:
+                    f_tmp.write(data_block.tobytes())
+        nnz = int(block_offsets[-1])
+        if max_memory is None:
+            tmp_indices = np.concatenate(blocks_indices + [np.zeros((0,), dtype=np.int32)])
+            tmp_data = np.concatenate(blocks_data + [np.zeros((0,), dtype=x.dtype)])
+        elif nnz > 0:
+            tmp_indices = np.memmap(os.path.join(d, "indices"), dtype=np.int32, mode="r", shape=(nnz,))
+            tmp_data = np.memmap(os.path.join(d, "data"), dtype=x.dtype, mode="r", shape=(nnz,))
+        else:
+            tmp_indices = np.zeros((0,), dtype=np.int32)
+            tmp_data = np.zeros((0,), dtype=x.dtype)
+        var_nnz = np.sum([np.diff(z) for z in block_indptr], axis=0).astype(np.int64) if len(block_indptr) > 0 \
+            else np.zeros((n_var,), dtype=np.int64)
+        indptr = np.concatenate([np.zeros((1,), dtype=np.int64), np.cumsum(var_nnz, dtype=np.int64)])
+        chunks_var = max(min(int(chunks_var), n_var), 1)
+        chunks_nnz = max(min(int(np.ceil(nnz / max(n_var, 1) * chunks_var)), 2 ** 20), 1)
+        g = f.create_group("X_csc")
+        g.attrs.update({"encoding-type": "csc_matrix", "shape": [n_obs, n_var], "chunks_var": chunks_var})
+        g.create_dataset("indptr", data=indptr, **compression_kwargs)
+        arr_indices = g.create_dataset("indices", shape=(nnz,), dtype=np.int32, chunks=(chunks_nnz,),
+                                       **compression_kwargs)
+        arr_data = g.create_dataset("data", shape=(nnz,), dtype=x.dtype, chunks=(chunks_nnz,), **compression_kwargs)
+        # Groups of feature chunks, the entries of a group are held twice while they are sorted by feature:
+        max_nnz = nnz if max_memory is None else max_memory * np.power(1024, 2) / (2 * (x.dtype.itemsize + 4) + 16)
+        passes = []
+        v_start = 0
+        for v in range(chunks_var, n_var + chunks_var, chunks_var):
+            v = min(v, n_var)
+            if v == n_var or indptr[min(v + chunks_var, n_var)] - indptr[v_start] > max_nnz:
+                passes.append((v_start, v))
+                v_start = v
+        for v_start, v_end in passes:
+            indices = []
+            data = []
+            features = []
+            for i, ptr in enumerate(block_indptr):
+                s, e = block_offsets[i] + ptr[v_start], block_offsets[i] + ptr[v_end]
+                indices.append(np.asarray(tmp_indices[s:e]))
+                data.append(np.asarray(tmp_data[s:e]))
+                features.append(np.repeat(np.arange(v_start, v_end), np.diff(ptr[v_start:v_end + 1])))
+            # Blocks are in observation order, so a stable sort by feature keeps observations sorted per feature:
+            order = np.argsort(np.concatenate(features + [np.zeros((0,), dtype=np.int64)]), kind="stable")
+            indices = np.concatenate(indices + [np.zeros((0,), dtype=np.int32)])
+            arr_indices[indptr[v_start]:indptr[v_end]] = indices[order]
+            del indices
+            data = np.concatenate(data + [np.zeros((0,), dtype=x.dtype)])
+            arr_data[indptr[v_start]:indptr[v_end]] = data[order]
+        del tmp_indices, tmp_data
+
+
+def _read_csc_features(g: zarr.Group, var_idx: np.ndarray) -> scipy.sparse.csr_matrix:
+    """
+    Reads features var_idx of all observations from a csc matrix saved as zarr group, see _write_x_csc().
+
+    Runs of consecutive features are read with one slice of indices and data each.
+
+    :return: Observations by selected features as csr matrix.
+    """
+    var_idx = np.asarray(var_idx, dtype=np.int64)
+    indptr = g["indptr"][...]
+    bounds = np.concatenate([[0], np.where(np.diff(var_idx) != 1)[0] + 1, [len(var_idx)]])
+    data = []
+    indices = []
+    for s, e in zip(bounds[:-1], bounds[1:]):
+        if e > s:
+            data.append(g["data"][indptr[var_idx[s]]:indptr[var_idx[e - 1] + 1]])
+            indices.append(g["indices"][indptr[var_idx[s]]:indptr[var_idx[e - 1] + 1]])
+    indptr_idx = np.concatenate([np.zeros((1,), dtype=np.int64),
+                                 np.cumsum(indptr[var_idx + 1] - indptr[var_idx], dtype=np.int64)])
+    x = scipy.sparse.csc_matrix(
+        (np.concatenate(data + [np.zeros((0,), dtype=g["data"].dtype)]),
+         np.concatenate(indices + [np.zeros((0,), dtype=np.int32)]),
+         indptr_idx),
+        shape=(g.attrs["shape"][0], len(var_idx)))
+    return x.tocsr()
+
+
+class _CscFeatures:
+    """
+    Features of a csc matrix saved as zarr group that are read from disk on first access, see _dask_from_zarr_csc().
+
+    The features are read once for all observations as csc matrices only support reads of whole features, later
+    accesses reuse them. Copies, e.g. of dask graphs that are sent to other processes, read the features again.
+    """
+
+    def __init__(self, g: zarr.Group, var_idx: np.ndarray):
+        self.g = g
+        self.var_idx = var_idx
+        self._x = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_x"] = None
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get_rows(self, start: int, end: int) -> scipy.sparse.csr_matrix:
+        with self._lock:
+            if self._x is None:
+                self._x = _read_csc_features(g=self.g, var_idx=self.var_idx)
+        return self._x[start:end, :]
+
+
+def _get_csc_rows(x: _CscFeatures, start: int, end: int) -> scipy.sparse.csr_matrix:
+    return x.get_rows(start=start, end=end)
+
+
+def _dask_from_zarr_csc(g: zarr.Group, var_idx: np.ndarray, chunks_obs: int, url: str) -> dask.array.Array:
+    """
+    Lazy dask array of features var_idx of a csc matrix saved as zarr group, see _write_x_csc().
+
+    The selected features are read once for all observations when the first chunk of the array is computed, see
+    _CscFeatures, and are then split into chunks of chunks_obs observations, each dask chunk is a
+    scipy.sparse.csr_matrix.
+    """
+    n_obs = g.attrs["shape"][0]
+    bounds = [(s, min(s + chunks_obs, n_obs)) for s in range(0, n_obs, chunks_obs)]
+    dtype = g["data"].dtype
+    x = _CscFeatures(g=g, var_idx=np.asarray(var_idx))
+    name = "sfaira-dao-csc-" + tokenize(url, g.path, np.asarray(var_idx))
+    dsk = dict([((name, i, 0), (_get_csc_rows, x, s, e)) for i, (s, e) in enumerate(bounds)])
+    return dask.array.Array(dsk, name, chunks=(tuple([e - s for s, e in bounds]), (len(var_idx),)), dtype=dtype,
+                            meta=scipy.sparse.csr_matrix((0, 0), dtype=dtype))
+
+
+def _has_csc(f: zarr.Group) -> bool:
+    return "X_csc" in f
+
+
+def _open_x(store: Union[str, Path]):
+    """
+    Backed .X of a dao data set that supports reading blocks of observations, see _get_rows().
+    """
+    x = zarr.open(path_x(store), mode="r")["X"]
+    return _ZarrCsr(group=x) if isinstance(x, zarr.Group) else x
+
+
+def _obs_chunks(x) -> Tuple[int, ...]:
+    """
+    Observation axis chunk sizes of a backed, dask or in-memory array.
+    """
+    if isinstance(x, dask.array.Array):
+        return x.chunks[0]
+    if isinstance(x, zarr.Array) or isinstance(x, _ZarrCsr):
+        chunks_obs = x.chunks[0] if isinstance(x, zarr.Array) else x.group.attrs["chunks_obs"]
+        n_obs = x.shape[0]
+        return tuple([min(chunks_obs, n_obs - s) for s in range(0, n_obs, chunks_obs)])
+    return (x.shape[0], )
+
+
+def _read_sorted_rows(x, rows: np.ndarray):
+    """
+    Reads increasing observations of a backed, dask or in-memory array into memory.
+
+    Contiguous observations are read as one slice. Other observations of dense zarr arrays are read as orthogonal
+    selection, which decompresses each overlapping chunk once, and observations of sparse zarr groups are read in runs
+    that are merged over gaps of up to one chunk, see _get_rows_coalesced().
+    """
+    if rows[-1] - rows[0] + 1 == len(rows):
+        x_rows = x[int(rows[0]):int(rows[-1]) + 1, :]
+    elif isinstance(x, zarr.Array):
+        x_rows = x.get_orthogonal_selection((rows, slice(None)))
+    elif isinstance(x, _ZarrCsr):
+        x_rows = _get_rows_coalesced(x=x, rows=rows, max_gap=x.group.attrs["chunks_obs"])
+    else:
+        x_rows = x[rows, :]
+    if isinstance(x_rows, dask.array.Array):
+        x_rows = x_rows.compute()
+    return x_rows
+
+
+class VirtualRowConcat:
+    """
+    Row-wise concatenation of selected observations of arrays that share the feature dimension, without a task graph.
+
+    Only the arrays, the selected observations of each array and the cumulative offsets of the selections are kept, so
+    that building a concatenation is O(number of arrays). Reads are routed to the arrays with numpy.searchsorted and are
+    read directly from the arrays, see _read_sorted_rows(), reads return numpy arrays or scipy.sparse.csr_matrix.
+    This replaces dask.array.vstack over the data sets of a store, which builds a graph with one task per chunk.
+
+    .chunks mirrors the chunks of the equivalent dask array, ie the observation chunks on disk that overlap with the
+    selection, so that batch schedules can split along them.
+
+    With num_threads > 1, each read is resolved up front into one read per chunk on disk and these reads are decoded
+    on a thread pool that is reused across reads. The pool is created on the first threaded read. Consumers, e.g.
+    iterators of a cart, register with .acquire() and .release(), the pool is shut down once the last consumer is
+    released, by .close() and with the object. Reads after the pool was shut down create a new pool.
+    """
+
+    arrays: list
+    rows: List[Union[None, np.ndarray]]
+    offsets: np.ndarray
+    num_threads: int
+
+    def __init__(self, arrays: list, rows: List[Union[None, np.ndarray]], num_threads: int = 1):
+        """
+
+        :param arrays: Arrays to concatenate: backed arrays (zarr.Array, _ZarrCsr), dask arrays or in-memory arrays
+            (numpy, scipy.sparse.csr_matrix).
+        :param rows: Selected observations of each array in increasing order, all observations of an array if None.
+        :param num_threads: Number of threads that read and decode the chunks of one read.
+        """
+        self.arrays = list(arrays)
+        self.rows = [None if x is None else np.asarray(x, dtype=np.int64) for x in rows]
+        n_obs = [x.shape[0] if r is None else len(r) for x, r in zip(self.arrays, self.rows)]
+        self.offsets = np.concatenate([[0], np.cumsum(n_obs)]).astype(np.int64)
+        self.num_threads = num_threads
+        self._chunks = None
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._n_consumers = 0
+
+    def __getstate__(self):
+        # Thread pools are not copied, e.g. into worker processes, these create their own pool on first read.
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        state["_n_consumers"] = 0
+        del state["_pool_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+
+    def __del__(self):
+        self.close()
+
+    def acquire(self):
+        """
+        Registers a consumer of reads, e.g. an iterator, which keeps the thread pool alive until it is released.
+        """
+        with self._pool_lock:
+            self._n_consumers += 1
+
+    def release(self):
+        """
+        Releases a consumer of reads, the thread pool is shut down once no consumer is left.
+        """
+        with self._pool_lock:
+            self._n_consumers = max(self._n_consumers - 1, 0)
+            if self._n_consumers == 0 and self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def close(self):
+        """
+        Shuts down the thread pool of threaded reads without waiting for reads in flight.
+        """
+        # __del__ may run on partially initialised objects.
+        lock = getattr(self, "_pool_lock", None)
+        if lock is None:
+            return
+        with lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def with_threads(self, num_threads: int) -> "VirtualRowConcat":
+        """
+        Concatenation of the same observations that reads with num_threads threads.
+        """
+        x = VirtualRowConcat(arrays=self.arrays, rows=self.rows, num_threads=num_threads)
+        x._chunks = self._chunks
+        return x
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return int(self.offsets[-1]), int(self.arrays[0].shape[1])
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    @property
+    def dtype(self) -> np.dtype:
+        return np.dtype(self.arrays[0].dtype)
+
+    @property
+    def is_sparse(self) -> bool:
+        x = self.arrays[0]
+        return _is_sparse(x) or (isinstance(x, dask.array.Array) and isinstance(x._meta, scipy.sparse.spmatrix))
+
+    @property
+    def chunks(self) -> Tuple[Tuple[int, ...], Tuple[int]]:
+        if self._chunks is None:
+            chunks = []
+            for x, r in zip(self.arrays, self.rows):
+                chunks_x = _obs_chunks(x)
+                if r is not None:
+                    # Number of selected observations in each chunk on disk:
+                    chunks_x = np.bincount(np.searchsorted(np.cumsum(chunks_x), r, side="right"),
+                                           minlength=len(chunks_x))
+                chunks.extend([int(y) for y in chunks_x if y > 0])
+            self._chunks = (tuple(chunks), (self.shape[1], ))
+        return self._chunks
+
+    def __getitem__(self, key):
+        """
+        Reads observations, and optionally features, into memory.
+
+        :param key: Observations as integer, slice or integer array in any order, optionally in a tuple with a feature
+            selection.
+        :return: Selection as numpy array or scipy.sparse.csr_matrix, always two-dimensional.
+        """
+        rows, var_idx = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(rows, slice):
+            rows = np.arange(*rows.indices(self.shape[0]))
+        x = self._get_rows(np.asarray(rows, dtype=np.int64).reshape(-1))
+        if not (isinstance(var_idx, slice) and var_idx == slice(None)):
+            x = x[:, var_idx]
+        return x
+
+    def _get_rows(self, idx: np.ndarray):
+        if len(idx) == 0:
+            x = self.arrays[0][:0, :]
+            return x.compute() if isinstance(x, dask.array.Array) else x
+        order = np.argsort(idx, kind="stable")
+        idx_sorted = idx[order]
+        # Array of each observation:
+        ds = np.searchsorted(self.offsets, idx_sorted, side="right") - 1
+        bounds = np.concatenate([[0], np.where(np.diff(ds) != 0)[0] + 1, [len(ds)]])
+        reads = []
+        for s, e in zip(bounds[:-1], bounds[1:]):
+            d = ds[s]
+            rows = idx_sorted[s:e] - self.offsets[d]
+            if self.rows[d] is not None:
+                rows = self.rows[d][rows]
+            reads.extend([(d, x) for x in self._split_rows(d=d, rows=rows)])
+        if self.num_threads > 1 and len(reads) > 1:
+            # Reads are submitted under the lock, so that concurrent reads, e.g. of prefetch threads of a cart, share
+            # one pool and so that .close() does not shut the pool down between its creation and the submission.
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.num_threads)
+                futures = [self._pool.submit(_read_sorted_rows, x=self.arrays[d], rows=rows) for d, rows in reads]
+            blocks = [x.result() for x in futures]
+        else:
+            blocks = [_read_sorted_rows(x=self.arrays[d], rows=rows) for d, rows in reads]
+        if len(blocks) == 1:
+            x = blocks[0]
+        elif scipy.sparse.issparse(blocks[0]):
+            x = scipy.sparse.vstack(blocks, format="csr")
+        else:
+            x = np.concatenate(blocks, axis=0)
+        if np.any(np.diff(order) != 1):
+            x = x[_invert_permutation(order), :]
+        return x
+
+    def _split_rows(self, d: int, rows: np.ndarray) -> List[np.ndarray]:
+        """
+        Splits increasing observations of array d into up to .num_threads reads of consecutive chunks on disk if reads
+        are threaded, so that no chunk is decoded by two threads.
+        """
+        x = self.arrays[d]
+        if self.num_threads <= 1 or not (isinstance(x, zarr.Array) or isinstance(x, _ZarrCsr)):
+            return [rows]
+        chunks_obs = x.chunks[0] if isinstance(x, zarr.Array) else x.group.attrs["chunks_obs"]
+        # Rank of the chunk of each observation among the chunks that are read:
+        chunk_rank = np.concatenate([[0], np.cumsum(np.diff(rows // chunks_obs) != 0)])
+        n_chunks = chunk_rank[-1] + 1
+        part = chunk_rank * min(self.num_threads, n_chunks) // n_chunks
+        return np.split(rows, np.where(np.diff(part) != 0)[0] + 1)
+
+    def to_memory(self) -> "VirtualRowConcat":
+        """
+        Concatenation of the selected observations read into memory, saved as csr matrix.
+        """
+        x = self[:]
+        x = scipy.sparse.csr_matrix(x) if not scipy.sparse.issparse(x) else x
+        x_memory = VirtualRowConcat(arrays=[x], rows=[None], num_threads=self.num_threads)
+        x_memory._chunks = self.chunks
+        return x_memory
+
+
+def _x_entry(f: zarr.Group) -> Tuple[Tuple[int, int], int, bool, np.dtype]:
+    """
+    Shape, observation chunk size, density and data type of .X in a dao zarr group.
+    """
+    if isinstance(f["X"], zarr.Group):
+        return tuple(f["X"].attrs["shape"]), f["X"].attrs["chunks_obs"], False, f["X"]["data"].dtype
+    else:
+        return f["X"].shape, f["X"].chunks[0], True, f["X"].dtype
+
+
+def read_dao_entry(store: Union[str, Path]) -> dict:
+    """
+    Assembles the catalog entry of a dao data set from disk, see also sfaira.data.store.io.catalog.
+
+    :param store: Path to data set directory.
+    """
+    f_x = zarr.open(path_x(store), mode="r")
+    shape, chunks_obs, dense, dtype = _x_entry(f=f_x)
+    with open(path_uns(store), "rb") as f:
+        uns = pickle.load(file=f)
+    obs = pd.read_parquet(path_obs(store), engine="pyarrow")
+    var_names = pd.read_parquet(path_var(store), columns=[], engine="pyarrow").index.tolist()
+    return catalog_entry(path=os.path.basename(os.path.normpath(store)), uns=uns, obs_columns=obs.columns.tolist(),
+                         var_names=var_names, shape=shape, chunks_obs=chunks_obs, dense=dense, dtype=dtype,
+                         csc=_has_csc(f_x), obs_categories=_obs_categories(obs))
+
+
+def _obs_dtypes(obs: pd.DataFrame) -> dict:
+    """
+    Data types of .obs columns in dao stores.
+
+    Numeric and boolean columns keep their type. All other columns are saved as categorical columns with string levels,
+    these are dictionary encoded in parquet.
+    """
+    dtypes = {}
+    for col in obs.columns:
+        dtype = obs[col].dtype
+        if isinstance(dtype, pd.api.types.CategoricalDtype):
+            if not np.all([isinstance(x, str) for x in dtype.categories]):
+                dtypes[col] = str
+        elif not (pd.api.types.is_numeric_dtype(dtype) or pd.api.types.is_bool_dtype(dtype)):
+            dtypes[col] = str
+    return dtypes
+
+
+def _obs_categories(obs: pd.DataFrame, max_categories: int = OBS_MAX_CATEGORIES) -> Dict[str, List[str]]:
+    """
+    Levels of categorical .obs columns with at most max_categories levels, these are recorded in the store catalog.
+    """
+    return dict([
+        (col, [str(x) for x in obs[col].cat.categories]) for col in obs.columns
+        if isinstance(obs[col].dtype, pd.api.types.CategoricalDtype) and len(obs[col].cat.categories) <= max_categories
+    ])
+
+
+def _write_meta(store: Union[str, Path], adata: anndata.AnnData, perm: np.ndarray,
+                perm_original_data: Union[None, np.ndarray], row_group_size: Union[None, int] = None) -> \
+        Dict[str, List[str]]:
+    """
+    Writes .obs and .var as parquet tables and .uns as pickle into a store directory.
+
+    .obs columns keep numeric types, all other columns are saved as dictionary encoded categorical columns, see
+    _obs_dtypes(). Row groups of .obs can be aligned to chunks of .X so that queries on .obs that are restricted to a
+    few row groups via their statistics only touch these, see read_obs_where().
+
+    :param store: Store directory of data set.
+    :param adata: Anndata to save, can be backed.
+    :param perm: Ordering of observations in the store.
+    :param perm_original_data: Permutation that restores the original ordering, saved as an .obs column if not None.
+    :param row_group_size: Number of observations per row group of .obs.
+    :return: Levels of categorical .obs columns, see _obs_categories().
+    """
+    # Write .uns into pickle:
+    with open(path_uns(store), "wb") as f:
+        # convert to dict to get rid of anndata OverloadedDict
+        pickle.dump(obj=dict(adata.uns), file=f)
+    # Write .obs and .var as a separate file as this can be easily interfaced with DataFrames.
+    obs = normalise_categorical_order(adata.obs.iloc[perm])
+    dtypes = _obs_dtypes(obs)
+    obs = (
+        obs
+        .astype(dtypes)
+        .astype(dict([(col, 'category') for col in dtypes.keys()]))
+        # only assign permutation_original_data column if data was shuffled
+        .pipe(_assign_perm_original_data_column, perm=perm_original_data)
+    )
+    obs.to_parquet(path=path_obs(store), engine='pyarrow', compression='snappy', index=None,
+                   row_group_size=row_group_size)
+    adata.var.to_parquet(path=path_var(store), engine='pyarrow', compression='snappy', index=None)
+    return _obs_categories(obs)
+
+
+def _row_group_may_contain(statistics, values: list) -> bool:
+    """
+    Whether the min-max statistics of a column chunk of a parquet row group admit any of values.
+    """
+    if statistics is None or not statistics.has_min_max:
+        return True
+    for v in values:
+        try:
+            if statistics.min <= v <= statistics.max:
+                return True
+        except TypeError:
+            return True
+    return False
+
+
+def read_obs_where(store: Union[str, Path], column: str, values: Union[list, np.ndarray]) -> np.ndarray:
+    """
+    Indices of observations of a dao data set for which a column of .obs has one of values.
+
+    Only the queried column is read and only from the row groups whose min-max statistics admit any of the values,
+    see _write_meta().
+
+    :param store: Directory of the data set.
+    :param column: Column of .obs.
+    :param values: Values to select.
+    :return: Sorted observation indices.
+    """
+    values = list(values)
+    idx = []
+    with pq.ParquetFile(path_obs(store)) as pf:
+        j = pf.metadata.schema.names.index(column)
+        offset = 0
+        for i in range(pf.metadata.num_row_groups):
+            row_group = pf.metadata.row_group(i)
+            if len(values) > 0 and _row_group_may_contain(statistics=row_group.column(j).statistics, values=values):
+                values_i = pf.read_row_group(i, columns=[column]).column(0).to_pandas()
+                idx.append(np.where(values_i.isin(values).to_numpy())[0] + offset)
+            offset += row_group.num_rows
+    return np.concatenate(idx) if len(idx) > 0 else np.array([], dtype=np.int64)
+
+
+def read_obs_unique(store: Union[str, Path], column: str) -> np.ndarray:
+    """
+    Unique values of a column of .obs of a dao data set, only this column is read.
+
+    :param store: Directory of the data set.
+    :param column: Column of .obs.
+    :return: Unique values.
+    """
+    return pd.unique(pd.read_parquet(path_obs(store), columns=[column], engine="pyarrow")[column].to_numpy())
+
+
 def write_dao(store: Union[str, Path], adata: anndata.AnnData, chunks: Union[bool, Tuple[int, int]],
-              compression_kwargs: dict, shuffle_data: bool = False):
+              compression_kwargs: dict, shuffle_data: bool = False, dense: bool = True, num_workers: int = 1,
+              max_memory: Union[None, float] = None, catalog: bool = False, csc: Union[bool, int] = False,
+              dtype: Union[None, str, np.dtype] = None, ontology_index: bool = False):
     """
     Writes a distributed access optimised ("dao") store of a dataset based on an AnnData instance.
 
     The following components are saved:
-        - .X: as zarr array which can be interfaced with zarr or dask (or xarray).
+        - .X: as zarr array which can be interfaced with zarr or dask (or xarray) if dense. If not dense, .X is saved
+            as a zarr group with the arrays indptr, indices and data of a csr matrix which are chunked along
+            observations.
+        - .X_csc (optional): feature-major copy of .X as a zarr group with the arrays indptr, indices and data of a csc
+            matrix which are chunked along features, see _write_x_csc(). Queries of a few features across all
+            observations only read these features from this copy.
         - .obs: as parquet table which can be interfaced with pandas.DataFrame (and dask.dataframe.DataFrame).
         - .var: as parquet table which can be interfaced with pandas.DataFrame (and dask.dataframe.DataFrame).
         - .uns: as a pickle to be flexible with values here.
+        - per-cell statistics: total counts, number of detected features and size factors as parquet table, see
+            write_stats(). These are read by stores and estimators instead of summing over .X.
+        - ontology-closure index (optional): bitmaps of the observations by annotation and the ontology closure of each
+            annotation of the ontology-constrained .obs columns, see
+            sfaira.data.store.io.ontology_index.write_ontology_index(). Sub-setting by ontology terms reads this index.
 
     TODO: If layers become relevant for this store, they can be added into the zarr group.
     TODO: If obsp, varp become relevant for this store, they can be added into the zarr group.
     TODO: If obsm, varm become relevant for this store, they can be added into the zarr group.
 
     :param store: File name of the store (zarr group).
-    :param adata: Anndata to save.
+    :param adata: Anndata to save, can be backed.
     :param chunks: Chunking of .X for zarr.
     :param compression_kwargs: Compression kwargs for zarr.
-    :param shuffle_data: If True -> shuffle ordering of cells in dataset before writing store to disk
+    :param shuffle_data: If True -> shuffle ordering of cells in dataset before writing store to disk. The permutation
+        that restores the original ordering is saved in the .obs column "permutation_original_data". Permuted blocks of
+        cells are read directly from adata.X so that the permuted matrix is not copied in memory.
+    :param dense: Whether to write .X as a dense zarr array or as a sparse csr matrix in a zarr group.
+    :param num_workers: Number of threads used to compress and write chunk-aligned blocks of .X.
+    :param max_memory: Upper bound in MB on the size of the blocks of .X that are held in memory at the same time.
+    :param catalog: Whether to add this data set to the catalog of the store, ie the parent directory of store, see
+        also sfaira.data.store.io.catalog. Only set this if the parent directory of store is a store, data set
+        directories in the parent directory that do not have a catalog yet are added to the new catalog.
+    :param csc: Whether to write a feature-major copy of .X, the number of features per chunk of this copy can be
+        given instead of True.
+    :param dtype: Data type of .X on disk, defaults to the data type of adata.X. The data type is recorded in the store
+        catalog and carts emit float32 for integer and float16 stores. Options:
+
+            - "counts": Packs count matrices into the smallest of uint8, uint16 and uint32 that holds the largest count
+                of the data set, raises if .X is not a non-negative integer matrix.
+            - Any numpy data type, e.g. "float16" for processed data, raises if .X has finite entries that are out of
+                the range of the data type.
+    :param ontology_index: Whether to write the ontology-closure index of .obs, this loads the ontologies.
     """
     # Write numeric matrix as zarr array:
     f = zarr.open(store=path_x(store), mode="w")
@@ -79,46 +1067,94 @@ def write_dao(store: Union[str, Path], adata: anndata.AnnData, chunks: Union[boo
     else:
         perm = np.arange(0, adata.X.shape[0])
         perm_original_data = None
-    # If adata.X is already a dense array in memory, it can be safely written fully to a zarr array. Otherwise:
-    # Create empty store and then write in dense chunks to avoid having to load entire adata.X into a dense array in
-    # memory.
-    if isinstance(adata.X, np.ndarray) or isinstance(adata.X, np.matrix):
-        f.create_dataset("X", data=np.array(adata.X)[perm], chunks=chunks, dtype=adata.X.dtype, **compression_kwargs)
-    elif isinstance(adata.X, scipy.sparse.csr_matrix):
-        # Initialise empty array
-        dtype = adata.X.data.dtype
-        shape = adata.X.shape
-        f.create_dataset("X", shape=shape, dtype=dtype, fill_value=0., chunks=chunks, **compression_kwargs)
-        batch_size = 128  # Use a batch size that guarantees that the dense batch fits easily into memory.
-        n_batches = shape[0] // batch_size + int(shape[0] % batch_size > 0)
-        batches = [(i * batch_size, min(i * batch_size + batch_size, shape[0])) for i in range(n_batches)]
-        x_permuted = adata.X[perm]
-        for s, e in batches:
-            f["X"][s:e, :] = np.asarray(x_permuted[s:e, :].todense(), dtype=dtype)
+    x = adata.X
+    if not (isinstance(x, np.ndarray) or isinstance(x, h5py.Dataset) or _is_sparse(x)):
+        raise ValueError(f"did not recognise array format {type(x)}")
+    if isinstance(x, scipy.sparse.spmatrix) and not isinstance(x, scipy.sparse.csr_matrix):
+        x = scipy.sparse.csr_matrix(x)
+    # Observations are read from adata.X in blocks that are aligned to the zarr chunks, in the permuted order if the
+    # data is shuffled. This avoids copying the (permuted) full matrix and bounds memory usage by a few blocks.
+    rows = perm if shuffle_data else None
+    dtype = _packed_dtype(x=x, dtype=dtype)
+    if dense:
+        _write_x_dense(f=f, x=x, rows=rows, chunks=chunks, compression_kwargs=compression_kwargs,
+                       num_workers=num_workers, max_memory=max_memory, dtype=dtype)
     else:
-        raise ValueError(f"did not recognise array format {type(adata.X)}")
-    # Write .uns into pickle:
-    with open(path_uns(store), "wb") as f:
-        # convert to dict to get rid of anndata OverloadedDict
-        pickle.dump(obj=dict(adata.uns), file=f)
-    # Write .obs and .var as a separate file as this can be easily interfaced with DataFrames.
-    (
-        adata
-        .obs.iloc[perm]
-        # only assign permutation_original_data column if data was shuffled
-        .pipe(_assign_perm_original_data_column, perm=perm_original_data)
-        # make sure all columns are dtype=str and are converted to categorical
-        # this has to change if we have numeric values in obs
-        # exclude 'perumtation_original_data' column from this as it's numeric
-        .astype({col: str for col in adata.obs.columns if col not in ['permutation_original_data']})
-        .astype({col: 'category' for col in adata.obs.columns if col not in ['permutation_original_data']})
-        .to_parquet(path=path_obs(store), engine='pyarrow', compression='snappy', index=None)
-    )
-    adata.var.to_parquet(path=path_var(store), engine='pyarrow', compression='snappy', index=None)
+        _write_x_sparse(f=f, x=x, rows=rows, chunks=chunks, compression_kwargs=compression_kwargs,
+                        num_workers=num_workers, max_memory=max_memory, dtype=dtype)
+    if csc:
+        # Written from the store rather than from adata.X so that the observations are in the order of the store.
+        _write_x_csc(f=f, x=_open_x(store), chunks_var=CSC_CHUNKS_VAR if csc is True else csc,
+                     compression_kwargs=compression_kwargs, max_memory=max_memory, dir_tmp=store)
+    _write_stats(store=store, x=x, rows=rows, num_workers=num_workers, max_memory=max_memory)
+    obs_categories = _write_meta(store=store, adata=adata, perm=perm, perm_original_data=perm_original_data,
+                                 row_group_size=_x_entry(f=zarr.open(path_x(store), mode="r"))[1])
+    if ontology_index:
+        write_ontology_index(store=store)
+    if catalog:
+        path_store, path_dataset = os.path.split(os.path.normpath(os.path.abspath(store)))
+        shape, chunks_obs, dense, dtype = _x_entry(f=zarr.open(path_x(store), mode="r"))
+        obs_columns = adata.obs.columns.tolist() + (["permutation_original_data"] if shuffle_data else [])
+        entry = catalog_entry(path=path_dataset, uns=dict(adata.uns), obs_columns=obs_columns,
+                              var_names=adata.var_names.tolist(), shape=shape, chunks_obs=chunks_obs, dense=dense,
+                              dtype=dtype, csc=bool(csc), obs_categories=obs_categories)
+        if read_catalog(path_store) is None and len(os.listdir(path_store)) > 1:
+            # Adopt data sets of stores that were written before catalogs were maintained.
+            write_catalog(path_store)
+        else:
+            update_catalog(path_store=path_store, entries={path_dataset: entry})
+
+
+def write_csc_dao(store: Union[str, Path], chunks_var: int = None, compression_kwargs: Union[None, dict] = None,
+                  max_memory: Union[None, float] = None):
+    """
+    Adds a feature-major copy of .X to a dao data set, see write_dao(csc=True), and updates the store catalog.
+
+    :param store: Directory of the data set.
+    :param chunks_var: Number of features per chunk of the copy.
+    :param compression_kwargs: Compression kwargs for zarr, defaults to the compressor of .X.
+    :param max_memory: Upper bound in MB on the non-zero entries held in memory while .X is transposed.
+    """
+    x = _open_x(store)
+    if compression_kwargs is None:
+        compression_kwargs = {"compressor": x.group["data"].compressor if isinstance(x, _ZarrCsr) else x.compressor}
+    f = zarr.open(store=path_x(store), mode="r+")
+    if _has_csc(f):
+        del f["X_csc"]
+    _write_x_csc(f=f, x=x, chunks_var=CSC_CHUNKS_VAR if chunks_var is None else chunks_var,
+                 compression_kwargs=compression_kwargs, max_memory=max_memory, dir_tmp=store)
+    path_store, path_dataset = os.path.split(os.path.normpath(os.path.abspath(store)))
+    if read_catalog(path_store) is not None and path_dataset in read_catalog(path_store).keys():
+        update_catalog(path_store=path_store, entries={path_dataset: read_dao_entry(store)})
+
+
+def read_x_dao(store: Union[str, Path], use_dask: bool = True) -> \
+        Union[dask.array.Array, np.ndarray, scipy.sparse.csr_matrix]:
+    """
+    Reads .X of a distributed access optimised ("dao") store of a dataset.
+
+    :param store: Path to zarr group.
+    :param use_dask: Whether to return a lazy dask array or to load .X into memory.
+    :return: .X as dask array, the chunks of this array are scipy.sparse.csr_matrix if the store is sparse, or as
+        numpy array or scipy.sparse.csr_matrix.
+    """
+    f = zarr.open(path_x(store), mode="r")
+    if isinstance(f["X"], zarr.Group):
+        # Sparse store, see write_dao().
+        if use_dask:
+            x = _dask_from_zarr_csr(g=f["X"], url=path_x(store))
+        else:
+            x = _read_csr_block(g=f["X"], start=0, end=f["X"].attrs["shape"][0])
+    elif use_dask:
+        x = dask.array.from_zarr(url=path_x(store), component="X")
+    else:
+        x = f["X"]  # Select member of group.
+        x = x[...]  # Load into memory.
+    return x
 
 
 def read_dao(store: Union[str, Path], use_dask: bool = True, columns: Union[None, List[str]] = None,
-             obs_separate: bool = False, x_separate: bool = False) -> \
+             obs_separate: bool = False, x_separate: bool = False, var: Union[None, pd.DataFrame] = None) -> \
         Union[Tuple[anndata.AnnData, Union[dask.dataframe.DataFrame, pd.DataFrame]], anndata.AnnData]:
     """
     Assembles an AnnData instance based on distributed access optimised ("dao") store of a dataset.
@@ -126,7 +1162,7 @@ def read_dao(store: Union[str, Path], use_dask: bool = True, columns: Union[None
     See write_distributed_access_optimised() for the expected format of the store.
     In particular, if use_dask is True:
 
-        - .X is interfaced as a dask Array
+        - .X is interfaced as a dask Array, the chunks of this array are scipy.sparse.csr_matrix if the store is sparse.
 
     Can return representation of .obs separately, which makes sense if a HPC framework is used for this tabular format
     which is not supported by AnnData as an .obs entry.
@@ -136,23 +1172,20 @@ def read_dao(store: Union[str, Path], use_dask: bool = True, columns: Union[None
     :param columns: Which columns to read into the obs copy in the output, see pandas.read_parquet().
     :param obs_separate: Whether to return .obs as a separate return value or in the returned AnnData.
     :param x_separate: Whether to return .X as a separate return value or in the returned AnnData.
+    :param var: .var table to use instead of reading it from the store, e.g. if it is shared across data sets.
     :return: Tuple of:
         - AnnData with .X as dask array.
         - obs table separately as dataframe
     """
     assert not (obs_separate and x_separate), "either request obs_separate or x_separate, or neither, but not both"
-    if use_dask:
-        x = dask.array.from_zarr(url=path_x(store), component="X")
-    else:
-        f = zarr.open(path_x(store), mode="r")
-        x = f["X"]  # Select member of group.
-        x = x[...]  # Load into memory.
+    x = read_x_dao(store=store, use_dask=use_dask)
     # Read pickle:
     with open(path_uns(store), "rb") as f:
         uns = pickle.load(file=f)
     # Read tables:
     obs = pd.read_parquet(path_obs(store), columns=columns, engine="pyarrow")
-    var = pd.read_parquet(path_var(store), engine="pyarrow")
+    if var is None:
+        var = pd.read_parquet(path_var(store), engine="pyarrow")
     d = {"var": var, "uns": uns}
     # Assemble AnnData without obs to save memory:
     adata = anndata.AnnData(**d, shape=x.shape)
@@ -167,3 +1200,269 @@ def read_dao(store: Union[str, Path], use_dask: bool = True, columns: Union[None
         return adata, x
     else:
         return adata
+
+
+class _XByKeyDao(Mapping):
+    """
+    View on .X of the data sets in a DatasetsDao, data sets are opened on first access.
+    """
+
+    def __init__(self, datasets: "DatasetsDao"):
+        self._datasets = datasets
+
+    def __getitem__(self, k: str) -> dask.array.Array:
+        return self._datasets.x(k)
+
+    def __iter__(self):
+        return iter(self._datasets)
+
+    def __len__(self) -> int:
+        return len(self._datasets)
+
+
+class DatasetsDao(Mapping):
+    """
+    Dictionary of dao data sets by data set ID in which data sets are only opened on first access.
+
+    Meta data that is declared in the store catalog (see sfaira.data.store.io.catalog), such as the number of
+    observations, the organism and the feature space of a data set, is available without opening the data set.
+    Opened data sets that are not used anymore can be released with .evict(), these are re-opened on the next access.
+    Data sets that are not declared in a catalog can be supplied as opened data sets, these are never evicted.
+    """
+
+    def __init__(self,
+                 paths: Union[None, Dict[str, Union[str, Path]]] = None,
+                 entries: Union[None, Dict[str, dict]] = None,
+                 columns: Union[None, List[str]] = None,
+                 adata_by_key: Union[None, Dict[str, anndata.AnnData]] = None,
+                 x_by_key: Union[None, Dict[str, dask.array.Array]] = None):
+        """
+
+        :param paths: Data set directories by data set ID of data sets that are opened on first access.
+        :param entries: Catalog entries by data set ID of data sets in paths.
+        :param columns: Which columns to read into .obs of opened data sets, see pandas.read_parquet().
+        :param adata_by_key: Data sets that are already opened by data set ID.
+        :param x_by_key: .X of data sets in adata_by_key by data set ID, defaults to .X of these data sets.
+        """
+        self._paths = dict(paths) if paths is not None else {}
+        self._entries = dict(entries) if entries is not None else {}
+        self._columns = columns
+        self._adata = dict(adata_by_key) if adata_by_key is not None else {}
+        self._x = dict(x_by_key) if x_by_key is not None else dict([(k, v.X) for k, v in self._adata.items()])
+        self._keys = list(dict.fromkeys(list(self._paths.keys()) + list(self._adata.keys())))
+        self._var_by_hash = {}
+        self._var_hash = {}
+        self._stats = {}
+        self._ontology_index = {}
+        self._x_backed = {}
+        self._obs_arrow = {}
+        self.x_by_key = _XByKeyDao(datasets=self)
+
+    def __getitem__(self, k: str) -> anndata.AnnData:
+        self._open(k)
+        return self._adata[k]
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, k) -> bool:
+        return k in self._paths.keys() or k in self._adata.keys()
+
+    def _open(self, k: str):
+        if k not in self._adata.keys():
+            if k not in self._paths.keys():
+                raise KeyError(k)
+            var_hash = self._entries[k]["var_hash"] if k in self._entries.keys() else None
+            adata, x = read_dao(self._paths[k], use_dask=True, columns=self._columns, obs_separate=False,
+                                x_separate=True, var=self._var_by_hash.get(var_hash, None))
+            if var_hash is not None:
+                self._var_by_hash[var_hash] = adata.var
+            self._adata[k] = adata
+            self._x[k] = x
+
+    def x(self, k: str) -> dask.array.Array:
+        """
+        .X of data set.
+        """
+        self._open(k)
+        return self._x[k]
+
+    def x_backed(self, k: str):
+        """
+        .X of data set as backed zarr array or csr matrix that is read without dask, see _open_x(), or as the dask array
+        in .x_by_key if the data set was supplied opened.
+
+        Does not open the data set.
+        """
+        if k not in self._paths.keys():
+            return self.x(k)
+        if k not in self._x_backed.keys():
+            self._x_backed[k] = _open_x(self._paths[k])
+        return self._x_backed[k]
+
+    def obs_arrow(self, k: str) -> pa.Table:
+        """
+        .obs of data set as Arrow table without index, read from the parquet table without conversion to pandas, see
+        sfaira.data.store.obs_table.
+
+        Does not open the data set.
+        """
+        if k not in self._paths.keys():
+            return obs_to_arrow(self[k].obs)
+        if k not in self._obs_arrow.keys():
+            table = pq.read_table(path_obs(self._paths[k]), columns=self._columns)
+            pandas_meta = table.schema.pandas_metadata
+            index_columns = [x for x in pandas_meta["index_columns"] if isinstance(x, str)] \
+                if pandas_meta is not None else []
+            table = table.drop([x for x in index_columns if x in table.column_names])
+            self._obs_arrow[k] = table.replace_schema_metadata(None)
+        return self._obs_arrow[k]
+
+    def entry(self, k: str) -> Union[None, dict]:
+        """
+        Catalog entry of data set or None if data set is not declared in a catalog.
+        """
+        return self._entries[k] if k in self._entries.keys() else None
+
+    def is_open(self, k: str) -> bool:
+        return k in self._adata.keys()
+
+    def n_obs(self, k: str) -> int:
+        if k in self._entries.keys():
+            return self._entries[k]["shape"][0]
+        return self[k].n_obs
+
+    def stats(self, k: str) -> Union[None, pd.DataFrame]:
+        """
+        Per-cell statistics of data set, see write_stats(), or None if the data set has no statistics.
+
+        Does not open the data set.
+        """
+        if k not in self._stats.keys():
+            self._stats[k] = read_stats(self._paths[k]) if k in self._paths.keys() else None
+        return self._stats[k]
+
+    def ontology_index(self, k: str) -> Union[None, OntologyIndex]:
+        """
+        Ontology-closure index of data set, see sfaira.data.store.io.ontology_index, or None if the data set has no
+        index.
+
+        Does not open the data set.
+        """
+        if k not in self._ontology_index.keys():
+            self._ontology_index[k] = read_ontology_index(self._paths[k]) if k in self._paths.keys() else None
+        return self._ontology_index[k]
+
+    def has_csc(self, k: str) -> bool:
+        """
+        Whether data set has a feature-major copy of .X, see write_dao(csc=True).
+        """
+        if k in self._entries.keys() and "csc" in self._entries[k].keys():
+            return self._entries[k]["csc"]
+        return k in self._paths.keys() and os.path.isdir(os.path.join(self._paths[k], "zarr", "X_csc"))
+
+    def x_features(self, k: str, var_idx: np.ndarray) -> dask.array.Array:
+        """
+        Features var_idx of .X of data set read from the feature-major copy of .X, see has_csc().
+
+        Does not open the data set.
+        """
+        g = zarr.open(path_x(self._paths[k]), mode="r")["X_csc"]
+        chunks_obs = self._entries[k]["chunks_obs"] if k in self._entries.keys() else \
+            _x_entry(f=zarr.open(path_x(self._paths[k]), mode="r"))[1]
+        return _dask_from_zarr_csc(g=g, var_idx=var_idx, chunks_obs=chunks_obs, url=path_x(self._paths[k]))
+
+    def organism(self, k: str, key: str = "organism"):
+        """
+        Organism of data set.
+
+        :param k: Data set ID.
+        :param key: Key of organism in .uns, used if data set is not declared in a catalog.
+        """
+        if k in self._entries.keys() and self._entries[k]["organism"] is not None:
+            return self._entries[k]["organism"]
+        return self[k].uns[key]
+
+    def var_hash(self, k: str) -> str:
+        """
+        Hash of feature names of data set, see sfaira.data.store.io.catalog.hash_var_names().
+        """
+        if k in self._entries.keys():
+            return self._entries[k]["var_hash"]
+        if k not in self._var_hash.keys():
+            self._var_hash[k] = hash_var_names(self[k].var_names.tolist())
+        return self._var_hash[k]
+
+    def var_names(self, k: str) -> List[str]:
+        """
+        Feature names of data set, only reads .var if data set is not opened yet.
+        """
+        if k in self._adata.keys():
+            return self._adata[k].var_names.tolist()
+        var_hash = self.var_hash(k)
+        if var_hash not in self._var_by_hash.keys():
+            self._var_by_hash[var_hash] = pd.read_parquet(path_var(self._paths[k]), engine="pyarrow")
+        return self._var_by_hash[var_hash].index.tolist()
+
+    def uns_meta(self, k: str) -> Union[None, dict]:
+        """
+        Meta data from .uns that is declared in catalog or None if the data set catalog entry does not contain it.
+        """
+        entry = self.entry(k)
+        return entry["uns"] if entry is not None and "uns" in entry.keys() else None
+
+    def obs_columns(self, k: str) -> Union[None, List[str]]:
+        """
+        Columns of .obs of data set that are declared in catalog or None if the catalog entry does not contain them.
+        """
+        entry = self.entry(k)
+        if entry is None or "obs_columns" not in entry.keys():
+            return None
+        if self._columns is None:
+            return entry["obs_columns"]
+        return [x for x in entry["obs_columns"] if x in self._columns]
+
+    def obs_unique(self, k: str, column: str) -> np.ndarray:
+        """
+        Unique values of a column of .obs of data set.
+
+        Levels of categorical columns are taken from the catalog, other columns are read from disk without opening the
+        data set.
+        """
+        entry = self.entry(k)
+        if entry is not None and column in entry.get("obs_categories", {}).keys():
+            return np.asarray(entry["obs_categories"][column])
+        if k in self._paths.keys():
+            return read_obs_unique(store=self._paths[k], column=column)
+        return pd.unique(self[k].obs[column].to_numpy())
+
+    def obs_where(self, k: str, column: str, values: Union[list, np.ndarray]) -> np.ndarray:
+        """
+        Indices of observations of data set for which a column of .obs has one of values, see read_obs_where().
+
+        Does not open the data set.
+        """
+        if k in self._paths.keys():
+            return read_obs_where(store=self._paths[k], column=column, values=values)
+        return np.where(np.isin(self[k].obs[column].to_numpy(), values))[0]
+
+    def evict(self, keep: Iterable[str]):
+        """
+        Releases opened data sets that are not in keep and that can be re-opened from disk.
+
+        :param keep: Data set IDs of data sets to keep open.
+        """
+        keep = set(keep)
+        for k in list(self._adata.keys()):
+            if k not in keep and k in self._paths.keys():
+                del self._adata[k]
+                del self._x[k]
+        for k in list(self._x_backed.keys()):
+            if k not in keep:
+                del self._x_backed[k]
+        for k in list(self._obs_arrow.keys()):
+            if k not in keep:
+                del self._obs_arrow[k]
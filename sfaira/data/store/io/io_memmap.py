@@ -0,0 +1,110 @@
+import anndata
+import h5py
+import numpy as np
+import os
+import pandas as pd
+from pathlib import Path
+import pickle
+import scipy.sparse
+from typing import List, Tuple, Union
+
+from sfaira.data.store.io.io_dao import _get_rows, _invert_permutation, _is_sparse, _map_blocks, _packed_dtype, \
+    _write_meta, _write_stats, path_obs, path_uns, path_var
+
+"""
+Memory-mapped stores save .X of a data set as an uncompressed, row-major numpy array (.npy) next to the .obs, .var and
+.uns representations of dao stores.
+
+.X is opened with numpy.memmap so that observations are read without decompression and without a task graph: Slices of
+contiguous observations are views on the file and random access is only limited by the page cache and the disk.
+These stores are larger on disk than compressed dao stores and are meant for hot training data on fast local disks.
+"""
+
+
+def path_x_memmap(path):
+    if not os.path.exists(path):
+        os.makedirs(path)
+    return os.path.join(path, "X.npy")
+
+
+def is_memmap_store(path: Union[str, Path]) -> bool:
+    """
+    Whether a directory is a data set in a memory-mapped store.
+    """
+    return os.path.isfile(os.path.join(path, "X.npy"))
+
+
+def write_memmap(store: Union[str, Path], adata: anndata.AnnData, shuffle_data: bool = False, dtype=None,
+                 num_workers: int = 1, max_memory: Union[None, float] = None, block_size: int = 4096):
+    """
+    Writes a memory-mapped store of a dataset based on an AnnData instance.
+
+    The following components are saved:
+        - .X: as dense, uncompressed and row-major .npy file which can be opened with numpy.load(mmap_mode="r").
+        - .obs: as parquet table, see write_dao().
+        - .var: as parquet table, see write_dao().
+        - .uns: as a pickle, see write_dao().
+        - per-cell statistics: as parquet table, see write_dao().
+
+    :param store: Directory of the data set.
+    :param adata: Anndata to save, can be backed.
+    :param shuffle_data: If True -> shuffle ordering of cells in dataset before writing store to disk. The permutation
+        that restores the original ordering is saved in the .obs column "permutation_original_data".
+    :param dtype: Data type of .X on disk, defaults to data type of adata.X, see also write_dao(). Use "counts" to pack
+        count matrices into the smallest unsigned integer type that holds the largest count.
+    :param num_workers: Number of threads used to write blocks of .X.
+    :param max_memory: Upper bound in MB on the size of the blocks of .X that are held in memory at the same time.
+    :param block_size: Number of observations written at once.
+    """
+    x = adata.X
+    if not (isinstance(x, np.ndarray) or isinstance(x, h5py.Dataset) or _is_sparse(x)):
+        raise ValueError(f"did not recognise array format {type(x)}")
+    if isinstance(x, scipy.sparse.spmatrix) and not isinstance(x, scipy.sparse.csr_matrix):
+        x = scipy.sparse.csr_matrix(x)
+    if shuffle_data:
+        perm = np.arange(0, x.shape[0])
+        np.random.shuffle(perm)
+        perm_original_data = _invert_permutation(perm)
+    else:
+        perm = np.arange(0, x.shape[0])
+        perm_original_data = None
+    rows = perm if shuffle_data else None
+    dtype = _packed_dtype(x=x, dtype=dtype, block_size=block_size)
+    arr = np.lib.format.open_memmap(path_x_memmap(store), mode="w+", dtype=dtype, shape=tuple(x.shape))
+
+    def write_block(start, end):
+        x_block = _get_rows(x=x, rows=rows, start=start, end=end)
+        if isinstance(x_block, scipy.sparse.spmatrix):
+            x_block = x_block.toarray()
+        arr[start:end, :] = x_block
+
+    block_memory = block_size * x.shape[1] * dtype.itemsize / np.power(1024, 2)
+    _map_blocks(n=x.shape[0], block_size=block_size, fn=write_block, num_workers=num_workers, max_memory=max_memory,
+                block_memory=block_memory)
+    arr.flush()
+    _write_stats(store=store, x=arr, rows=None, num_workers=num_workers, max_memory=max_memory, block_size=block_size)
+    _write_meta(store=store, adata=adata, perm=perm, perm_original_data=perm_original_data, row_group_size=block_size)
+
+
+def read_memmap(store: Union[str, Path], columns: Union[None, List[str]] = None, x_separate: bool = False) -> \
+        Union[Tuple[anndata.AnnData, np.memmap], anndata.AnnData]:
+    """
+    Assembles an AnnData instance based on a memory-mapped store of a dataset, see write_memmap().
+
+    :param store: Directory of the data set.
+    :param columns: Which columns to read into the obs copy in the output, see pandas.read_parquet().
+    :param x_separate: Whether to return .X as a separate return value or in the returned AnnData.
+    :return: AnnData with .X as read-only numpy.memmap, or tuple of AnnData without .X and .X.
+    """
+    x = np.load(path_x_memmap(store), mmap_mode="r")
+    with open(path_uns(store), "rb") as f:
+        uns = pickle.load(file=f)
+    obs = pd.read_parquet(path_obs(store), columns=columns, engine="pyarrow")
+    var = pd.read_parquet(path_var(store), engine="pyarrow")
+    adata = anndata.AnnData(var=var, uns=uns, shape=x.shape)
+    adata.obs = obs
+    if x_separate:
+        return adata, x
+    else:
+        adata.X = x
+        return adata
@@ -1,7 +1,7 @@
 import os
 from typing import List, Union
 
-from sfaira.data.store.stores.multi import StoresDao, StoresH5ad, \
+from sfaira.data.store.stores.multi import StoresDao, StoresH5ad, StoresMemmap, \
     StoreMultipleFeatureSpaceBase
 
 
@@ -14,14 +14,15 @@ def load_store(cache_path: Union[str, os.PathLike, List[str], List[os.PathLike]]
     This instances can be subsetted to the desired single feature space.
 
     :param cache_path: Store directory.
-    :param store_format: Format of store {"h5ad", "dao"}.
+    :param store_format: Format of store {"h5ad", "dao", "memmap"}.
 
         - "h5ad": Returns instance of DistributedStoreH5ad and keeps data in memory. See also "h5ad_backed".
         - "dao": Returns instance of DistributedStoreDoa (distributed access optimized).
         - "h5ad_backed": Returns instance of DistributedStoreH5ad and keeps data as backed (out of memory). See also
             "h5ad".
+        - "memmap": Returns instance of StoresMemmap, .X is memory-mapped from uncompressed arrays on disk.
     :param columns: Which columns to read into the obs copy in the output, see pandas.read_parquet().
-        Only relevant if store_format is "dao".
+        Only relevant if store_format is "dao" or "memmap".
     :return: Instances of a distributed store class.
     """
     if store_format == "h5ad":
@@ -30,5 +31,7 @@ def load_store(cache_path: Union[str, os.PathLike, List[str], List[os.PathLike]]
         return StoresDao(cache_path=cache_path, columns=columns)
     elif store_format == "h5ad_backed":
         return StoresH5ad(cache_path=cache_path, in_memory=False)
+    elif store_format == "memmap":
+        return StoresMemmap(cache_path=cache_path, columns=columns)
     else:
         raise ValueError(f"Did not recognize store_format {store_format}.")
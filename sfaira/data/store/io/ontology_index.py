@@ -0,0 +1,192 @@
+import numpy as np
+import os
+import pandas as pd
+from pathlib import Path
+import pickle
+import pyarrow.parquet as pq
+from typing import Dict, List, Set, Tuple, Union
+import uuid
+
+from sfaira.consts import AdataIdsSfaira, OCS
+from sfaira.versions.metadata import OntologyHierarchical
+
+"""
+Ontology-closure index of the cell-wise meta data of dao data sets, see write_ontology_index().
+
+Sub-setting a store by an ontology term, e.g. store.subset("cell_type", ["T cell"]), selects all observations that are
+annotated with this term or with a sub-term of it. Without an index, each unique annotation of each data set is matched
+against the ontology, which requires loading the ontology, and the observations are then selected by value from .obs.
+The index stores, for each indexed .obs column of a data set, the closure of each unique annotation, ie the annotation
+and all its ancestor terms by ID and by name, and the sorted indices of the observations with this annotation. The
+indices of all annotations of a column are saved as one array grouped by annotation, with pointers to the first index of
+each annotation, in an uncompressed file that is memory-mapped on read. A query is then a lookup in these closures and
+a union of the index ranges of the matched annotations, only these ranges are read from disk.
+"""
+
+
+def path_ontology_index(path):
+    return os.path.join(path, "index", "ontology.npz")
+
+
+def _path_rows(path_index, token: str, i: int):
+    """
+    Observation indices of column i of an index, the token identifies the index version that wrote the file.
+    """
+    return os.path.join(os.path.dirname(path_index), f"ontology_rows_{token}_{i}.npy")
+
+
+def _ontology(ontology_container, k: str, organism: Union[None, str]):
+    """
+    Ontology of a meta data key, organism-specific ontologies are resolved like in Dataset.get_ontology().
+    """
+    x = getattr(ontology_container, k) if hasattr(ontology_container, k) else None
+    if isinstance(x, dict):
+        x = x[organism] if organism in x.keys() else x.get(getattr(ontology_container, "key_other", None), None)
+    return x
+
+
+def _closure(value: str, ontology) -> List[str]:
+    """
+    Terms of which an annotation is a sub-term, by ID and by name, including the annotation itself.
+
+    These are the terms y for which sfaira.data.dataloaders.base.utils.is_child(query=value, ontology_parent=y) holds.
+    """
+    terms = [value]
+    if isinstance(ontology, OntologyHierarchical):
+        try:
+            node = ontology.convert_to_id(value)
+        except ValueError:
+            # Annotation is not a term of the ontology.
+            return terms
+        # Edges of the ontology graph point from sub-terms to terms, see OntologyHierarchical.is_a().
+        nodes = [node] + ontology.get_descendants(node)
+        terms += nodes + [ontology.graph.nodes[x].get("name", x) for x in nodes]
+    return list(dict.fromkeys([str(x) for x in terms]))
+
+
+def write_ontology_index(store: Union[str, Path], keys: Union[None, List[str]] = None, ontology_container=None):
+    """
+    Writes the ontology-closure index of the .obs columns of a dao data set, see module docstring.
+
+    The index is read by StoreDao.subset() instead of matching the annotations of the data set against the ontologies,
+    write it again if the ontologies are updated.
+
+    :param store: Directory of the data set.
+    :param keys: Meta data keys to index, e.g. "cell_type", defaults to all ontology-constrained keys of the sfaira
+        schema. Keys without a column in .obs are skipped.
+    :param ontology_container: Ontologies by meta data key, defaults to sfaira.consts.OCS.
+    """
+    adata_ids = AdataIdsSfaira()
+    keys = adata_ids.ontology_constrained if keys is None else keys
+    ontology_container = OCS if ontology_container is None else ontology_container
+    fn_obs = os.path.join(store, "parquet", "obs.parquet")
+    with open(os.path.join(store, "pickle", "uns.pickle"), "rb") as f:
+        uns = pickle.load(file=f)
+    organism = uns.get(adata_ids.organism, None)
+    organism = organism[0] if isinstance(organism, (list, tuple)) else organism
+    obs_columns = pq.read_schema(fn_obs).names
+    n_obs = pq.ParquetFile(fn_obs).metadata.num_rows
+    fn = path_ontology_index(store)
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    token = uuid.uuid4().hex
+    columns = []
+    arrays = {}
+    for k in keys:
+        column = getattr(adata_ids, k)
+        if column not in obs_columns:
+            continue
+        i = len(columns)
+        columns.append(column)
+        obs = pd.read_parquet(fn_obs, columns=[column], engine="pyarrow")[column]
+        # Missing annotations have code -1 and are not indexed:
+        codes, values = pd.factorize(obs.astype(object).values)
+        values = [str(x) for x in values]
+        ontology = _ontology(ontology_container=ontology_container, k=k, organism=organism)
+        closures = [_closure(value=x, ontology=ontology) for x in values]
+        arrays[f"values_{i}"] = np.asarray(values, dtype=str)
+        # Observations grouped by annotation in one pass, the stable sort keeps them sorted within each annotation:
+        n_missing = int(np.sum(codes < 0))
+        rows = np.argsort(codes, kind="stable")[n_missing:].astype(np.int32 if n_obs < 2 ** 31 else np.int64)
+        arrays[f"rows_indptr_{i}"] = np.concatenate([
+            [0], np.cumsum(np.bincount(codes[codes >= 0], minlength=len(values)))]).astype(np.int64)
+        np.save(_path_rows(fn, token=token, i=i), rows)
+        arrays[f"terms_{i}"] = np.asarray([y for x in closures for y in x], dtype=str)
+        arrays[f"terms_indptr_{i}"] = np.concatenate([[0], np.cumsum([len(x) for x in closures])]).astype(np.int64)
+    arrays["columns"] = np.asarray(columns, dtype=str)
+    arrays["n_obs"] = np.asarray(n_obs, dtype=np.int64)
+    arrays["rows_token"] = np.asarray(token, dtype=str)
+    # Written next to the index and moved, so that readers of the data set do not see a partially written index. The
+    # observation indices of earlier versions of the index are removed once they are no longer referenced:
+    fn_tmp = fn[:-len(".npz")] + ".tmp.npz"
+    np.savez_compressed(fn_tmp, **arrays)
+    os.replace(fn_tmp, fn)
+    for x in os.listdir(os.path.dirname(fn)):
+        if x.startswith("ontology_rows_") and not x.startswith(f"ontology_rows_{token}_"):
+            os.remove(os.path.join(os.path.dirname(fn), x))
+
+
+def read_ontology_index(store: Union[str, Path]) -> Union[None, "OntologyIndex"]:
+    """
+    Opens the ontology-closure index of a dao data set, see write_ontology_index().
+
+    :param store: Directory of the data set.
+    :return: Index or None if the data set has no index.
+    """
+    fn = path_ontology_index(store)
+    return OntologyIndex(fn=fn) if os.path.isfile(fn) else None
+
+
+class OntologyIndex:
+    """
+    Ontology-closure index of a dao data set, see write_ontology_index().
+
+    The closures of a column are only read from disk when the column is first queried, the observation indices are
+    memory-mapped so that a query only reads the indices of the matched annotations.
+    """
+
+    columns: List[str]
+    n_obs: int
+
+    def __init__(self, fn: Union[str, Path]):
+        self._fn = fn
+        with np.load(fn) as f:
+            self.columns = f["columns"].tolist()
+            self.n_obs = int(f["n_obs"])
+            self._token = str(f["rows_token"])
+        self._cache = {}
+
+    def _read(self, column: str) -> Tuple[np.ndarray, Dict[str, Set[str]], np.ndarray, np.ndarray]:
+        if column not in self._cache.keys():
+            i = self.columns.index(column)
+            with np.load(self._fn) as f:
+                values = f[f"values_{i}"]
+                terms = f[f"terms_{i}"].tolist()
+                indptr = f[f"terms_indptr_{i}"]
+                rows_indptr = f[f"rows_indptr_{i}"]
+            rows = np.load(_path_rows(self._fn, token=self._token, i=i), mmap_mode="r")
+            closure = dict([(x, set(terms[indptr[j]:indptr[j + 1]])) for j, x in enumerate(values.tolist())])
+            self._cache[column] = (values, closure, rows_indptr, rows)
+        return self._cache[column]
+
+    def values(self, column: str) -> np.ndarray:
+        """
+        Unique annotations in a column.
+        """
+        return self._read(column)[0]
+
+    def closure(self, column: str) -> Dict[str, Set[str]]:
+        """
+        Terms of which each unique annotation in a column is a sub-term, by ID and by name, including the annotation.
+        """
+        return self._read(column)[1]
+
+    def where(self, column: str, values: Union[list, np.ndarray]) -> np.ndarray:
+        """
+        Sorted indices of observations that have one of the annotations values in a column, read from the index ranges
+        of these annotations.
+        """
+        annotations, _, rows_indptr, rows = self._read(column)
+        idx = np.where(np.isin(annotations, np.asarray([str(x) for x in values], dtype=str)))[0]
+        # Annotations select disjoint sets of observations:
+        return np.sort(np.concatenate([np.asarray(rows[rows_indptr[j]:rows_indptr[j + 1]], dtype=np.int64)
+                                       for j in idx] + [np.array([], dtype=np.int64)]))
@@ -0,0 +1,386 @@
+import numcodecs
+import numpy as np
+import os
+import pandas as pd
+from pathlib import Path
+import pyarrow.parquet as pq
+import scipy.sparse
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Tuple, Union
+import zarr
+
+from sfaira.data.store.carts.single import CartDask, NUM_THREADS_DEFAULT
+from sfaira.data.store.io.io_dao import _chunks_obs, _get_rows, _has_csc, _is_sparse, _open_x, _write_x_dense, \
+    _write_x_sparse, _x_entry, _ZarrCsr, path_obs, path_stats, path_x, VirtualRowConcat
+from sfaira.data.store.io.update_dao import _ids_in_catalog, _read_or_create_catalog, _swap_dao
+
+"""
+Rechunking rewrites .X of data sets in a dao store with a new observation chunk size, compressor or layout (dense or
+csr) without reading the full data set into memory.
+
+The observation chunk size trades off the number of chunks that are decompressed per mini-batch against the amount of
+data that is decompressed but not used: Small chunks are efficient for random access, large chunks for contiguous
+access and for compression.
+benchmark_chunks() measures this trade-off on a sample of a data set to recommend a chunk size.
+Similarly, benchmark_compressors() compares compressors and compression levels on a sample of a data set and
+select_compressor() picks one of these for an objective, such as the random read throughput or the size on disk.
+"""
+
+COMPRESSORS = ["default", "none", "zstd", "lz4", "gzip", "blosc-zstd", "blosc-lz4"]
+COMPRESSION_OBJECTIVES = ["balanced", "size", "write", "random_read", "sequential_read"]
+
+
+def compression_kwargs_from_name(compressor: str, clevel: Union[None, int] = None) -> dict:
+    """
+    Compression kwargs for zarr, see write_dao(), from a compressor name.
+
+    :param compressor: Compressor name, one of COMPRESSORS:
+
+        - "default": zarr default compressor (blosc with lz4).
+        - "none": No compression.
+        - "zstd", "lz4", "gzip": numcodecs codecs of the same name.
+        - "blosc-zstd", "blosc-lz4": Blosc meta-compressor with byte shuffling and zstd or lz4.
+    :param clevel: Compression level, defaults to the default level of the codec.
+    :return: Compression kwargs.
+    """
+    if compressor == "default":
+        return {"compressor": "default"}
+    elif compressor == "none":
+        return {"compressor": None}
+    elif compressor == "zstd":
+        codec = numcodecs.Zstd() if clevel is None else numcodecs.Zstd(level=clevel)
+    elif compressor == "lz4":
+        codec = numcodecs.LZ4() if clevel is None else numcodecs.LZ4(acceleration=clevel)
+    elif compressor == "gzip":
+        codec = numcodecs.GZip() if clevel is None else numcodecs.GZip(level=clevel)
+    elif compressor.startswith("blosc-") and compressor[len("blosc-"):] in ["zstd", "lz4"]:
+        codec = numcodecs.Blosc(cname=compressor[len("blosc-"):], clevel=5 if clevel is None else clevel,
+                                shuffle=numcodecs.Blosc.SHUFFLE)
+    else:
+        raise ValueError(f"did not recognise compressor {compressor}, choose from {COMPRESSORS}")
+    return {"compressor": codec}
+
+
+def _compressor(x) -> dict:
+    return {"compressor": x.group["data"].compressor if isinstance(x, _ZarrCsr) else x.compressor}
+
+
+def _write_x(store_out: Union[str, Path], x, chunks_obs: int, compression_kwargs: dict, dense: bool,
+             num_workers: int = 1, max_memory: Union[None, float] = None):
+    f = zarr.open(store=path_x(store_out), mode="w")
+    chunks = (min(chunks_obs, max(x.shape[0], 1)), x.shape[1])
+    if dense:
+        _write_x_dense(f=f, x=x, rows=None, chunks=chunks, compression_kwargs=compression_kwargs,
+                       num_workers=num_workers, max_memory=max_memory)
+    else:
+        _write_x_sparse(f=f, x=x, rows=None, chunks=chunks, compression_kwargs=compression_kwargs,
+                        num_workers=num_workers, max_memory=max_memory)
+
+
+def _write_row_groups(fn: str, row_group_size: int):
+    """
+    Rewrites a parquet table of a data set with row groups of row_group_size rows.
+    """
+    if os.path.isfile(fn):
+        pq.write_table(pq.read_table(fn), fn, compression="snappy", row_group_size=row_group_size)
+
+
+def rechunk_dao(store: Union[str, Path], store_out: Union[str, Path], chunks_obs: int,
+                compression_kwargs: Union[None, dict] = None, dense: Union[None, bool] = None, num_workers: int = 1,
+                max_memory: Union[None, float] = None):
+    """
+    Writes a copy of a dao data set with .X rewritten to a new chunking, compressor or layout.
+
+    .X is copied in blocks that are aligned to the new chunks, see write_dao(), the feature-major copy of .X, .var,
+    .uns and the ontology-closure index are copied as they are.
+    .obs and the per-cell statistics are rewritten with row groups that are aligned to the new chunks of .X, so that
+    row groups that are skipped by read_obs_where() still correspond to chunks of .X.
+
+    :param store: Directory of the data set.
+    :param store_out: Directory of the copy of the data set, must differ from store.
+    :param chunks_obs: Observation axis size of chunks of .X in the copy.
+    :param compression_kwargs: Compression kwargs for zarr, see also compression_kwargs_from_name(). Defaults to the
+        compressor of the data set.
+    :param dense: Whether to write .X as a dense zarr array or as a sparse csr matrix, defaults to the layout of the
+        data set.
+    :param num_workers: Number of threads used to compress and write chunk-aligned blocks of .X.
+    :param max_memory: Upper bound in MB on the size of the blocks of .X that are held in memory at the same time.
+    """
+    if os.path.abspath(store) == os.path.abspath(store_out):
+        raise ValueError("store_out has to differ from store")
+    x = _open_x(store)
+    if compression_kwargs is None:
+        compression_kwargs = _compressor(x)
+    if dense is None:
+        dense = not isinstance(x, _ZarrCsr)
+    _write_x(store_out=store_out, x=x, chunks_obs=chunks_obs, compression_kwargs=compression_kwargs, dense=dense,
+             num_workers=num_workers, max_memory=max_memory)
+    f = zarr.open(path_x(store), mode="r")
+    if _has_csc(f):
+        zarr.copy(f["X_csc"], zarr.open(path_x(store_out), mode="r+"))
+    for component in ["parquet", "pickle", "index"]:
+        if os.path.isdir(os.path.join(store, component)):
+            shutil.copytree(os.path.join(store, component), os.path.join(store_out, component), dirs_exist_ok=True)
+    row_group_size = _x_entry(f=zarr.open(path_x(store_out), mode="r"))[1]
+    for fn in [path_obs(store_out), path_stats(store_out)]:
+        _write_row_groups(fn=fn, row_group_size=row_group_size)
+
+
+def rechunk_store(path_store: Union[str, Path], chunks_obs: int, compression_kwargs: Union[None, dict] = None,
+                  dense: Union[None, bool] = None, dataset_ids: Union[None, List[str]] = None, num_workers: int = 1,
+                  max_memory: Union[None, float] = None) -> Dict[str, str]:
+    """
+    Rechunks data sets of a dao store, see rechunk_dao().
+
+    Each data set is rewritten into a new directory and swapped into the catalog atomically, see
+    sfaira.data.store.io.update_dao.replace_dao(), so that the store can be read while it is rechunked. The previous
+    directories are retired and can be deleted with vacuum_dao().
+    Data sets that already have the requested chunking and layout are skipped if compression_kwargs is None.
+
+    :param path_store: Store directory.
+    :param chunks_obs: Observation axis size of chunks of .X.
+    :param compression_kwargs: Compression kwargs for zarr, defaults to the compressor of each data set.
+    :param dense: Whether to write .X as dense zarr array or as sparse csr matrix, defaults to the layout of each data
+        set.
+    :param dataset_ids: IDs of data sets to rechunk, defaults to all data sets.
+    :param num_workers: Number of threads used to compress and write chunk-aligned blocks of .X.
+    :param max_memory: Upper bound in MB on the size of the blocks of .X that are held in memory at the same time.
+    :return: Directory names of rewritten data sets by data set ID.
+    """
+    catalog = _read_or_create_catalog(path_store)
+    ids = _ids_in_catalog(catalog)
+    if dataset_ids is None:
+        dataset_ids = sorted(ids.keys())
+    names = {}
+    for dataset_id in dataset_ids:
+        if dataset_id not in ids.keys():
+            raise ValueError(f"data set {dataset_id} is not in store {path_store}")
+        entry = catalog[ids[dataset_id]]
+        if compression_kwargs is None and (dense is None or dense == entry["dense"]) and \
+                entry["chunks_obs"] == min(chunks_obs, max(entry["shape"][0], 1)):
+            continue
+
+        def write(store, store_out):
+            rechunk_dao(store=store, store_out=store_out, chunks_obs=chunks_obs,
+                        compression_kwargs=compression_kwargs, dense=dense, num_workers=num_workers,
+                        max_memory=max_memory)
+
+        names[dataset_id] = _swap_dao(path_store=path_store, dataset_id=dataset_id, write=write)
+    return names
+
+
+def benchmark_chunks(store: Union[str, Path], chunks_obs: Tuple[int, ...] = (64, 128, 256, 512, 1024),
+                     batch_size: int = 128, random_access: bool = True, n_obs: Union[None, int] = None,
+                     n_batches: int = 16, compression_kwargs: Union[None, dict] = None,
+                     dense: Union[None, bool] = None, dir_tmp: Union[None, str, Path] = None,
+                     seed: int = 0) -> Tuple[int, Dict[int, float]]:
+    """
+    Measures the read throughput of mini-batches for different observation chunk sizes of a dao data set.
+
+    A sample of the data set is rewritten with each chunk size into a temporary directory and mini-batches are read
+    from it through a virtual concatenation of the backed .X, like in sfaira.data.store.carts.single.CartDask, see
+    sfaira.data.store.io.io_dao.VirtualRowConcat.
+
+    :param store: Directory of the data set.
+    :param chunks_obs: Observation axis chunk sizes to compare.
+    :param batch_size: Number of observations per mini-batch, ie the retrieval batch size of the cart.
+    :param random_access: Whether mini-batches are random observations or contiguous blocks of observations at random
+        offsets.
+    :param n_obs: Number of observations in the sample, defaults to eight times the largest chunk size. The sample is
+        held in memory.
+    :param n_batches: Number of timed mini-batches per chunk size.
+    :param compression_kwargs: Compression kwargs for zarr, defaults to the compressor of the data set.
+    :param dense: Whether to benchmark dense or sparse .X, defaults to the layout of the data set.
+    :param dir_tmp: Directory for temporary copies, defaults to the parent directory of store so that the copies are on
+        the same file system.
+    :param seed: Random seed of the mini-batches.
+    :return: Tuple of:
+        - recommended chunk size, ie the chunk size with the largest throughput,
+        - throughput in observations per second by chunk size.
+    """
+    x = _open_x(store)
+    if compression_kwargs is None:
+        compression_kwargs = _compressor(x)
+    if dense is None:
+        dense = not isinstance(x, _ZarrCsr)
+    n_obs = min(8 * max(chunks_obs) if n_obs is None else n_obs, x.shape[0])
+    x_sample = _get_rows(x=x, rows=None, start=0, end=n_obs)
+    batch_size = min(batch_size, n_obs)
+    rng = np.random.default_rng(seed)
+    if random_access:
+        batches = [np.sort(rng.choice(n_obs, size=batch_size, replace=False)) for _ in range(n_batches)]
+    else:
+        batches = [np.arange(s, s + batch_size) for s in rng.integers(0, n_obs - batch_size + 1, size=n_batches)]
+    if dir_tmp is None:
+        dir_tmp = os.path.dirname(os.path.abspath(store))
+    throughput = {}
+    with tempfile.TemporaryDirectory(dir=dir_tmp, prefix=".sfaira_chunks_") as d:
+        for c in chunks_obs:
+            store_c = os.path.join(d, str(c))
+            _write_x(store_out=store_c, x=x_sample, chunks_obs=c, compression_kwargs=compression_kwargs, dense=dense)
+            x_c = _virtual_x(store=store_c)
+            _ = x_c[batches[0], :]  # Warm-up.
+            t0 = time.perf_counter()
+            for idx in batches:
+                _ = x_c[idx, :]
+            throughput[c] = n_batches * batch_size / (time.perf_counter() - t0)
+            x_c.close()
+            shutil.rmtree(store_c)
+    return max(throughput, key=throughput.get), throughput
+
+
+def _virtual_x(store: Union[str, Path]) -> VirtualRowConcat:
+    """
+    .X of a dao data set as virtual concatenation, as read by carts of a dao store, see
+    sfaira.data.store.stores.single.StoreDao._x, with the number of read threads of a cart.
+    """
+    return VirtualRowConcat(arrays=[_open_x(store)], rows=[None], num_threads=NUM_THREADS_DEFAULT)
+
+
+def _read_throughput(store: Union[str, Path], batch_size: int, random_access: bool, rng: np.random.Generator) -> float:
+    """
+    Observations per second of one epoch over .X of a dao data set emitted in dense mini-batches by CartDask.
+
+    The batch schedule is seeded from rng, so that numpy's global random state is not changed.
+    """
+    x = _virtual_x(store=store)
+    n_obs = x.shape[0]
+    cart = CartDask(x=x, obs=pd.DataFrame(index=np.arange(0, n_obs)), obs_keys=[], obs_idx=np.arange(0, n_obs),
+                    var=pd.DataFrame(index=np.arange(0, x.shape[1])), map_fn=lambda x_, obs_: ((np.asarray(x_), ), ),
+                    batch_size=0, retrieval_batch_size=batch_size, randomized_batch_access=False,
+                    random_access=random_access, return_dense=True, num_threads=x.num_threads,
+                    seed=int(rng.integers(0, np.iinfo(np.int32).max)))
+    _ = x[:min(batch_size, n_obs), :]  # Warm-up.
+    t0 = time.perf_counter()
+    for _ in cart.iterator():
+        pass
+    return n_obs / (time.perf_counter() - t0)
+
+
+def _dir_size(path: Union[str, Path]) -> int:
+    return int(np.sum([os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs]))
+
+
+def benchmark_compressors(x, compressors: Tuple[str, ...] = ("none", "lz4", "zstd", "gzip", "blosc-lz4", "blosc-zstd"),
+                          clevels: Tuple[Union[None, int], ...] = (None, ), chunks_obs: Union[None, int] = None,
+                          dense: Union[None, bool] = None, n_obs: int = 4096, batch_size: int = 128,
+                          dir_tmp: Union[None, str, Path] = None, seed: int = 0) -> pd.DataFrame:
+    """
+    Measures write time, size on disk and read throughput of .X for a grid of compressors and compression levels.
+
+    A random sample of observations is written with each compressor into a temporary directory and is read in one epoch
+    of random and of sequential mini-batches through sfaira.data.store.carts.single.CartDask over a virtual
+    concatenation of the backed .X, see sfaira.data.store.io.io_dao.VirtualRowConcat.
+
+    :param x: In-memory or backed matrix, e.g. .X of an AnnData instance, or the directory of a dao data set.
+    :param compressors: Compressor names, see compression_kwargs_from_name().
+    :param clevels: Compression levels to combine with each compressor, None is the default level of the codec.
+        Levels are ignored for "none" and "default".
+    :param chunks_obs: Observation axis size of chunks of .X, defaults to the zarr default chunking of x.
+    :param dense: Whether to benchmark dense or sparse .X, defaults to the layout of x.
+    :param n_obs: Number of observations in the sample. The sample is held in memory.
+    :param batch_size: Number of observations per mini-batch, ie the retrieval batch size of the cart.
+    :param dir_tmp: Directory for temporary copies, defaults to the parent directory of x if x is a data set
+        directory and to the system temporary directory otherwise.
+    :param seed: Random seed of the sample and of the mini-batches.
+    :return: Table with one row per compressor and level with the columns:
+        - "compressor", "clevel": compressor name and compression level,
+        - "write_s": time in seconds to compress and write the sample,
+        - "size_mb": size of the sample on disk in MB,
+        - "ratio": uncompressed size divided by size on disk,
+        - "random_obs_per_s", "sequential_obs_per_s": read throughput of random and sequential mini-batches in
+          observations per second.
+    """
+    if isinstance(x, (str, Path)):
+        if dir_tmp is None:
+            dir_tmp = os.path.dirname(os.path.abspath(x))
+        x = _open_x(x)
+    if dense is None:
+        dense = not _is_sparse(x)
+    if chunks_obs is None:
+        chunks_obs = _chunks_obs(chunks=True, shape=x.shape, dtype=x.dtype)
+    rng = np.random.default_rng(seed)
+    rows = np.sort(rng.choice(x.shape[0], size=min(n_obs, x.shape[0]), replace=False))
+    x_sample = _get_rows(x=x, rows=rows, start=0, end=len(rows))
+    if dense:
+        size_raw = np.prod(x_sample.shape) * x_sample.dtype.itemsize
+    else:
+        size_raw = scipy.sparse.csr_matrix(x_sample).nnz * (x_sample.dtype.itemsize + 4) + 8 * (len(rows) + 1)
+    grid = [(c, None) if c in ["none", "default"] else (c, clevel) for c in compressors for clevel in clevels]
+    results = []
+    with tempfile.TemporaryDirectory(dir=dir_tmp, prefix=".sfaira_compressors_") as d:
+        for compressor, clevel in list(dict.fromkeys(grid)):
+            store_c = os.path.join(d, f"{compressor}_{clevel}")
+            t0 = time.perf_counter()
+            _write_x(store_out=store_c, x=x_sample, chunks_obs=chunks_obs,
+                     compression_kwargs=compression_kwargs_from_name(compressor, clevel=clevel), dense=dense)
+            write_s = time.perf_counter() - t0
+            size = _dir_size(store_c)
+            results.append({
+                "compressor": compressor,
+                "clevel": clevel,
+                "write_s": write_s,
+                "size_mb": size / np.power(1024, 2),
+                "ratio": size_raw / max(size, 1),
+                "random_obs_per_s": _read_throughput(store=store_c, batch_size=batch_size, random_access=True,
+                                                     rng=rng),
+                "sequential_obs_per_s": _read_throughput(store=store_c, batch_size=batch_size, random_access=False,
+                                                         rng=rng),
+            })
+            shutil.rmtree(store_c)
+    clevels_found = [x["clevel"] for x in results]
+    results = pd.DataFrame(results, columns=["compressor", "clevel", "write_s", "size_mb", "ratio",
+                                             "random_obs_per_s", "sequential_obs_per_s"])
+    # Keep default levels as None rather than as NaN:
+    results["clevel"] = pd.Series(clevels_found, dtype=object)
+    return results
+
+
+def select_compressor(results: pd.DataFrame, objective: str = "balanced") -> Tuple[str, Union[None, int]]:
+    """
+    Selects a compressor from the results of benchmark_compressors() for an objective.
+
+    :param results: Results of benchmark_compressors().
+    :param objective: One of COMPRESSION_OBJECTIVES:
+
+        - "balanced": Largest geometric mean of random read throughput, sequential read throughput and compression
+            ratio, each relative to the best compressor in this metric.
+        - "size": Smallest size on disk.
+        - "write": Shortest write time.
+        - "random_read": Largest random read throughput.
+        - "sequential_read": Largest sequential read throughput.
+    :return: Compressor name and compression level, see compression_kwargs_from_name().
+    """
+    if objective == "balanced":
+        score = np.cbrt(
+            results["random_obs_per_s"] / results["random_obs_per_s"].max() *
+            results["sequential_obs_per_s"] / results["sequential_obs_per_s"].max() *
+            results["ratio"] / results["ratio"].max()
+        )
+    elif objective == "size":
+        score = -results["size_mb"]
+    elif objective == "write":
+        score = -results["write_s"]
+    elif objective == "random_read":
+        score = results["random_obs_per_s"]
+    elif objective == "sequential_read":
+        score = results["sequential_obs_per_s"]
+    else:
+        raise ValueError(f"did not recognise objective {objective}, choose from {COMPRESSION_OBJECTIVES}")
+    best = results.iloc[int(np.argmax(score.values))]
+    return best["compressor"], None if pd.isna(best["clevel"]) else int(best["clevel"])
+
+
+def auto_compression_kwargs(x, objective: str = "balanced", **kwargs) -> dict:
+    """
+    Compression kwargs for zarr, see write_dao(), of the compressor that is best for an objective on a sample of x.
+
+    :param x: In-memory or backed matrix, e.g. .X of an AnnData instance, or the directory of a dao data set.
+    :param objective: Objective, see select_compressor().
+    :param kwargs: Arguments for benchmark_compressors(), e.g. compressors, clevels and chunks_obs.
+    :return: Compression kwargs.
+    """
+    compressor, clevel = select_compressor(results=benchmark_compressors(x=x, **kwargs), objective=objective)
+    return compression_kwargs_from_name(compressor, clevel=clevel)
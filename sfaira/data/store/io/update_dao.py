@@ -0,0 +1,247 @@
+import anndata
+import os
+from pathlib import Path
+import shutil
+from typing import Callable, Dict, List, Union
+import uuid
+
+from sfaira.data.store.io.catalog import _CatalogLock, _read_catalog_file, _write_catalog, read_catalog, \
+    update_catalog, write_catalog, STAGING_PREFIX
+from sfaira.data.store.io.io_dao import read_dao_entry, write_dao
+
+"""
+Transactional updates of dao stores with a catalog, see also sfaira.data.store.io.catalog.
+
+Data sets are appended, replaced and removed without touching the directories of other data sets and without
+modifying directories that are referenced by the current catalog:
+New data is written into a fresh hidden staging directory first, which is unique to the writer. The staging directory
+is then renamed to a free directory name and added to the catalog while holding the catalog lock, so that concurrent
+writers never write into the same directory.
+Readers that opened the store before the update keep reading the previous snapshot of the store, the directories of
+replaced and removed data sets are retired and are only deleted by vacuum_dao().
+"""
+
+
+def _ids_in_catalog(catalog: Dict[str, dict]) -> Dict[str, str]:
+    """
+    Data set directory name by data set ID.
+    """
+    return dict([(v["id"], k) for k, v in catalog.items()])
+
+
+def _read_or_create_catalog(path_store: Union[str, Path]) -> Dict[str, dict]:
+    """
+    Reads catalog of a store, creates the store directory and the catalog if these do not exist yet.
+
+    Stores that were written before catalogs were maintained are catalogued from the data sets found on disk.
+    """
+    catalog = read_catalog(path_store)
+    if catalog is None:
+        Path(path_store).mkdir(parents=True, exist_ok=True)
+        write_catalog(path_store)
+        catalog = read_catalog(path_store)
+    return catalog
+
+
+def _free_dir_name(path_store: Union[str, Path], name: str) -> str:
+    """
+    Directory name that is not used in the store yet, based on name.
+    """
+    name_i = name
+    counter = 1
+    while os.path.exists(os.path.join(path_store, name_i)):
+        name_i = f"{name}.{counter}"
+        counter += 1
+    return name_i
+
+
+def _stage_dir(path_store: Union[str, Path]) -> str:
+    """
+    Creates a staging directory in the store that is unique to this writer, see _commit_staged().
+
+    Staging directories are hidden, so that they are not catalogued by write_catalog().
+    """
+    # Unlike tempfile.mkdtemp(), os.mkdir() creates the directory with the permissions of the umask.
+    path = os.path.join(path_store, f"{STAGING_PREFIX}{uuid.uuid4().hex}")
+    os.mkdir(path)
+    return path
+
+
+def _commit_staged(path_store: Union[str, Path], staged: str, name: Callable[[Dict[str, dict], List[str]], str],
+                   validate: Callable[[Dict[str, dict]], None], remove: Union[None, List[str]] = None,
+                   revision: Union[None, int] = None) -> str:
+    """
+    Moves a data set from a staging directory into the store and adds it to the catalog, while holding the catalog
+    lock.
+
+    :param path_store: Store directory.
+    :param staged: Staging directory of the data set, see _stage_dir().
+    :param name: Function that returns the directory name of the data set from the current catalog and the retired
+        directories, called while holding the catalog lock.
+    :param validate: Function that raises if the update conflicts with the current catalog, see update_catalog().
+    :param remove: Directory names of data sets to remove from the catalog and to retire.
+    :param revision: Revision of the data set, see sfaira.data.store.io.catalog.
+    :return: Directory name of the data set in the store.
+    """
+    try:
+        entry = read_dao_entry(staged)
+        if revision is not None:
+            entry["revision"] = revision
+        with _CatalogLock(path_store):
+            catalog_file = _read_catalog_file(path_store)
+            catalog = catalog_file["datasets"]
+            retired = catalog_file["retired"]
+            validate(catalog)
+            name = name(catalog, retired)
+            if os.path.exists(os.path.join(path_store, name)):
+                # Left-over of a write that was interrupted before data sets were staged.
+                shutil.rmtree(os.path.join(path_store, name))
+            os.rename(staged, os.path.join(path_store, name))
+            entry["path"] = name
+            for k in (remove if remove is not None else []):
+                del catalog[k]
+                retired.append(k)
+            catalog[name] = entry
+            _write_catalog(path_store=path_store, catalog=catalog, version=catalog_file["version"] + 1,
+                           retired=[x for x in retired if x != name])
+    finally:
+        if os.path.exists(staged):
+            shutil.rmtree(staged)
+    return name
+
+
+def append_dao(path_store: Union[str, Path], adata: anndata.AnnData, name: Union[None, str] = None,
+               **kwargs) -> str:
+    """
+    Adds a data set to a dao store.
+
+    :param path_store: Store directory.
+    :param adata: Data set to add, .uns["id"] is used as data set ID.
+    :param name: Directory name of data set in the store, defaults to the data set ID.
+    :param kwargs: Arguments for write_dao(), e.g. chunks and compression_kwargs.
+    :return: Directory name of data set in the store.
+    :raises ValueError: If a data set with the same ID already is in the store, use replace_dao() in this case.
+    """
+    dataset_id = adata.uns["id"]
+    catalog = _read_or_create_catalog(path_store)
+    if dataset_id in _ids_in_catalog(catalog).keys():
+        raise ValueError(f"data set {dataset_id} is already in store {path_store}, use replace_dao()")
+    name = dataset_id if name is None else name
+    if name in catalog.keys():
+        raise ValueError(f"directory {name} is already used by a data set in store {path_store}")
+    staged = _stage_dir(path_store)
+    try:
+        write_dao(store=staged, adata=adata, catalog=False, **kwargs)
+    except BaseException:
+        shutil.rmtree(staged)
+        raise
+
+    def validate(catalog_i):
+        if dataset_id in _ids_in_catalog(catalog_i).keys():
+            raise ValueError(f"data set {dataset_id} was added to store {path_store} by another writer")
+        if name in catalog_i.keys():
+            raise ValueError(f"directory {name} was used by another writer in store {path_store}")
+
+    def free_name(_, retired):
+        # Retired directories may still be read by readers of earlier snapshots of the store. Other directories that
+        # are not in the catalog are left-overs of interrupted writes and are overwritten.
+        return _free_dir_name(path_store=path_store, name=name) if name in retired else name
+
+    return _commit_staged(path_store=path_store, staged=staged, name=free_name, validate=validate)
+
+
+def _swap_dao(path_store: Union[str, Path], dataset_id: str, write: Callable[[str, str], None]) -> str:
+    """
+    Writes a new version of a data set into a new directory and swaps it into the catalog atomically.
+
+    :param path_store: Store directory.
+    :param dataset_id: ID of data set.
+    :param write: Function that writes the new version of the data set, called with the directories of the current and
+        of the new version of the data set.
+    :return: Directory name of new version of data set in the store.
+    :raises ValueError: If the data set is not in the store.
+    """
+    catalog = _read_or_create_catalog(path_store)
+    ids = _ids_in_catalog(catalog)
+    if dataset_id not in ids.keys():
+        raise ValueError(f"data set {dataset_id} is not in store {path_store}")
+    name_old = ids[dataset_id]
+    revision = catalog[name_old].get("revision", 0) + 1
+    staged = _stage_dir(path_store)
+    try:
+        write(os.path.join(path_store, name_old), staged)
+    except BaseException:
+        shutil.rmtree(staged)
+        raise
+
+    def validate(catalog_i):
+        if name_old not in catalog_i.keys():
+            raise ValueError(f"data set {dataset_id} was changed in store {path_store} by another writer")
+
+    return _commit_staged(path_store=path_store, staged=staged,
+                          name=lambda *_: _free_dir_name(path_store=path_store, name=f"{dataset_id}.v{revision}"),
+                          validate=validate, remove=[name_old], revision=revision)
+
+
+def replace_dao(path_store: Union[str, Path], adata: anndata.AnnData, **kwargs) -> str:
+    """
+    Replaces a data set in a dao store, only this data set is rewritten.
+
+    The new version of the data set is written into a new directory and swapped into the catalog atomically, the
+    previous directory is retired.
+
+    :param path_store: Store directory.
+    :param adata: New version of data set, .uns["id"] is used as data set ID.
+    :param kwargs: Arguments for write_dao(), e.g. chunks and compression_kwargs.
+    :return: Directory name of new version of data set in the store.
+    :raises ValueError: If the data set is not in the store, use append_dao() in this case.
+    """
+    dataset_id = adata.uns["id"]
+    if dataset_id not in _ids_in_catalog(_read_or_create_catalog(path_store)).keys():
+        raise ValueError(f"data set {dataset_id} is not in store {path_store}, use append_dao()")
+    return _swap_dao(path_store=path_store, dataset_id=dataset_id,
+                     write=lambda _, store: write_dao(store=store, adata=adata, catalog=False, **kwargs))
+
+
+def remove_dao(path_store: Union[str, Path], dataset_id: str):
+    """
+    Removes a data set from a dao store, the directory of the data set is retired.
+
+    :param path_store: Store directory.
+    :param dataset_id: ID of data set to remove.
+    :raises ValueError: If the data set is not in the store.
+    """
+    ids = _ids_in_catalog(_read_or_create_catalog(path_store))
+    if dataset_id not in ids.keys():
+        raise ValueError(f"data set {dataset_id} is not in store {path_store}")
+    name = ids[dataset_id]
+
+    def validate(catalog_i):
+        if name not in catalog_i.keys():
+            raise ValueError(f"data set {dataset_id} was changed in store {path_store} by another writer")
+
+    update_catalog(path_store=path_store, remove=[name], retire=True, validate=validate)
+
+
+def vacuum_dao(path_store: Union[str, Path]) -> List[str]:
+    """
+    Deletes directories of data sets that were replaced or removed from a dao store.
+
+    Only call this if no reader uses a snapshot of the store from before these updates.
+
+    :param path_store: Store directory.
+    :return: Deleted directory names.
+    """
+    with _CatalogLock(path_store):
+        catalog_file = _read_catalog_file(path_store)
+        if catalog_file is None:
+            return []
+        deleted = []
+        for name in catalog_file["retired"]:
+            if name not in catalog_file["datasets"].keys():
+                if os.path.exists(os.path.join(path_store, name)):
+                    shutil.rmtree(os.path.join(path_store, name))
+                deleted.append(name)
+        _write_catalog(path_store=path_store, catalog=catalog_file["datasets"], version=catalog_file["version"] + 1,
+                       retired=[])
+    return deleted
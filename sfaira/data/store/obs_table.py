@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Dict, List, Union
+
+"""
+Columnar .obs of the selected observations of a store, see ObsTable.
+"""
+
+
+def normalise_categorical_order(obs: pd.DataFrame) -> pd.DataFrame:
+    """
+    Re-types categorical columns that declare their ordering as numpy boolean, as categorical columns read from h5ad
+    files may do, with a python boolean.
+
+    pyarrow cannot serialise numpy booleans into the pandas meta data of Arrow and parquet tables.
+    """
+    categorical = dict([(k, v.cat.as_ordered() if v.cat.ordered else v.cat.as_unordered()) for k, v in obs.items()
+                        if isinstance(v.dtype, pd.CategoricalDtype) and not isinstance(v.dtype.ordered, bool)])
+    if len(categorical) > 0:
+        obs = obs.assign(**categorical)
+    return obs
+
+
+def obs_to_arrow(obs: pd.DataFrame) -> pa.Table:
+    """
+    Arrow table of the columns of an .obs data frame, without its index and without pandas meta data.
+    """
+    obs = normalise_categorical_order(obs)
+    return pa.Table.from_pandas(obs, preserve_index=False).replace_schema_metadata(None)
+
+
+def _unify_types(columns: List[pa.ChunkedArray]) -> List[pa.ChunkedArray]:
+    """
+    Casts a column of multiple tables to one type so that the column can be concatenated.
+
+    Dictionary-encoded columns keep their encoding with 32 bit indices, mixed numeric columns are cast to float64 and
+    all other mixed columns to strings, similar to the up-casting in pandas.concat().
+    """
+    types = [x.type for x in columns]
+    if all([pa.types.is_dictionary(x) for x in types]) and len(set([x.value_type for x in types])) == 1:
+        target = pa.dictionary(pa.int32(), types[0].value_type, ordered=types[0].ordered)
+    elif len(set(types)) == 1:
+        return columns
+    elif all([pa.types.is_integer(x) or pa.types.is_floating(x) or pa.types.is_null(x) for x in types]):
+        target = pa.float64()
+    else:
+        target = pa.string()
+    return [x if x.type == target else pc.cast(x, target) for x in columns]
+
+
+class ObsTable:
+    """
+    .obs of the selected observations of a store as one Arrow table.
+
+    Rows are the selected observations of all selected data sets in the order of the store, rows of data set .keys[i]
+    are .offsets[i]:.offsets[i + 1]. Columns are stored contiguously and categorical columns share one dictionary of
+    levels across data sets, so that .select() and .by_key() are zero-copy views on the table and .to_pandas() only
+    converts the requested columns.
+    """
+
+    table: pa.Table
+    keys: List[str]
+    offsets: np.ndarray
+
+    def __init__(self, table: pa.Table, keys: List[str], offsets: np.ndarray):
+        self.table = table
+        self.keys = keys
+        self.offsets = offsets
+
+    @classmethod
+    def concat(cls, tables: Dict[str, pa.Table], n_obs: Union[None, List[int]] = None) -> "ObsTable":
+        """
+        Concatenates the .obs tables of data sets.
+
+        Only columns that occur in all tables are kept, as in pandas.concat(join="inner").
+
+        :param tables: Arrow tables of the selected observations by data set key, see obs_to_arrow().
+        :param n_obs: Number of selected observations of each data set, defaults to the number of rows of the tables.
+            Required for tables without columns, which may not have rows.
+        """
+        keys = list(tables.keys())
+        n_obs = [v.num_rows for v in tables.values()] if n_obs is None else n_obs
+        offsets = np.concatenate([[0], np.cumsum(n_obs)]).astype(np.int64)
+        if len(keys) == 0:
+            return cls(table=pa.table({}), keys=keys, offsets=offsets)
+        columns = [x for x in tables[keys[0]].column_names if all([x in v.column_names for v in tables.values()])]
+        arrays = {}
+        for x in columns:
+            chunks = _unify_types([v.column(x) for v in tables.values()])
+            arrays[x] = pa.chunked_array([y for z in chunks for y in z.chunks], type=chunks[0].type)
+        table = pa.table(arrays).unify_dictionaries().combine_chunks()
+        return cls(table=table, keys=keys, offsets=offsets)
+
+    @property
+    def n_obs(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def columns(self) -> List[str]:
+        return self.table.column_names
+
+    @property
+    def shape(self):
+        return self.n_obs, self.table.num_columns
+
+    def select(self, columns: List[str]) -> "ObsTable":
+        """
+        Zero-copy view on a subset of the columns.
+        """
+        missing = [x for x in columns if x not in self.columns]
+        if len(missing) > 0:
+            raise KeyError(f"did not find columns {missing} in .obs")
+        return ObsTable(table=self.table.select(columns), keys=self.keys, offsets=self.offsets)
+
+    def by_key(self, k: str) -> pa.Table:
+        """
+        Zero-copy view on the rows of a data set.
+        """
+        i = self.keys.index(k)
+        return self.table.slice(self.offsets[i], self.offsets[i + 1] - self.offsets[i])
+
+    def append_columns(self, columns: Dict[str, np.ndarray]) -> "ObsTable":
+        """
+        Table with additional columns, the existing columns are not copied.
+        """
+        table = self.table
+        for k, v in columns.items():
+            table = table.append_column(k, pa.array(v))
+        return ObsTable(table=table, keys=self.keys, offsets=self.offsets)
+
+    def to_pandas(self) -> pd.DataFrame:
+        """
+        Data frame of the table, indexed by increasing integers starting with zero.
+
+        Numeric columns without missing values are read-only views on the table.
+        """
+        if self.table.num_columns == 0:
+            return pd.DataFrame(index=pd.RangeIndex(0, self.n_obs))
+        return self.table.to_pandas(split_blocks=True)
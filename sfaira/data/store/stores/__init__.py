@@ -1,5 +1,5 @@
 from sfaira.data.store.stores.base import StoreBase
 from sfaira.data.store.stores.multi import StoreMultipleFeatureSpaceBase, StoresAnndata, \
-    StoresDao, StoresH5ad
+    StoresDao, StoresH5ad, StoresMemmap
 from sfaira.data.store.stores.single import StoreSingleFeatureSpace, StoreAnndata, \
-    StoreDao
+    StoreDao, StoreMemmap
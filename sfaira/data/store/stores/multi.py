@@ -9,9 +9,11 @@ from typing import Dict, List, Tuple, Union
 from sfaira.consts import AdataIdsSfaira
 from sfaira.data.store.stores.base import StoreBase
 from sfaira.data.store.stores.single import StoreSingleFeatureSpace, \
-    StoreDao, StoreAnndata
+    StoreDao, StoreAnndata, StoreMemmap
 from sfaira.data.store.carts.multi import CartMulti
-from sfaira.data.store.io.io_dao import read_dao
+from sfaira.data.store.io.catalog import read_catalog
+from sfaira.data.store.io.io_dao import DatasetsDao, read_dao, read_stats
+from sfaira.data.store.io.io_memmap import is_memmap_store, read_memmap
 from sfaira.versions.genomes.genomes import GenomeContainer
 
 
@@ -269,43 +271,63 @@ class StoresDao(StoreMultipleFeatureSpaceBase):
                  columns: Union[None, List[str]] = None):
         """
 
-        :param cache_path: Store directory.
+        :param cache_path: Store directory. Data sets are discovered via the store catalog if it exists (see
+            sfaira.data.store.io.catalog) and via the sub-directories of the store directory otherwise. Data sets that
+            are declared in a catalog are only opened when they are accessed, e.g. after sub-setting the store.
         :param columns: Which columns to read into the obs copy in the output, see pandas.read_parquet().
         """
         # Collect all data loaders from files in directory:
         self._adata_ids_sfaira = AdataIdsSfaira()
+        paths = {}
+        entries = {}
         adata_by_key = {}
         x_by_key = {}
-        indices = {}
         if not isinstance(cache_path, list) or isinstance(cache_path, tuple) or isinstance(cache_path, np.ndarray):
             cache_path = [cache_path]
+
+        def add(organism, id_i, path=None, entry=None, adata=None, x=None):
+            if organism not in paths.keys():
+                paths[organism] = {}
+                entries[organism] = {}
+                adata_by_key[organism] = {}
+                x_by_key[organism] = {}
+            if id_i in paths[organism].keys() or id_i in adata_by_key[organism].keys():
+                print(f"WARNING: overwriting store entry in {id_i} in store {cache_path_i}.")
+                for d in [paths, entries, adata_by_key, x_by_key]:
+                    if id_i in d[organism].keys():
+                        del d[organism][id_i]
+            if adata is None:
+                paths[organism][id_i] = path
+                entries[organism][id_i] = entry
+            else:
+                adata_by_key[organism][id_i] = adata
+                x_by_key[organism][id_i] = x
+
         for cache_path_i in cache_path:
-            for f in np.sort(os.listdir(cache_path_i)):
-                adata = None
-                x = None
-                trial_path = os.path.join(cache_path_i, f)
-                if os.path.isdir(trial_path):
-                    # zarr-backed anndata are saved as directories with the elements of the array group as further sub
-                    # directories, e.g. a directory called "X", and a file ".zgroup" which identifies the zarr group.
-                    adata, x = read_dao(trial_path, use_dask=True, columns=columns, obs_separate=False, x_separate=True)
-                if adata is not None:
-                    organism = adata.uns[self._adata_ids_sfaira.organism]
-                    if organism not in adata_by_key.keys():
-                        adata_by_key[organism] = {}
-                        x_by_key[organism] = {}
-                        indices[organism] = {}
-                    if adata.uns[self._adata_ids_sfaira.id] in adata_by_key[organism].keys():
-                        print(f"WARNING: overwriting store entry in {adata.uns[self._adata_ids_sfaira.id]} in store "
-                              f"{cache_path_i}.")
-                    adata_by_key[organism][adata.uns[self._adata_ids_sfaira.id]] = adata
-                    x_by_key[organism][adata.uns[self._adata_ids_sfaira.id]] = x
-                    indices[organism][adata.uns[self._adata_ids_sfaira.id]] = np.arange(0, adata.n_obs)
-        stores = dict([
-            (k, StoreDao(adata_by_key=adata_by_key[k], x_by_key=x_by_key[k], indices=indices[k],
-                         obs_by_key=None))
-            for k in adata_by_key.keys()
-        ])
-        self._x_by_key = x_by_key
+            catalog = read_catalog(cache_path_i)
+            if catalog is not None:
+                # Data sets are declared in catalog: These are only opened once they are accessed, see DatasetsDao.
+                for f, entry in catalog.items():
+                    add(organism=entry["organism"], id_i=entry["id"], path=os.path.join(cache_path_i, f),
+                        entry=entry)
+            else:
+                for f in np.sort(os.listdir(cache_path_i)):
+                    trial_path = os.path.join(cache_path_i, f)
+                    if os.path.isdir(trial_path):
+                        # zarr-backed anndata are saved as directories with the elements of the array group as further
+                        # sub directories, e.g. a directory called "X", and a file ".zgroup" which identifies the zarr
+                        # group.
+                        adata, x = read_dao(trial_path, use_dask=True, columns=columns, obs_separate=False,
+                                            x_separate=True)
+                        add(organism=adata.uns[self._adata_ids_sfaira.organism],
+                            id_i=adata.uns[self._adata_ids_sfaira.id], adata=adata, x=x)
+        stores = {}
+        for k in paths.keys():
+            datasets = DatasetsDao(paths=paths[k], entries=entries[k], columns=columns, adata_by_key=adata_by_key[k],
+                                   x_by_key=x_by_key[k])
+            stores[k] = StoreDao(adata_by_key=datasets,
+                                 indices=dict([(kk, np.arange(0, datasets.n_obs(kk))) for kk in datasets.keys()]),
+                                 obs_by_key=None)
         super(StoresDao, self).__init__(stores=stores)
 
 
@@ -351,3 +373,44 @@ class StoresH5ad(StoreMultipleFeatureSpaceBase):
             for k in adata_by_key.keys()
         ])
         super(StoresH5ad, self).__init__(stores=stores)
+
+
+class StoresMemmap(StoreMultipleFeatureSpaceBase):
+
+    def __init__(self,
+                 cache_path: Union[str, os.PathLike, List[str], List[os.PathLike]],
+                 columns: Union[None, List[str]] = None):
+        """
+
+        :param cache_path: Store directory, data sets are the sub-directories written with
+            sfaira.data.store.io.io_memmap.write_memmap().
+        :param columns: Which columns to read into the obs copy in the output, see pandas.read_parquet().
+        """
+        # Collect all data loaders from files in directory:
+        self._adata_ids_sfaira = AdataIdsSfaira()
+        adata_by_key = {}
+        indices = {}
+        stats_by_key = {}
+        if not isinstance(cache_path, list) or isinstance(cache_path, tuple) or isinstance(cache_path, np.ndarray):
+            cache_path = [cache_path]
+        for cache_path_i in cache_path:
+            for f in np.sort(os.listdir(cache_path_i)):
+                trial_path = os.path.join(cache_path_i, f)
+                if os.path.isdir(trial_path) and is_memmap_store(trial_path):
+                    adata = read_memmap(trial_path, columns=columns)
+                    organism = adata.uns[self._adata_ids_sfaira.organism]
+                    if organism not in adata_by_key.keys():
+                        adata_by_key[organism] = {}
+                        indices[organism] = {}
+                        stats_by_key[organism] = {}
+                    if adata.uns[self._adata_ids_sfaira.id] in adata_by_key[organism].keys():
+                        print(f"WARNING: overwriting store entry in {adata.uns[self._adata_ids_sfaira.id]} in store "
+                              f"{cache_path_i}.")
+                    adata_by_key[organism][adata.uns[self._adata_ids_sfaira.id]] = adata
+                    indices[organism][adata.uns[self._adata_ids_sfaira.id]] = np.arange(0, adata.n_obs)
+                    stats_by_key[organism][adata.uns[self._adata_ids_sfaira.id]] = read_stats(trial_path)
+        stores = dict([
+            (k, StoreMemmap(adata_by_key=adata_by_key[k], indices=indices[k], stats_by_key=stats_by_key[k]))
+            for k in adata_by_key.keys()
+        ])
+        super(StoresMemmap, self).__init__(stores=stores)
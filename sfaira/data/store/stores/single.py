@@ -1,16 +1,20 @@
 import abc
 import os
 import pickle
-from typing import Dict, List, Tuple, Union
+from typing import Callable, Dict, List, Tuple, Union
 
 import anndata
 import dask.array
 import dask.dataframe
 import numpy as np
 import pandas as pd
+import pyarrow as pa
 from sfaira.consts import AdataIdsSfaira, OCS
 from sfaira.data.dataloaders.base.utils import is_child, UNS_STRING_META_IN_OBS
-from sfaira.data.store.carts.single import CartAnndata, CartDask, CartSingle
+from sfaira.data.store.carts.single import CartAnndata, CartDask, CartMemmap, CartSingle
+from sfaira.data.store.io.io_dao import DatasetsDao, VirtualRowConcat, STATS_COLUMNS
+from sfaira.data.store.io.ontology_index import OntologyIndex
+from sfaira.data.store.obs_table import obs_to_arrow, ObsTable
 from sfaira.data.store.stores.base import StoreBase
 from sfaira.versions.genomes.genomes import GenomeContainer, ReactiveFeatureContainer
 
@@ -27,6 +31,7 @@ DistributedStoreMultipleFeatureSpaceBase.
 DistributedStoreBase is base class for any file format on disk.
 DistributedStoreDao wraps an on-disk representation of anndata instance in the sfaira "dao" format.
 DistributedStoreH5ad wraps an on-disk representation of anndata instances as a h5ad file.
+StoreMemmap wraps an on-disk representation of anndata instances with .X as uncompressed memory-mapped array.
 DistributedStoreAnndata wraps in-memory anndata instance.
 
 Note that in all cases, you can use standard anndata reading functions to load a single object into memory.
@@ -34,11 +39,33 @@ Note that in all cases, you can use standard anndata reading functions to load a
 
 
 def _process_batch_size(batch_size: int, retrival_batch_size: int) -> Tuple[int, int]:
-    if batch_size not in [0, 1]:
-        raise ValueError("batch size is only supported other than 0 or 1")
+    if batch_size < 0:
+        raise ValueError(f"batch size has to be at least 0, found {batch_size}")
     return batch_size, retrival_batch_size
 
 
+def _align_categorical_levels(obs: List[pd.DataFrame]) -> List[pd.DataFrame]:
+    """
+    Align the categorical levels of categorical columns across a list of tables with the same columns.
+
+    :param obs: List of tables.
+    :return: List of tables with union of levels of each categorical column.
+    """
+    if len(obs) == 0:
+        return obs
+    # get list of all categorical columns - using one table is enough as they all have the same columns
+    categorical_columns: List[str] = [
+        col for col in obs[0].columns if isinstance(obs[0][col].dtype, pd.api.types.CategoricalDtype)
+    ]
+    # union categorical levels across tables for each column
+    dtypes: Dict[str, pd.api.types.CategoricalDtype] = {}
+    for col in categorical_columns:
+        dtypes[col] = pd.api.types.CategoricalDtype(pd.api.types.union_categoricals(
+            [pd.Categorical(x[col].cat.categories) for x in obs]
+        ).categories)
+    return [x.astype(dtypes) for x in obs]
+
+
 class StoreSingleFeatureSpace(StoreBase):
 
     """
@@ -67,10 +94,12 @@ class StoreSingleFeatureSpace(StoreBase):
     _obs_by_key: Union[None, Dict[str, dask.dataframe.DataFrame]]
     data_source: str
     _dataset_weights: Dict[str, float]
+    max_features_csc: int = 256
 
     def __init__(self, adata_by_key: Dict[str, anndata.AnnData], indices: Dict[str, np.ndarray],
                  obs_by_key: Union[None, Dict[str, dask.dataframe.DataFrame]] = None, data_source: str = "X"):
-        self.adata_by_key = self.__align_categorical_levels(adata_by_key)
+        self._obs_table_cache = None
+        self.adata_by_key = self._align_categorical_levels(adata_by_key)
         self.indices = indices
         self.obs_by_key = obs_by_key
         self.ontology_container = OCS
@@ -79,8 +108,7 @@ class StoreSingleFeatureSpace(StoreBase):
         self.data_source = data_source
         self._celltype_universe = None
 
-    @staticmethod
-    def __align_categorical_levels(adata_by_key: Dict[str, anndata.AnnData]) -> Dict[str, anndata.AnnData]:
+    def _align_categorical_levels(self, adata_by_key: Dict[str, anndata.AnnData]) -> Dict[str, anndata.AnnData]:
         """
         Align the categorical levels across all datasets.
 
@@ -88,23 +116,9 @@ class StoreSingleFeatureSpace(StoreBase):
         :return: Dict[str, anndata.Anndata]
         """
         datasets = list(adata_by_key.keys())
-        # get list of all categorical columns - using one dataset is enough as they all have the same columns
-        categorical_columns: List[str] = []
-        for col in adata_by_key[datasets[0]].obs.columns:
-            if isinstance(adata_by_key[datasets[0]].obs[col].dtype, pd.api.types.CategoricalDtype):
-                categorical_columns.append(col)
-        # union categorical levels across datasets for each column
-        categories_columns: Dict[str, pd.Index] = {}
-        for col in categorical_columns:
-            categories_columns[col] = pd.api.types.union_categoricals(
-                [pd.Categorical(v.obs[col].cat.categories) for v in adata_by_key.values()]
-            ).categories
-        # update categorical columns
-        for dataset in datasets:
-            for col, categories in categories_columns.items():
-                adata_by_key[dataset].obs[col] = pd.Categorical(adata_by_key[dataset].obs[col],
-                                                                categories=categories)
-
+        obs = _align_categorical_levels([adata_by_key[k].obs for k in datasets])
+        for k, obs_k in zip(datasets, obs):
+            adata_by_key[k].obs = obs_k
         return adata_by_key
 
     @property
@@ -135,6 +149,31 @@ class StoreSingleFeatureSpace(StoreBase):
         assert len(organisms) == 1, organisms
         return organisms[0]
 
+    def _subset_meta_by_key(self, k: str) -> \
+            Tuple[dict, List[str], Callable[[str], np.ndarray], Callable[[str, list], np.ndarray], int]:
+        """
+        Meta data of a data set that is used for sub-setting.
+
+        :param k: Data set key.
+        :return: Tuple of:
+            - data set-wide meta data (.uns)
+            - columns of .obs
+            - function that returns the unique values of a column of .obs
+            - function that returns the indices of observations for which a column of .obs has one of a list of values
+            - number of observations
+        """
+        adata_k = self.adata_by_key[k]
+        obs_k = self.obs_by_key[k]
+        return adata_k.uns, obs_k.columns, lambda x: pd.unique(obs_k[x].to_numpy()), \
+            lambda x, values: np.where(np.isin(obs_k[x].to_numpy(), values))[0], adata_k.n_obs
+
+    def _ontology_index_by_key(self, k: str) -> Union[None, OntologyIndex]:
+        """
+        Ontology-closure index of the .obs columns of a data set that is used for sub-setting instead of the ontologies,
+        see sfaira.data.store.io.ontology_index, or None if the data set has no index.
+        """
+        return None
+
     def _validate_feature_space_homogeneity(self) -> List[str]:
         """
         Assert that the data sets which were kept have the same feature names.
@@ -193,6 +232,7 @@ class StoreSingleFeatureSpace(StoreBase):
             assert len(v) == len(np.unique(v)), f"found duplicated indices for key {k}"
             assert np.all(np.diff(v) >= 0), f"indices not sorted for key {k}"
         self._indices = x
+        self._obs_table_cache = None
 
     @property
     def obs_by_key(self) -> Dict[str, Union[pd.DataFrame, dask.dataframe.DataFrame]]:
@@ -269,34 +309,60 @@ class StoreSingleFeatureSpace(StoreBase):
         assert (values is None or excluded_values is not None) or (values is not None or excluded_values is None), \
             "supply either values or excluded_values"
 
-        def get_idx(adata, obs, k, v, xv, dataset) -> np.ndarray:
+        def get_idx(uns, obs_columns, obs_unique, obs_where, n_obs, k, v, xv, dataset, ontology_index) -> np.ndarray:
             # Use cell-wise annotation if data set-wide maps are ambiguous:
             # This can happen if the different cell-wise annotations are summarised as a union in .uns.
-            read_from_uns = (getattr(self._adata_ids_sfaira, k) in adata.uns.keys() and
-                             np.all(adata.uns[getattr(self._adata_ids_sfaira, k)] != UNS_STRING_META_IN_OBS) and
-                             getattr(self._adata_ids_sfaira, k) not in obs.columns)
-            read_from_obs = not read_from_uns and getattr(self._adata_ids_sfaira, k) in obs.columns
+            read_from_uns = (getattr(self._adata_ids_sfaira, k) in uns.keys() and
+                             np.all(uns[getattr(self._adata_ids_sfaira, k)] != UNS_STRING_META_IN_OBS) and
+                             getattr(self._adata_ids_sfaira, k) not in obs_columns)
+            read_from_obs = not read_from_uns and getattr(self._adata_ids_sfaira, k) in obs_columns
+            read_from_index = read_from_obs and ontology_index is not None and \
+                getattr(self._adata_ids_sfaira, k) in ontology_index.columns
             if read_from_uns:
-                values_found = adata.uns[getattr(self._adata_ids_sfaira, k)]
+                values_found = uns[getattr(self._adata_ids_sfaira, k)]
                 if isinstance(values_found, np.ndarray):
                     values_found = values_found.tolist()
                 elif not isinstance(values_found, list):
                     values_found = [values_found]
                 if len(values_found) > 1:
                     values_found = None  # Go to cell-wise annotation.
-                else:
-                    # Replicate unique property along cell dimension.
-                    values_found = [values_found[0] for _ in range(adata.n_obs)]
+
+                def select(matched):
+                    # Unique property along cell dimension.
+                    return np.arange(0, n_obs) if values_found[0] in matched else np.array([], dtype=np.int64)
+            elif read_from_index:
+                # The unique values are matched against their ontology closures in the index, the observations are
+                # selected from the bitmaps of the index.
+                values_found = ontology_index.values(getattr(self._adata_ids_sfaira, k))
+
+                def select(matched):
+                    return ontology_index.where(getattr(self._adata_ids_sfaira, k), matched)
             elif read_from_obs:
-                values_found = obs[getattr(self._adata_ids_sfaira, k)].to_numpy()
+                # Only the unique values are matched against the ontology, the observations are selected by value.
+                values_found = obs_unique(getattr(self._adata_ids_sfaira, k))
+
+                def select(matched):
+                    return obs_where(getattr(self._adata_ids_sfaira, k), matched)
             else:
                 values_found = []
                 print(f"WARNING: did not find attribute {k} in data set {dataset}")
 
-            try:
-                ontology = getattr(self.ontology_container, k)
-            except AttributeError:
-                raise ValueError(f"{k} not a valid property of ontology_container object")
+                def select(matched):
+                    return np.array([], dtype=np.int64)
+
+            if read_from_index:
+                closure = ontology_index.closure(getattr(self._adata_ids_sfaira, k))
+
+                def is_child_of(x, y):
+                    return str(y) in closure[str(x)]
+            else:
+                try:
+                    ontology = getattr(self.ontology_container, k)
+                except AttributeError:
+                    raise ValueError(f"{k} not a valid property of ontology_container object")
+
+                def is_child_of(x, y):
+                    return is_child(query=x, ontology=ontology, ontology_parent=y)
 
             values_found_unique_matched = []
 
@@ -318,14 +384,12 @@ class StoreSingleFeatureSpace(StoreBase):
             for x in pd.unique(values_found):
                 if x in unknown_identifiers:
                     pass
-                elif v is not None and np.any([is_child(query=x, ontology=ontology, ontology_parent=y) for y in v]):
+                elif v is not None and np.any([is_child_of(x, y) for y in v]):
                     values_found_unique_matched.append(x)
-                elif xv is not None and np.all([
-                    not is_child(query=x, ontology=ontology, ontology_parent=y) for y in xv
-                ]):
+                elif xv is not None and np.all([not is_child_of(x, y) for y in xv]):
                     values_found_unique_matched.append(x)
 
-            idx = np.where(np.isin(values_found, values_found_unique_matched))[0]
+            idx = select(values_found_unique_matched)
             return idx
 
         indices = {}
@@ -333,11 +397,12 @@ class StoreSingleFeatureSpace(StoreBase):
             if key not in self.adata_by_key.keys():
                 raise ValueError(f"data set {key} queried by indices does not exist in store (.adata_by_key)")
             # Get indices of idx_old to keep:
-            adata_k = self.adata_by_key[key]
-            obs_k = self.obs_by_key[key]
+            uns_k, obs_columns_k, obs_unique_k, obs_where_k, n_obs_k = self._subset_meta_by_key(key)
             idx_old = self.indices[key]
             # Cannot index on view here as indexing on view of views of backed anndata objects is not yet supported.
-            idx_subset = get_idx(adata=adata_k, obs=obs_k, k=attr_key, v=values, xv=excluded_values, dataset=key)
+            idx_subset = get_idx(uns=uns_k, obs_columns=obs_columns_k, obs_unique=obs_unique_k, obs_where=obs_where_k,
+                                 n_obs=n_obs_k, k=attr_key, v=values, xv=excluded_values, dataset=key,
+                                 ontology_index=self._ontology_index_by_key(key))
             # Keep intersection of old and new hits.
             idx_new = np.intersect1d(idx_old, idx_subset)
             if len(idx_new) > 0:
@@ -483,6 +548,101 @@ class StoreSingleFeatureSpace(StoreBase):
                                                               retrival_batch_size=retrival_batch_size)
         return var_idx, batch_size, retrival_batch_size
 
+    def _stats_by_key(self, k: str) -> Union[None, pd.DataFrame]:
+        """
+        Per-cell statistics of all observations of a data set, see sfaira.data.store.io.io_dao.write_stats(), or None
+        if these were not saved.
+        """
+        return None
+
+    @property
+    def has_stats(self) -> bool:
+        """
+        Whether precomputed per-cell statistics are available for all selected observations and features.
+
+        Statistics are computed across all features of a data set and are therefore not used if a feature subset is
+        selected via .genome_container.
+        """
+        if len(self.indices) == 0 or np.any([self._stats_by_key(k) is None for k in self.indices.keys()]):
+            return False
+        var_idx, _, _ = self._index_curation_helper(batch_size=1, retrival_batch_size=1)
+        return var_idx is None
+
+    @property
+    def stats(self) -> Union[None, pd.DataFrame]:
+        """
+        Precomputed per-cell statistics of the selected observations, ordered like .obs of carts and indexed by global
+        observation index, see .has_stats, or None if these are not available.
+
+        Columns are sfaira.data.store.io.io_dao.STATS_TOTAL_COUNTS, STATS_N_GENES and STATS_SIZE_FACTORS.
+        """
+        if not self.has_stats:
+            return None
+        return pd.concat([self._stats_by_key(k).iloc[v] for k, v in self.indices.items()], axis=0,
+                         ignore_index=True)
+
+    def _obs_arrow_by_key(self, k: str, idx: np.ndarray) -> pa.Table:
+        """
+        .obs of the selected observations idx of a data set as Arrow table, see sfaira.data.store.obs_table.
+        """
+        return obs_to_arrow(self.adata_by_key[k].obs.iloc[idx])
+
+    @property
+    def _obs_table(self) -> ObsTable:
+        """
+        .obs of the selected observations of all selected data sets as one Arrow table with the offsets of the data
+        sets, see sfaira.data.store.obs_table.ObsTable.
+
+        The table is assembled once per selection and is shared by all carts until .indices is set again, carts only
+        take views on the columns that they emit.
+        """
+        if self._obs_table_cache is None:
+            self._obs_table_cache = ObsTable.concat(
+                tables=dict([(k, self._obs_arrow_by_key(k=k, idx=v)) for k, v in self.indices.items()]),
+                n_obs=[len(v) for v in self.indices.values()])
+        return self._obs_table_cache
+
+    @property
+    def _obs(self) -> pd.DataFrame:
+        """
+        Assemble .obs table of subset of selected data.
+
+        Resulting index is increasing integers starting with zero.
+        Categorical levels are aligned across the selected data sets.
+
+        :return: .obs data frame.
+        """
+        return self._obs_table.to_pandas()
+
+    def _obs_with_stats(self, obs: ObsTable, obs_keys: List[str]) -> ObsTable:
+        """
+        Adds precomputed per-cell statistics that are requested in obs_keys as numeric columns to the .obs table of the
+        selected observations so that carts emit them like other .obs columns.
+        """
+        keys = [x for x in obs_keys if x in STATS_COLUMNS and x not in obs.columns]
+        if len(keys) > 0:
+            stats = self.stats
+            if stats is None:
+                raise ValueError(f"per-cell statistics {keys} are not available for the selected data, see .has_stats")
+            obs = obs.append_columns(dict([(x, stats[x].values) for x in keys]))
+        return obs
+
+    @property
+    def _has_csc(self) -> bool:
+        """
+        Whether all selected data sets have a feature-major copy of .X, see sfaira.data.store.io.io_dao.write_dao().
+        """
+        return False
+
+    def _route_to_csc(self, var_idx: Union[np.ndarray, None]) -> bool:
+        """
+        Whether a query of features var_idx is read from the feature-major copies of .X instead of from .X.
+
+        Reading a few features from the feature-major copy only reads these features, reading them from .X reads all
+        features of the queried observations. Queries of up to .max_features_csc features are routed to the copy.
+        """
+        return var_idx is not None and len(var_idx) <= self.max_features_csc and self._has_csc
+
     @abc.abstractmethod
     def _get_cart(
             self,
@@ -517,6 +677,10 @@ class StoreSingleFeatureSpace(StoreBase):
             randomized_batch_access: bool = False,
             random_access: bool = False,
             batch_schedule: str = "base",
+            rank: int = 0,
+            world_size: int = 1,
+            seed: Union[None, int] = None,
+            drop_last: bool = False,
             **kwargs
     ) -> CartSingle:
         """
@@ -530,13 +694,16 @@ class StoreSingleFeatureSpace(StoreBase):
         :param idx: Global idx to query from store. These is an array with indices corresponding to a contiuous index
             along all observations in self.adata_by_key, ordered along a hypothetical concatenation along the keys of
             self.adata_by_key. If None, all observations are selected.
-        :param batch_size: Number of observations to yield in each access (generator invocation).
+        :param batch_size: Number of observations to yield in each access (generator invocation). Use 0 to yield the
+            retrieval batches. Batches of more than one observation are sliced from the retrieval batches as a whole,
+            which avoids per-observation python overhead in consumers that batch observations again, e.g. tf.data or
+            torch DataLoader.
         :param retrieval_batch_size: Number of observations read from disk in each batched access (data-backend
             generator invocation).
         :param map_fn: Map functino to apply to output tuple of raw generator. Each draw i from the generator is then:
             `yield map_fn(x[i, var_idx], obs[i, obs_keys])`
         :param obs_keys: .obs columns to return in the generator. These have to be a subset of the columns available
-            in self.adata_by_key.
+            in self.adata_by_key or of the precomputed per-cell statistics, see .stats.
         :param return_dense: Whether to force return count data .X as dense batches. This allows more efficient feature
             indexing if the store is sparse (column indexing on csr matrices is slow).
         :param randomized_batch_access: Whether to randomize batches during reading (in generator). Lifts necessity of
@@ -552,10 +719,28 @@ class StoreSingleFeatureSpace(StoreBase):
             - "basic": sfaira.data.store.batch_schedule.BatchDesignBasic
             - "balanced": sfaira.data.store.batch_schedule.BatchDesignBalanced
             - "blocks": sfaira.data.store.batch_schedule.BatchDesignBlocks
+            - "chunk_shuffle": sfaira.data.store.batch_schedule.BatchDesignChunkShuffle, the number of chunks that
+                are shuffled together is set by the keyword argument n_chunks.
             - "full":  sfaira.data.store.batch_schedule.BatchDesignFull
             - class: batch_schedule needs to be a class (not instance), subclassing BatchDesignBase.
 
-        :param kwargs: kwargs for idx_generator chosen.
+        :param rank: Rank of this process in a data-parallel job. Each rank only reads and emits its share of the
+            retrieval batches of each epoch, shares of different ranks have the same number of retrieval batches and
+            of observations, see BatchDesignBase.
+        :param world_size: Number of processes of the data-parallel job.
+        :param seed: Seed of the batch schedule, which needs to be the same on all ranks. Defaults to 0 if world_size is
+            larger than 1.
+        :param drop_last: Whether the share of each rank is truncated to the smallest share of any rank. Otherwise,
+            shares are padded to the largest share with the first observations of the schedule, which are then emitted
+            twice per epoch. Either way, all ranks emit the same number of retrieval batches and observations, see
+            BatchDesignBase.
+        :param kwargs: kwargs for idx_generator chosen, and for the cart, e.g.:
+
+            - prefetch: Number of retrieval batches that the iterator of the cart reads ahead of its consumer on a
+                thread pool, see CartSingle.
+            - num_workers: Number of threads of this pool.
+            - deterministic: Whether prefetched batches are emitted in the order of the batch schedule.
+
         :return: Generator function which yields batch_size at every invocation.
             The generator returns a tuple of (.X, .obs).
         """
@@ -565,7 +750,11 @@ class StoreSingleFeatureSpace(StoreBase):
             batch_size=batch_size, retrival_batch_size=retrieval_batch_size)
         batch_schedule_kwargs = {"randomized_batch_access": randomized_batch_access,
                                  "random_access": random_access,
-                                 "retrieval_batch_size": retrieval_batch_size}
+                                 "retrieval_batch_size": retrieval_batch_size,
+                                 "rank": rank,
+                                 "world_size": world_size,
+                                 "seed": seed,
+                                 "drop_last": drop_last}
         cart = self._get_cart(batch_schedule=batch_schedule, batch_size=batch_size, map_fn=map_fn, obs_idx=idx,
                               obs_keys=obs_keys, return_dense=return_dense, var=self.var, var_idx=var_idx,
                               **batch_schedule_kwargs, **kwargs)
@@ -595,8 +784,10 @@ class StoreAnndata(StoreSingleFeatureSpace):
         self._x_as_dask = False
         self.in_memory = in_memory
 
-    def _get_cart(self, return_dense: bool = False, **kwargs) -> iter:
-        return CartAnndata(adata_dict=self._adata_sliced, return_dense=return_dense, **kwargs)
+    def _get_cart(self, obs_keys: List[str], return_dense: bool = False, **kwargs) -> iter:
+        obs = self._obs_with_stats(obs=self._obs_table, obs_keys=obs_keys)
+        return CartAnndata(adata_dict=self._adata_sliced, obs=obs, obs_keys=obs_keys, return_dense=return_dense,
+                           **kwargs)
 
     # Methods that are specific to this child class:
 
@@ -610,15 +801,80 @@ class StoreAnndata(StoreSingleFeatureSpace):
 
 class StoreDao(StoreSingleFeatureSpace):
 
+    """
+    Store of dao data sets.
+
+    .adata_by_key is a DatasetsDao (see sfaira.data.store.io.io_dao) in which data sets are only opened when they are
+    accessed: Data sets that are declared in the store catalog are not read until they are selected in .indices and
+    queried.
+    Data sets that drop out of .indices through sub-setting are released again.
+    Queries of a few features are read from the feature-major copies of .X if all selected data sets have one, see
+    ._route_to_csc().
+    Carts read .X of the selected observations through a virtual concatenation of the data sets, see ._x.
+    """
+
+    _adata_by_key: DatasetsDao
     _dataset_weights: Union[None, Dict[str, float]]
-    _x_dask_cache: Union[None, dask.array.Array]
+    _x_cache: Union[None, VirtualRowConcat]
     _x_by_key: Union[None, dask.array.Array]
 
-    def __init__(self, x_by_key, **kwargs):
-        super(StoreDao, self).__init__(**kwargs)
+    def __init__(self, adata_by_key: Union[DatasetsDao, Dict[str, anndata.AnnData]],
+                 x_by_key: Union[None, Dict[str, dask.array.Array]] = None, **kwargs):
+        if not isinstance(adata_by_key, DatasetsDao):
+            adata_by_key = DatasetsDao(adata_by_key=adata_by_key, x_by_key=x_by_key)
+        self._x_cache = None
+        super(StoreDao, self).__init__(adata_by_key=adata_by_key, **kwargs)
         self._x_as_dask = True
-        self._x_by_key = x_by_key
-        self._x_dask_cache = None
+        self._x_by_key = adata_by_key.x_by_key
+
+    def _align_categorical_levels(self, adata_by_key: DatasetsDao) -> DatasetsDao:
+        """
+        Categorical levels are aligned across the selected data sets when .obs is assembled, see ._obs_table, so that
+        data sets do not need to be opened here.
+        """
+        return adata_by_key
+
+    @property
+    def organisms_by_key(self) -> Dict[str, str]:
+        """
+        Data set-wise organism label as dictionary of data set keys.
+        """
+        ks = self.indices.keys()
+        organisms = [self._adata_by_key.organism(k, key=self._adata_ids_sfaira.organism) for k in ks]
+        # Flatten list, assumes that each data set maps to one organism:
+        organisms = [x[0] if (isinstance(x, list) or isinstance(x, tuple)) else x for x in organisms]
+        return dict(list(zip(ks, organisms)))
+
+    def _validate_feature_space_homogeneity(self) -> List[str]:
+        """
+        Assert that the data sets which were kept have the same feature names.
+
+        Compares hashes of feature names so that data sets do not need to be opened.
+
+        :return: List of feature names in shared feature space or dictionary of list of features.
+        """
+        reference_k = list(self._adata_by_key.keys())[0]
+        var_hash = self._adata_by_key.var_hash(reference_k)
+        for k in list(self._adata_by_key.keys()):
+            assert var_hash == self._adata_by_key.var_hash(k), \
+                f"var_names in store were not matched in object {k} compared to {reference_k}"
+        return self._adata_by_key.var_names(reference_k)
+
+    def _subset_meta_by_key(self, k: str) -> \
+            Tuple[dict, List[str], Callable[[str], np.ndarray], Callable[[str, list], np.ndarray], int]:
+        uns = self._adata_by_key.uns_meta(k)
+        obs_columns = self._adata_by_key.obs_columns(k)
+        if self._obs_by_key is None and uns is not None and obs_columns is not None:
+            # Does not open data set: Cell-wise annotations are queried on the .obs parquet table of the data set.
+            return uns, obs_columns, lambda x: self._adata_by_key.obs_unique(k, x), \
+                lambda x, values: self._adata_by_key.obs_where(k, x, values), self._adata_by_key.n_obs(k)
+        else:
+            return super(StoreDao, self)._subset_meta_by_key(k=k)
+
+    def _ontology_index_by_key(self, k: str) -> Union[None, OntologyIndex]:
+        if self._obs_by_key is not None:
+            return None
+        return self._adata_by_key.ontology_index(k)
 
     @property
     def indices(self) -> Dict[str, np.ndarray]:
@@ -627,7 +883,7 @@ class StoreDao(StoreSingleFeatureSpace):
     @indices.setter
     def indices(self, x: Dict[str, np.ndarray]):
         """
-        Extends setter in super class by wiping .X cache.
+        Extends setter in super class by wiping .X cache and by releasing data sets that are not selected anymore.
 
         Setter imposes a few constraints on indices:
 
@@ -636,13 +892,15 @@ class StoreDao(StoreSingleFeatureSpace):
             3) checks that indces are not duplicated
             4) checks that indices are sorted
         """
-        self._x_dask_cache = None
+        self._x_cache = None
+        self._obs_table_cache = None
         for k, v in x.items():
             assert k in self._adata_by_key.keys(), f"did not find key {k}"
-            assert np.max(v) < self._adata_by_key[k].n_obs, f"found index for key {k} that exceeded data set size"
+            assert np.max(v) < self._adata_by_key.n_obs(k), f"found index for key {k} that exceeded data set size"
             assert len(v) == len(np.unique(v)), f"found duplicated indices for key {k}"
             assert np.all(np.diff(v) >= 0), f"indices not sorted for key {k}"
         self._indices = x
+        self._adata_by_key.evict(keep=x.keys())
 
     @property
     def data_by_key(self):
@@ -652,45 +910,99 @@ class StoreDao(StoreSingleFeatureSpace):
         # Accesses _x_by_key rather than _adata_by_key as long as the dask arrays are stored there.
         return dict([(k, self._x_by_key[k][v, :]) for k, v in self.indices.items()])
 
-    def _get_cart(self, **kwargs) -> CartDask:
-        return CartDask(x=self._x, obs=self._obs, **kwargs)
+    def _stats_by_key(self, k: str) -> Union[None, pd.DataFrame]:
+        return self._adata_by_key.stats(k)
+
+    def _obs_arrow_by_key(self, k: str, idx: np.ndarray) -> pa.Table:
+        """
+        Reads .obs of the data set as Arrow table without opening the data set, see DatasetsDao.obs_arrow().
+        """
+        obs = self._adata_by_key.obs_arrow(k)
+        # Indices are sorted and unique, so they select all cells if they are as many as the cells:
+        return obs if obs.num_rows == len(idx) else obs.take(idx)
+
+    @property
+    def _has_csc(self) -> bool:
+        return len(self.indices) > 0 and np.all([self._adata_by_key.has_csc(k) for k in self.indices.keys()])
+
+    def _get_cart(self, obs_keys: List[str], var_idx: Union[np.ndarray, None] = None, **kwargs) -> CartDask:
+        obs = self._obs_with_stats(obs=self._obs_table, obs_keys=obs_keys)
+        if self._route_to_csc(var_idx=var_idx):
+            # The array only contains the selected features.
+            return CartDask(x=self._x_csc(var_idx=var_idx), obs=obs, obs_keys=obs_keys, var_idx=None, **kwargs)
+        return CartDask(x=self._x, obs=obs, obs_keys=obs_keys, var_idx=var_idx, **kwargs)
 
     # Methods that are specific to this child class:
 
+    def _x_csc(self, var_idx: np.ndarray) -> dask.array.Array:
+        """
+        One lazy dask array of all cells and of features var_idx, read from the feature-major copies of .X.
+
+        The selected features of a data set are read when a batch first accesses the data set and are kept by the
+        cart so that later batches do not re-read them, see sfaira.data.store.io.io_dao._dask_from_zarr_csc().
+        """
+        arrs_to_concat = []
+        for k, v in self.indices.items():
+            if len(v) == 0:
+                continue
+            x_k = self._adata_by_key.x_features(k, var_idx=var_idx)
+            arrs_to_concat.append(x_k if x_k.shape[0] == len(v) else x_k[v, :])
+        return dask.array.vstack(arrs_to_concat)
+
     @property
-    def _x(self) -> dask.array.Array:
+    def _x(self) -> VirtualRowConcat:
         """
-        One dask array of all cells.
+        Virtual row-wise concatenation of the selected cells of all selected data sets.
 
+        Keeps the backed .X of each data set and the offsets of the selections, batches are routed to the data sets and
+        read from zarr without building a dask graph, see sfaira.data.store.io.io_dao.VirtualRowConcat.
         Requires feature dimension to be shared.
         """
-        if self._x_dask_cache is None:
+        if self._x_cache is None:
             if self.data_source == "X":
-                assert np.all([isinstance(self._x_by_key[k], dask.array.Array) for k in self.indices.keys()])
-                arrs_to_concat = []
+                arrays = []
+                rows = []
                 for k, v in self.indices.items():
-                    if self._x_by_key[k].shape[0] == len(v):
-                        arrs_to_concat.append(self._x_by_key[k])
-                    elif len(v) == 0:
+                    if len(v) == 0:
                         continue
-                    else:
-                        arrs_to_concat.append(self._x_by_key[k][v, :])
-                self._x_dask_cache = dask.optimize(dask.array.vstack(arrs_to_concat))[0]
+                    arrays.append(self._adata_by_key.x_backed(k))
+                    # Indices are sorted and unique, so they select all cells if they are as many as the cells:
+                    rows.append(None if arrays[-1].shape[0] == len(v) else v)
+                self._x_cache = VirtualRowConcat(arrays=arrays, rows=rows)
             else:
                 raise ValueError(f"Did not recognise data_source={self.data_source}.")
-        return self._x_dask_cache
+        return self._x_cache
 
-    @property
-    def _obs(self) -> pd.DataFrame:
+
+class StoreMemmap(StoreSingleFeatureSpace):
+
+    """
+    Store of memory-mapped data sets, see sfaira.data.store.io.io_memmap.
+
+    .X of each data set is a read-only numpy.memmap, carts read observations directly from these arrays.
+    """
+
+    _stats: Dict[str, pd.DataFrame]
+
+    def __init__(self, stats_by_key: Union[None, Dict[str, pd.DataFrame]] = None, **kwargs):
         """
-        Assemble .obs table of subset of selected data.
 
-        Resulting index is increasing integers starting with zero.
+        :param stats_by_key: Per-cell statistics by data set key, see sfaira.data.store.io.io_dao.write_stats().
+        """
+        super(StoreMemmap, self).__init__(**kwargs)
+        self._stats = dict(stats_by_key) if stats_by_key is not None else {}
 
-        :return: .obs data frame.
+    def _stats_by_key(self, k: str) -> Union[None, pd.DataFrame]:
+        return self._stats.get(k, None)
+
+    @property
+    def data_by_key(self):
+        """
+        Data matrix for each selected data set in store, sub-setted by selected cells.
         """
+        return dict([(k, self._adata_by_key[k].X[v, :]) for k, v in self.indices.items()])
 
-        return pd.concat([
-            self.adata_by_key[k].obs.loc[self.adata_by_key[k].obs.index[v], :]
-            for k, v in self.indices.items()
-        ], axis=0, join="inner", ignore_index=True, copy=False)
+    def _get_cart(self, obs_keys: List[str], **kwargs) -> CartMemmap:
+        return CartMemmap(x_by_key=dict([(k, self._adata_by_key[k].X) for k in self.indices.keys()]),
+                          idx_by_key=self.indices, obs=self._obs_with_stats(obs=self._obs_table, obs_keys=obs_keys),
+                          obs_keys=obs_keys, **kwargs)
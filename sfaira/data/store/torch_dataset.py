@@ -59,9 +59,38 @@ class SfairaDataset(torch.utils.data.Dataset):
 
 class SfairaIterableDataset(torch.utils.data.IterableDataset):
 
-    def __init__(self, iterator_fun, **kwargs):
+    def __init__(self, iterator_fun, seed: Union[None, int] = None, **kwargs):
+        """
+
+        :param iterator_fun: Function that returns an iterator over the data, accepts the arguments shard and seed of
+            sfaira.data.store.carts.CartBase.iterator().
+        :param seed: Seed of the batch schedule. The schedule of each DataLoader iteration is drawn from seed + the
+            epoch set by .set_epoch(). If None, each DataLoader iteration draws a new schedule from the base seed of
+            its workers, which is deterministic if the DataLoader has a seeded generator. Ranks of data-parallel jobs
+            need to share the seed, as each rank draws its own base seed.
+        """
         super(SfairaIterableDataset, self).__init__(**kwargs)
         self.iterator_fun = iterator_fun
+        self.seed = seed
+        self.epoch = 0
+
+    def set_epoch(self, epoch: int):
+        """
+        Sets the epoch of the next DataLoader iteration, which selects the schedule if .seed is set, like
+        torch.utils.data.distributed.DistributedSampler.set_epoch().
+
+        Workers copy the data set when an iteration starts, so call this before each iteration and do not use
+        persistent workers.
+        """
+        self.epoch = epoch
 
     def __iter__(self):
-        return self.iterator_fun()
+        worker_info = torch.utils.data.get_worker_info()
+        seed = None if self.seed is None else self.seed + self.epoch
+        if worker_info is None or worker_info.num_workers <= 1:
+            return self.iterator_fun(seed=seed)
+        # Each worker emits every num_workers-th retrieval batch of one schedule that all workers draw from the same
+        # seed: The base seed of the workers is shared by all workers of a DataLoader iteration.
+        if seed is None:
+            seed = worker_info.seed - worker_info.id
+        return self.iterator_fun(shard=(worker_info.id, worker_info.num_workers), seed=seed)
@@ -2,6 +2,7 @@ import argparse
 import os
 
 import sfaira
+from sfaira.data.store.io.catalog import read_catalog, write_catalog
 
 
 parser = argparse.ArgumentParser()
@@ -12,6 +13,8 @@ parser.add_argument('--path_store', type=str)
 parser.add_argument('--store_type', type=str)
 parser.add_argument('--chunks', type=int, default=128)
 parser.add_argument('--shuffle_data', type=lambda x: str(x).lower() in ['true', '1', 'yes'], default=True)
+parser.add_argument('--num_workers', type=int, default=1)
+parser.add_argument('--max_memory', type=float, default=None)
 args = parser.parse_args()
 
 # On disk format hyperparameters
@@ -21,11 +24,26 @@ if args.store_type == "h5ad":
     compression_kwargs = {}
 elif args.store_type == "dao":
     # Write dense arrays in zarr.
-    kwargs = {"dense": True, "chunks": args.chunks, "shuffle_data": args.shuffle_data}
+    kwargs = {"dense": True, "chunks": args.chunks, "shuffle_data": args.shuffle_data,
+              "num_workers": args.num_workers, "max_memory": args.max_memory, "incremental": True}
     compression_kwargs = {"compressor": "default", "overwrite": True, "order": "C"}
+elif args.store_type == "memmap":
+    # Write uncompressed dense arrays.
+    kwargs = {"shuffle_data": args.shuffle_data, "num_workers": args.num_workers, "max_memory": args.max_memory}
+    compression_kwargs = {}
 else:
     assert False, args.store_type
 
+if args.store_type == "dao":
+    # Data sets are added to dao stores transactionally, data sets that are in the store catalog are complete.
+    if os.path.isdir(args.path_store) and read_catalog(args.path_store) is None:
+        # Catalogue stores that were written before catalogs were maintained.
+        write_catalog(args.path_store)
+    catalog = read_catalog(args.path_store)
+    ids_in_store = [v["id"] for v in catalog.values()] if catalog is not None else []
+else:
+    ids_in_store = []
+
 universe = sfaira.data.dataloaders.Universe(data_path=args.data_path,
                                             meta_path=args.path_meta,
                                             cache_path=args.path_cache)
@@ -33,11 +51,11 @@ universe = sfaira.data.dataloaders.Universe(data_path=args.data_path,
 for k, ds in universe.datasets.items():
     if args.store_type == "h5ad":
         fn_store = os.path.join(args.path_store, ds.doi_cleaned_id + ".h5ad")
-    elif args.store_type == "dao":
+    elif args.store_type in ["dao", "memmap"]:
         fn_store = os.path.join(args.path_store, ds.doi_cleaned_id)
     else:
         assert False
-    if os.path.exists(fn_store):
+    if k in ids_in_store or (args.store_type != "dao" and os.path.exists(fn_store)):
         print(f"SCRIPT skipping {k}")
     else:
         print(f"SCRIPT loading {k}")
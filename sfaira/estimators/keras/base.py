@@ -11,6 +11,7 @@ from tqdm import tqdm
 
 from sfaira.consts import AdataIdsSfaira, AdataIds
 from sfaira.data.store.carts.single import CartSingle
+from sfaira.data.store.io.io_dao import STATS_TOTAL_COUNTS
 from sfaira.data.store.stores.single import StoreSingleFeatureSpace
 from sfaira.estimators.base import EstimatorBaseCelltype, EstimatorBaseEmbedding
 from sfaira.models import BasicModelKeras
@@ -23,11 +24,17 @@ from .metrics import custom_mse, custom_negll_nb, custom_negll_gaussian, \
     CustomAccAgg, CustomF1Classwise, CustomFprClasswise, CustomTprClasswise, custom_cce_agg
 
 
-def prepare_sf(x):
+def prepare_sf(x, total_counts=None):
     """
     Uses a minimal size factor of 1e-3 for total counts / 1e4
+
+    :param x: Count matrix (observations x features), total counts are computed from x if total_counts is None.
+    :param total_counts: Precomputed total counts of observations, e.g. from the per-cell statistics of a store.
     """
-    sf = np.asarray(x.sum(axis=1, keepdims=True))
+    if total_counts is None:
+        sf = np.asarray(x.sum(axis=1, keepdims=True))
+    else:
+        sf = np.asarray(total_counts, dtype=np.float64).reshape((-1, 1))
     sf = np.log(np.maximum(sf / 1e4, 1e-3))
     return sf
 
@@ -442,10 +449,14 @@ class EstimatorKerasEmbedding(EstimatorBaseEmbedding, EstimatorKeras):
     ):
         # Define constants used by map_fn in outer name space so that they are not created for each sample.
         model_type = "vae" if self.model_type[:3] == "vae" else "ae"
+        # Read total counts from the per-cell statistics of the store instead of summing over each batch:
+        use_stats = self.data.has_stats
+        obs_keys = [STATS_TOTAL_COUNTS] if use_stats else []
 
         def map_fn(x_sample, obs_sample):
             x_sample = np.asarray(x_sample)
-            sf_sample = prepare_sf(x=x_sample)
+            total_counts = obs_sample[STATS_TOTAL_COUNTS].values if use_stats else None
+            sf_sample = prepare_sf(x=x_sample, total_counts=total_counts)
             output_x = (x_sample, sf_sample)
             if mode == 'predict':
                 output = output_x,
@@ -455,7 +466,7 @@ class EstimatorKerasEmbedding(EstimatorBaseEmbedding, EstimatorKeras):
                 output = output_x, (x_sample, )
             return output
 
-        g = self.data.checkout(idx=idx, retrieval_batch_size=retrieval_batch_size, obs_keys=[], map_fn=map_fn,
+        g = self.data.checkout(idx=idx, retrieval_batch_size=retrieval_batch_size, obs_keys=obs_keys, map_fn=map_fn,
                                return_dense=True, randomized_batch_access=randomized_batch_access,
                                random_access=False)
         return g
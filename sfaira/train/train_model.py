@@ -8,6 +8,7 @@ from typing import Union
 from sfaira.consts import AdataIdsSfaira
 from sfaira.data.store.stores.base import StoreBase
 from sfaira.data import StoreSingleFeatureSpace, Universe
+from sfaira.data.store.io.io_dao import STATS_TOTAL_COUNTS
 from sfaira.estimators.keras.base import EstimatorKeras, EstimatorKerasCelltype, EstimatorKerasEmbedding
 from sfaira.ui import ModelZoo
 
@@ -96,7 +97,12 @@ class TrainModel:
             self._save_specific(fn=fn)
 
     def n_counts(self, idx):
-        return np.asarray(self.estimator.data.checkout(idx=idx, return_dense=False).x.sum(axis=1)).flatten()
+        data = self.estimator.data
+        if isinstance(data, StoreSingleFeatureSpace) and data.has_stats:
+            # Read precomputed per-cell statistics instead of loading the selected observations.
+            n_counts = data.stats[STATS_TOTAL_COUNTS].values
+            return n_counts if idx is None else n_counts[np.sort(idx)]
+        return np.asarray(data.checkout(idx=idx, return_dense=False).x.sum(axis=1)).flatten()
 
 
 class TrainModelEmbedding(TrainModel):
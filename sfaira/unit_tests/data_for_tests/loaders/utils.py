@@ -9,7 +9,7 @@ from sfaira.data.store.stores.multi import StoresAnndata
 from sfaira.versions.genomes import GenomeContainer
 
 from sfaira.unit_tests.directories import DIR_DATA_LOADERS_CACHE, DIR_DATA_LOADERS_STORE_DAO, \
-    DIR_DATA_LOADERS_STORE_H5AD, save_delete
+    DIR_DATA_LOADERS_STORE_H5AD, DIR_DATA_LOADERS_STORE_MEMMAP, save_delete
 from .consts import RELEASE_HUMAN, RELEASE_MOUSE
 from .loaders import DatasetSuperGroupMock
 
@@ -76,6 +76,7 @@ class PrepareData:
         dir_store_formatted = {
             "dao": DIR_DATA_LOADERS_STORE_DAO,
             "h5ad": DIR_DATA_LOADERS_STORE_H5AD,
+            "memmap": DIR_DATA_LOADERS_STORE_MEMMAP,
         }[store_format]
         if not os.path.exists(dir_store_formatted):
             pathlib.Path(dir_store_formatted).mkdir(parents=True, exist_ok=True)
@@ -86,7 +87,7 @@ class PrepareData:
                 compression_kwargs = {"compressor": "default", "overwrite": True, "order": "C"}
             else:
                 compression_kwargs = {}
-            if store_format == "dao":
+            if store_format in ["dao", "memmap"]:
                 anticipated_fn = os.path.join(dir_store_formatted, ds.doi_cleaned_id)
             elif store_format == "h5ad":
                 anticipated_fn = os.path.join(dir_store_formatted, ds.doi_cleaned_id + ".h5ad")
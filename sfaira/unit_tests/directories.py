@@ -13,9 +13,11 @@ _DIR_DATA_LOADERS = os.path.join(DIR_TEMP, "loaders")
 DIR_DATA_LOADERS_CACHE = os.path.join(_DIR_DATA_LOADERS, "cache")
 DIR_DATA_LOADERS_STORE_DAO = os.path.join(_DIR_DATA_LOADERS, "store_dao")
 DIR_DATA_LOADERS_STORE_H5AD = os.path.join(_DIR_DATA_LOADERS, "store_h5ad")
+DIR_DATA_LOADERS_STORE_MEMMAP = os.path.join(_DIR_DATA_LOADERS, "store_memmap")
 _DIR_DATA_DATABASES = os.path.join(DIR_TEMP, "databases")
 DIR_DATA_DATABASES_CACHE = os.path.join(_DIR_DATA_DATABASES, "cache")
 DIR_DATABASE_STORE_DAO = os.path.join(_DIR_DATA_DATABASES, "store_dao")
+DIR_DATA_STORE_SYNTHETIC = os.path.join(DIR_TEMP, "store_synthetic")
 
 DIR_SFAIRA_LOADERS = os.path.join(DIR_MODULE_ROOT, "sfaira", "data", "dataloaders", "loaders")
 
@@ -1,16 +1,25 @@
 import anndata
 import numpy as np
+import os
 import pandas as pd
+import pathlib
 import pytest
+import random
 import scipy.sparse
 from typing import List
 
 from sfaira.consts import AdataIdsSfaira
-from sfaira.unit_tests.tests_by_submodule.data.store.utils import _get_cart
+from sfaira.data import load_store
+from sfaira.data.store.batch_schedule import BATCH_SCHEDULE
+from sfaira.data.store.io.io_dao import _get_rows_coalesced
+from sfaira.data.store.stores.single import StoreAnndata
+from sfaira.unit_tests.directories import DIR_DATA_STORE_SYNTHETIC
+from sfaira.unit_tests.tests_by_submodule.data.store.utils import _get_cart, _get_synthetic_adata, \
+    _prepare_synthetic_store
 
 
 @pytest.mark.parametrize("feature_space", ["single", "multi"])
-@pytest.mark.parametrize("store_format", ["h5ad", "dao"])
+@pytest.mark.parametrize("store_format", ["h5ad", "dao", "memmap"])
 def test_properties(store_format: str, feature_space: str):
     """Tests if properties of carts are available and of the right format."""
     idx = np.arange(0, 5)
@@ -46,7 +55,7 @@ def test_properties(store_format: str, feature_space: str):
     _ = cart.n_var
 
 
-@pytest.mark.parametrize("store_format", ["h5ad", "dao"])
+@pytest.mark.parametrize("store_format", ["h5ad", "dao", "memmap"])
 @pytest.mark.parametrize("idx", [np.arange(1, 10),
                                  np.concatenate([np.arange(30, 50), np.array([1, 4, 98])])])
 @pytest.mark.parametrize("obs_keys", [["cell_type"]])
@@ -75,7 +84,50 @@ def test_data(store_format: str, idx, obs_keys: List[str], randomized_batch_acce
     assert np.sum(batch_sizes) == len(idx), (batch_sizes, len(idx))
 
 
-@pytest.mark.parametrize("store_format", ["h5ad", "dao"])
+@pytest.mark.parametrize("max_gap", [0, 4])
+def test_coalesced_rows(max_gap: int):
+    """
+    Test that reads in runs of contiguous observations recover arbitrary observations in the requested order.
+    """
+    x = scipy.sparse.random(100, 10, density=0.3, format="csr", random_state=0)
+    rows = np.array([50, 3, 4, 5, 9, 98, 99, 20, 50])
+    assert np.all(_get_rows_coalesced(x=x, rows=rows, max_gap=max_gap).toarray() == x[rows, :].toarray())
+    assert np.all(_get_rows_coalesced(x=x.toarray(), rows=rows, max_gap=max_gap) == x[rows, :].toarray())
+
+
+@pytest.mark.parametrize("dense", [True, False])
+@pytest.mark.parametrize("randomized_batch_access", [True, False])
+def test_anndata_backed(dense: bool, randomized_batch_access: bool):
+    """
+    Test that carts over backed h5ad data sets emit the same observations as carts over data sets in memory.
+    """
+    pathlib.Path(DIR_DATA_STORE_SYNTHETIC).mkdir(parents=True, exist_ok=True)
+    adatas = {}
+    adatas_backed = {}
+    for i in range(2):
+        adata = _get_synthetic_adata(n_obs=200, seed=i)
+        if dense:
+            adata.X = adata.X.toarray()
+        fn = os.path.join(DIR_DATA_STORE_SYNTHETIC, f"backed_{i}.h5ad")
+        adata.write_h5ad(fn)
+        adatas[adata.uns["id"]] = adata
+        adatas_backed[adata.uns["id"]] = anndata.read_h5ad(fn, backed="r")
+    indices = {"dataset_0": np.concatenate([np.arange(10, 60), np.arange(100, 105)]), "dataset_1": np.arange(0, 200, 3)}
+    x = []
+    for adata_by_key in [adatas, adatas_backed]:
+        store = StoreAnndata(adata_by_key=adata_by_key, indices=indices)
+        idx = np.arange(0, store.n_obs, 2)
+        random.seed(0)
+        cart = store.checkout(idx=idx, batch_size=0, retrieval_batch_size=16, map_fn=lambda x_, obs_: ((x_, ), ),
+                              randomized_batch_access=randomized_batch_access, return_dense=True)
+        x.append(np.concatenate([np.asarray(z[0][0]) for z in cart.iterator()], axis=0))
+    for adata in adatas_backed.values():
+        adata.file.close()
+    assert x[0].shape == (int(np.ceil((55 + 67) / 2)), 50)
+    assert np.all(x[0] == x[1])
+
+
+@pytest.mark.parametrize("store_format", ["h5ad", "dao", "memmap"])
 @pytest.mark.parametrize("idx", [None, np.array([1, 4, 98])])
 def test_schedule_blocked(store_format: str, idx):
     """
@@ -152,3 +204,262 @@ def test_adaptors(adaptor: str, shuffle_buffer_size: int):
         import torch
         it = iter(list(it))
     _ = next(it)
+
+
+@pytest.mark.parametrize("store_format", ["anndata", "dao"])
+@pytest.mark.parametrize("deterministic", [True, False])
+@pytest.mark.parametrize("batch_size", [0, 1])
+def test_prefetch(store_format: str, deterministic: bool, batch_size: int):
+    """
+    Test that carts that read batches ahead of the consumer emit the same observations as carts that do not.
+    """
+    if store_format == "dao":
+        store_path, _ = _prepare_synthetic_store(dense=False)
+        store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    else:
+        store = StoreAnndata(adata_by_key=dict([(f"dataset_{i}", _get_synthetic_adata(n_obs=200, seed=i))
+                                                for i in range(2)]))
+    obs = []
+    for prefetch in [0, 3]:
+        random.seed(0)
+        cart = store.checkout(idx=np.arange(0, store.n_obs, 3), batch_size=batch_size, retrieval_batch_size=16,
+                              map_fn=lambda x_, obs_: ((x_, obs_), ), obs_keys=["cell_type"], return_dense=True,
+                              randomized_batch_access=True, prefetch=prefetch, num_workers=2,
+                              deterministic=deterministic)
+        batches = list(cart.iterator(repeat=2))
+        if store_format == "dao":
+            # The read threads of the cart are shut down with the iterator:
+            assert cart._x._pool is None
+        obs.append(np.concatenate([np.asarray(z[0][1].index) for z in batches]))
+        # Data and meta data of each batch belong to the same observations:
+        for z in batches:
+            x_i = np.asarray(z[0][0])
+            x_i = x_i.reshape(1, -1) if x_i.ndim == 1 else x_i
+            assert x_i.shape[0] == z[0][1].shape[0]
+    if deterministic:
+        assert np.all(obs[0] == obs[1])
+    else:
+        assert np.all(np.sort(obs[0]) == np.sort(obs[1]))
+    assert len(obs[1]) == 2 * len(np.arange(0, store.n_obs, 3))
+
+
+def test_read_threads_iterators():
+    """
+    Test that the read threads of a dao cart are shared by its live iterators and are shut down with the last one.
+    """
+    store_path, _ = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    cart = store.checkout(idx=np.arange(0, store.n_obs, 3), batch_size=0, retrieval_batch_size=64,
+                          map_fn=lambda x_, obs_: ((x_, ), ), obs_keys=[], random_access=True, num_threads=2)
+    n_batches = cart.n_batches
+    it_train = cart.iterator()
+    _ = next(it_train)
+    pool = cart._x._pool
+    assert pool is not None
+    # An evaluation pass that finishes while the training iterator is live keeps the threads:
+    assert len(list(cart.iterator())) == n_batches
+    assert cart._x._pool is pool
+    assert len(list(it_train)) == n_batches - 1
+    assert cart._x._pool is None and pool._shutdown
+    # An abandoned iterator releases the threads when it is closed:
+    it = cart.iterator()
+    _ = next(it)
+    it.close()
+    assert cart._x._pool is None
+
+
+@pytest.mark.parametrize("num_workers", [0, 3])
+@pytest.mark.parametrize("randomized_batch_access", [True, False])
+def test_torch_workers(num_workers: int, randomized_batch_access: bool):
+    """
+    Test that the worker processes of a torch DataLoader emit disjoint shards of the selected observations.
+    """
+    store_path, _ = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    idx = np.arange(0, store.n_obs, 2)
+    cart = store.checkout(idx=idx, batch_size=0, retrieval_batch_size=16, obs_keys=[],
+                          map_fn=lambda x_, obs_: ((np.asarray(obs_.index.values), ), ),
+                          randomized_batch_access=randomized_batch_access)
+    obs = []
+    for _ in range(2):
+        loader = cart.adaptor(generator_type="torch-iter-loader", dataset_kwargs={"seed": 1}, batch_size=None,
+                              num_workers=num_workers)
+        obs.append(np.concatenate([z[0][0].numpy() for z in loader]))
+        assert np.all(np.sort(obs[-1]) == idx)
+    if num_workers > 0 or not randomized_batch_access:
+        assert np.all(obs[0] == obs[1])
+
+
+def test_torch_workers_ranks():
+    """
+    Test that DataLoader workers of the ranks of a data-parallel job emit disjoint shards that cover the selected
+    observations, although the DataLoader of each rank draws its own base seed.
+    """
+    store_path, _ = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    # 16 retrieval batches of 10 observations, so that shares of ranks are not padded:
+    idx = np.arange(0, 160)
+    obs = []
+    for epoch in range(2):
+        obs_epoch = []
+        for rank in range(2):
+            cart = store.checkout(idx=idx, batch_size=0, retrieval_batch_size=10, obs_keys=[],
+                                  map_fn=lambda x_, obs_: ((np.asarray(obs_.index.values), ), ),
+                                  randomized_batch_access=True, rank=rank, world_size=2)
+            loader = cart.adaptor(generator_type="torch-iter-loader", batch_size=None, num_workers=2)
+            loader.dataset.set_epoch(epoch)
+            obs_epoch.append(np.concatenate([z[0][0].numpy() for z in loader]))
+        assert len(np.intersect1d(obs_epoch[0], obs_epoch[1])) == 0
+        assert np.all(np.sort(np.concatenate(obs_epoch)) == idx)
+        obs.append(np.concatenate(obs_epoch))
+    # Each epoch draws a new schedule:
+    assert np.any(obs[0] != obs[1])
+
+
+@pytest.mark.parametrize("batch_schedule", ["base", "balanced", "blocks", "full"])
+@pytest.mark.parametrize("world_size", [1, 3])
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_schedule_ranks(batch_schedule: str, world_size: int, drop_last: bool):
+    """
+    Test that the ranks of a data-parallel job emit the same number of batches and of observations of each epoch, and
+    that their shares cover the schedule up to the stated padding or truncated observations.
+    """
+    idx = np.arange(0, 100)
+    # Groups of unequal size, so that batches of the "blocks" schedule differ in length:
+    grouping = np.repeat(np.arange(0, 10), [1, 3, 5, 7, 9, 11, 13, 15, 17, 19])
+    kwargs = {"retrieval_batch_size": 8, "randomized_batch_access": batch_schedule == "base",
+              "random_access": batch_schedule in ["balanced", "full"]}
+    if batch_schedule == "balanced":
+        kwargs.update({"grouping": grouping, "group_weights": dict([(x, 1.) for x in range(10)])})
+    if batch_schedule == "blocks":
+        kwargs.update({"grouping": grouping})
+    for epoch in range(2):
+        schedule = BATCH_SCHEDULE[batch_schedule](seed=3, **kwargs)
+        schedule.idx = idx
+        obs_schedule = np.concatenate(schedule.design_epoch(epoch=epoch))
+        designs = []
+        for rank in range(world_size):
+            schedule = BATCH_SCHEDULE[batch_schedule](rank=rank, world_size=world_size, seed=3, drop_last=drop_last,
+                                                      **kwargs)
+            schedule.idx = idx
+            designs.append(schedule.design_epoch(epoch=epoch))
+            assert schedule.n_batches == len(designs[-1])
+            assert np.all([len(x) > 0 for x in designs[-1]])
+        # All ranks emit the same number of batches and of observations:
+        assert len(np.unique([len(x) for x in designs])) == 1
+        n_obs = np.unique([np.sum([len(y) for y in x]) for x in designs])
+        assert len(n_obs) == 1
+        obs = np.concatenate([np.concatenate(x) for x in designs])
+        counts = np.bincount(obs, minlength=len(idx))
+        counts_schedule = np.bincount(obs_schedule, minlength=len(idx))
+        if drop_last:
+            # Shares are disjoint parts of the schedule:
+            assert np.all(counts <= counts_schedule)
+        else:
+            # Shares cover the schedule, the first observations of the schedule are emitted twice:
+            n_pad = len(obs) - len(obs_schedule)
+            assert 0 <= n_pad < len(obs_schedule)
+            assert np.all(counts - counts_schedule == np.bincount(obs_schedule[:n_pad], minlength=len(idx)))
+        if world_size == 1:
+            assert np.all(obs == obs_schedule)
+
+
+@pytest.mark.parametrize("batch_size", [0, 1, 4])
+def test_checkout_ranks(batch_size: int):
+    """
+    Test that carts of the ranks of a data-parallel job take the same number of steps and emit shares of the selected
+    observations that overlap only in the padding observations, or not at all with drop_last.
+    """
+    store_path, _ = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    idx = np.arange(0, store.n_obs, 2)
+    for drop_last in [False, True]:
+        obs = []
+        n_steps = []
+        for rank in range(2):
+            # Retrieval batches differ in length as 10 does not divide the number of selected observations:
+            cart = store.checkout(idx=idx, batch_size=batch_size, retrieval_batch_size=10, obs_keys=[],
+                                  map_fn=lambda x_, obs_: ((np.asarray(obs_.index.values), ), ),
+                                  randomized_batch_access=True, rank=rank, world_size=2, drop_last=drop_last)
+            batches = [np.atleast_1d(z[0][0]) for z in cart.iterator()]
+            if batch_size == 0:
+                assert len(batches) == cart.n_batches
+            n_steps.append(len(batches))
+            obs.append(np.concatenate(batches))
+        assert n_steps[0] == n_steps[1]
+        assert len(obs[0]) == len(obs[1])
+        if drop_last:
+            assert len(np.intersect1d(obs[0], obs[1])) == 0
+            assert len(idx) - 2 * 10 < len(obs[0]) + len(obs[1]) <= len(idx)
+        else:
+            # Shares only overlap in the observations that pad the smaller share:
+            assert len(np.intersect1d(obs[0], obs[1])) == len(obs[0]) + len(obs[1]) - len(idx)
+            assert np.all(np.unique(np.concatenate(obs)) == idx)
+
+
+@pytest.mark.parametrize("n_chunks", [1, 3])
+def test_schedule_chunk_shuffle(n_chunks: int):
+    """
+    Test that schedule "chunk_shuffle" emits each observation once per epoch in batches of n_chunks shuffled chunks.
+    """
+    store_path, _ = _prepare_synthetic_store(dense=False, chunks=64)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    idx = np.arange(0, store.n_obs, 2)
+    cart = store.checkout(idx=idx, batch_size=0, obs_keys=[], batch_schedule="chunk_shuffle", n_chunks=n_chunks,
+                          map_fn=lambda x_, obs_: ((x_, np.asarray(obs_.index.values)), ))
+    chunks = np.cumsum(store._x.chunks[0])
+    batches = []
+    for z in cart.iterator():
+        x_i, obs_i = z[0]
+        assert x_i.shape[0] == len(obs_i)
+        # Each batch contains all selected observations of at most n_chunks chunks:
+        chunks_i = np.unique(np.searchsorted(chunks, obs_i, side="right"))
+        assert len(chunks_i) <= n_chunks
+        assert len(obs_i) == np.sum(np.isin(np.searchsorted(chunks, idx, side="right"), chunks_i))
+        batches.append(obs_i)
+    assert np.all(np.sort(np.concatenate(batches)) == idx)
+    # Observations are shuffled within batches:
+    assert np.any([np.any(np.diff(x) < 0) for x in batches])
+
+
+@pytest.mark.parametrize("batch_size", [1, 7, 64])
+def test_mini_batches(batch_size: int):
+    """
+    Test that carts emit the observations of the retrieval batches in mini-batches of batch_size observations.
+    """
+    store_path, _ = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    x = []
+    obs = []
+    for batch_size_i in [0, batch_size]:
+        cart = store.checkout(idx=np.arange(0, store.n_obs, 2), batch_size=batch_size_i, retrieval_batch_size=20,
+                              obs_keys=["cell_type"], return_dense=True, map_fn=lambda x_, obs_: ((x_, obs_), ))
+        batches = list(cart.iterator())
+        if batch_size_i > 1:
+            assert np.all([z[0][0].shape[0] == batch_size for z in batches[:-1]])
+            assert 0 < batches[-1][0][0].shape[0] <= batch_size
+        x.append(np.concatenate([np.asarray(z[0][0]).reshape(-1, store.n_vars) for z in batches], axis=0))
+        obs.append(pd.concat([z[0][1] for z in batches], axis=0))
+    assert np.all(x[0] == x[1])
+    assert np.all(obs[0].index == obs[1].index)
+    assert np.all(obs[0]["cell_type"].values == obs[1]["cell_type"].values)
+
+
+def test_anndata_routing():
+    """
+    Test that carts over multiple anndata objects route observations to the data sets that contain them.
+    """
+    adatas = dict([(f"dataset_{i}", _get_synthetic_adata(n_obs=n, seed=i)) for i, n in enumerate([30, 1, 50])])
+    store = StoreAnndata(adata_by_key=adatas)
+    cart = store.checkout(map_fn=lambda x_, obs_: ((x_, ), ))
+    offsets = np.cumsum([0] + [v.n_obs for v in adatas.values()])
+    np.random.seed(0)
+    for idx in [np.random.permutation(store.n_obs)[:20], np.array([0, 29, 30, 31, 80]), np.arange(31, 81),
+                np.array([], dtype=np.int64)]:
+        idx_dict = cart._obs_idx_dict_query(idx=idx)
+        idx_dict_ref = dict([
+            (k, np.sort(idx[(idx >= s) & (idx < e)]) - s)
+            for k, s, e in zip(adatas.keys(), offsets[:-1], offsets[1:]) if np.any((idx >= s) & (idx < e))
+        ])
+        assert list(idx_dict.keys()) == list(idx_dict_ref.keys())
+        assert np.all([np.all(idx_dict[k] == v) for k, v in idx_dict_ref.items()])
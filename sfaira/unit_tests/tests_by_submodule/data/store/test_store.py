@@ -1,17 +1,37 @@
+from concurrent.futures import ThreadPoolExecutor
 import anndata
 import dask.array
 import h5py
 import numpy as np
 import os
+import pandas as pd
+import pathlib
+import pyarrow.parquet as pq
 import pytest
 import scipy.sparse
+import shutil
+import types
+from typing import Union
+import zarr
 
 from sfaira.data import load_store
+from sfaira.data.store.io.build_dao import build_dao_store
+from sfaira.data.store.io.catalog import path_catalog, read_catalog, read_catalog_version, write_catalog
+from sfaira.data.store.io.io_dao import _invert_permutation, _read_csc_features, _write_x_csc, path_obs, path_stats, \
+    read_dao, read_obs_where, write_dao, write_stats, STATS_N_GENES, STATS_SIZE_FACTORS, STATS_TOTAL_COUNTS
+from sfaira.data.store.io.io_memmap import write_memmap
+from sfaira.data.store.io.ontology_index import read_ontology_index, write_ontology_index
+from sfaira.data.store.io.rechunk_dao import auto_compression_kwargs, benchmark_chunks, benchmark_compressors, \
+    compression_kwargs_from_name, rechunk_store, select_compressor, COMPRESSION_OBJECTIVES
+from sfaira.data.store.io.update_dao import append_dao, remove_dao, replace_dao, vacuum_dao
 
 from sfaira.unit_tests.data_for_tests.loaders import PrepareData
+from sfaira.unit_tests.directories import DIR_DATA_STORE_SYNTHETIC, DIR_TEMP, save_delete
+from sfaira.unit_tests.tests_by_submodule.data.store.utils import _get_synthetic_adata, _prepare_synthetic_store
+from sfaira.versions.metadata import OntologyOboCustom
 
 
-@pytest.mark.parametrize("store_format", ["h5ad", "dao", "anndata"])
+@pytest.mark.parametrize("store_format", ["h5ad", "dao", "memmap", "anndata"])
 def test_fatal(store_format: str):
     """
     Test if basic methods of stores abort.
@@ -33,7 +53,7 @@ def test_fatal(store_format: str):
         _ = x.genome_container
 
 
-@pytest.mark.parametrize("store_format", ["h5ad", "dao"])
+@pytest.mark.parametrize("store_format", ["h5ad", "dao", "memmap"])
 def test_config(store_format: str):
     """
     Test that data set config files can be set, written and recovered.
@@ -51,7 +71,7 @@ def test_config(store_format: str):
                    for k in store.indices.keys()])
 
 
-@pytest.mark.parametrize("store_format", ["h5ad", "dao"])
+@pytest.mark.parametrize("store_format", ["h5ad", "dao", "memmap"])
 def test_store_data(store_format: str):
     """
     Test if the data exposed by the store are the same as in the original Dataset instance after streamlining.
@@ -112,3 +132,541 @@ def test_store_data(store_format: str):
     assert np.all(uns_store.keys() == uns_ds.keys()), (uns_store.keys(), uns_ds.keys())
     for k, v in uns_store.items():
         assert np.all(v == uns_ds[k])
+
+
+@pytest.mark.parametrize("dense", [True, False])
+@pytest.mark.parametrize("num_workers", [1, 4])
+def test_dao_io(dense: bool, num_workers: int):
+    """
+    Test that .X written into dense and sparse dao stores is recovered by the store and its carts.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=dense, num_workers=num_workers, max_memory=0.01)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    x_ref = scipy.sparse.vstack([x.X for x in adatas]).toarray()
+    assert store.shape == x_ref.shape
+    for k, v in store.data_by_key.items():
+        assert isinstance(v, dask.array.Array)
+        assert isinstance(v._meta, np.ndarray) if dense else scipy.sparse.issparse(v._meta)
+    for return_dense in [True, False]:
+        cart = store.checkout(map_fn=lambda x_, obs_: ((x_, ), ), batch_size=0, retrieval_batch_size=50,
+                              return_dense=return_dense)
+        x = []
+        for z in cart.iterator():
+            x_i = z[0][0]
+            if not dense:
+                assert scipy.sparse.issparse(x_i) != return_dense
+            x.append(x_i.toarray() if scipy.sparse.issparse(x_i) else np.asarray(x_i))
+        assert np.all(np.concatenate(x, axis=0) == x_ref)
+
+
+@pytest.mark.parametrize("dense", [True, False])
+@pytest.mark.parametrize("num_threads", [1, 3])
+def test_dao_virtual_concat(dense: bool, num_threads: int):
+    """
+    Test that the virtual concatenation of .X of a store reads the same observations as a dask concatenation, also if
+    chunks are read on a thread pool.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=dense)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    keys = [x.uns["id"] for x in adatas]
+    store.indices = {keys[0]: np.arange(0, adatas[0].n_obs), keys[1]: np.arange(3, 250, 2), keys[2]: np.array([7])}
+    x = store._x.with_threads(num_threads=num_threads)
+    x_dask = dask.array.vstack([store.data_by_key[k] for k in keys])
+    x_ref = x_dask.compute()
+    x_ref = x_ref.toarray() if scipy.sparse.issparse(x_ref) else x_ref
+    assert x.shape == x_ref.shape
+    assert x.chunks == x_dask.chunks
+    np.random.seed(0)
+    for idx in [np.random.permutation(x.shape[0])[:40], np.arange(190, 210), np.array([x.shape[0] - 1]),
+                np.array([], dtype=np.int64)]:
+        x_i = x[idx, :]
+        assert scipy.sparse.issparse(x_i) != dense
+        x_i = x_i.toarray() if scipy.sparse.issparse(x_i) else x_i
+        assert np.all(x_i == x_ref[idx, :])
+    x_i = x[5:9, np.array([1, 3])]
+    x_i = x_i.toarray() if scipy.sparse.issparse(x_i) else x_i
+    assert np.all(x_i == x_ref[5:9][:, [1, 3]])
+    # Concurrent reads share one pool, which is shut down by .close() and created again by later reads:
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        _ = list(pool.map(lambda i: x[np.arange(i, x.shape[0], 7), :], range(8)))
+    pool_x = x._pool
+    assert (pool_x is None) == (num_threads == 1)
+    x.close()
+    assert x._pool is None
+    if pool_x is not None:
+        assert pool_x._shutdown
+    x_i = x[np.arange(0, x.shape[0], 5), :]
+    x_i = x_i.toarray() if scipy.sparse.issparse(x_i) else x_i
+    assert np.all(x_i == x_ref[np.arange(0, x.shape[0], 5), :])
+
+
+def test_dao_obs_table():
+    """
+    Test that .obs of the selected observations is assembled once per selection and emitted by carts.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    keys = [x.uns["id"] for x in adatas]
+    store.indices = {keys[0]: np.arange(0, adatas[0].n_obs), keys[1]: np.arange(3, 250, 2), keys[2]: np.array([7])}
+    obs_ref = pd.concat([adatas[0].obs, adatas[1].obs.iloc[3:250:2], adatas[2].obs.iloc[[7]]], ignore_index=True)
+    obs_table = store._obs_table
+    assert np.all(obs_table.offsets == [0, adatas[0].n_obs, adatas[0].n_obs + 124, adatas[0].n_obs + 125])
+    cart = store.checkout(obs_keys=["cell_type"], batch_size=0, retrieval_batch_size=64)
+    assert np.all(cart.obs["cell_type"].astype(str).values == obs_ref["cell_type"].astype(str).values)
+    cart = store.checkout(obs_keys=["cell_type"], batch_size=0, retrieval_batch_size=64, map_fn=lambda x, obs: (obs, ))
+    obs_batches = [batch[0] for batch in cart.iterator()]
+    assert np.all(pd.concat(obs_batches)["cell_type"].astype(str).values == obs_ref["cell_type"].astype(str).values)
+    # The table is re-used across checkouts until the selection changes:
+    assert store._obs_table is obs_table
+    store.indices = {keys[1]: np.arange(0, 10)}
+    assert store._obs_table is not obs_table
+    assert store._obs.shape[0] == 10
+    assert np.all(store._obs["cell_type"].astype(str).values == adatas[1].obs["cell_type"].values[:10].astype(str))
+
+
+@pytest.mark.parametrize("dense", [True, False])
+@pytest.mark.parametrize("backed", [True, False])
+def test_dao_shuffled_write(dense: bool, backed: bool):
+    """
+    Test that shuffled dao stores written from in-memory and backed anndata can be restored to the original ordering.
+    """
+    adata = _get_synthetic_adata(n_obs=300)
+    if backed:
+        fn = os.path.join(DIR_DATA_STORE_SYNTHETIC, "backed.h5ad")
+        pathlib.Path(DIR_DATA_STORE_SYNTHETIC).mkdir(parents=True, exist_ok=True)
+        adata.write_h5ad(fn)
+        adata = anndata.read_h5ad(fn, backed="r")
+    store = os.path.join(DIR_DATA_STORE_SYNTHETIC, "shuffled")
+    write_dao(store=store, adata=adata, chunks=(64, adata.n_vars), compression_kwargs={}, shuffle_data=True,
+              dense=dense, num_workers=2)
+    adata_store, x_store = read_dao(store=store, use_dask=False, x_separate=True)
+    x_store = x_store.toarray() if scipy.sparse.issparse(x_store) else x_store
+    perm = adata_store.obs["permutation_original_data"].values
+    assert np.all(x_store[perm, :] == adata.X[:, :].toarray())
+    if backed:
+        adata.file.close()
+
+
+def test_dao_catalog():
+    """
+    Test that the store catalog is maintained by the writer and that stores open identically with and without catalog.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=False)
+    catalog = read_catalog(store_path)
+    assert catalog is not None
+    assert np.all([catalog[x.uns["id"]]["shape"] == list(x.shape) for x in adatas])
+    assert len(np.unique([v["var_hash"] for v in catalog.values()])) == 1
+    n_obs = [v["shape"][0] for v in catalog.values()]
+    assert [v["obs_offset"] for v in catalog.values()] == np.cumsum([0] + n_obs[:-1]).tolist()
+    # Catalog rebuilt from disk is identical to catalog maintained by writer:
+    version = read_catalog_version(store_path)
+    write_catalog(store_path)
+    assert read_catalog(store_path) == catalog
+    assert read_catalog_version(store_path) == version + 1
+    # Directories that do not hold a completely written data set, e.g. of a concurrent writer, are skipped:
+    dir_partial = os.path.join(store_path, "partial")
+    zarr.open(os.path.join(dir_partial, "zarr"), mode="w")
+    try:
+        write_catalog(store_path)
+    finally:
+        shutil.rmtree(dir_partial)
+    assert read_catalog(store_path) == catalog
+    store = load_store(cache_path=store_path, store_format="dao")
+    os.remove(path_catalog(store_path))
+    store2 = load_store(cache_path=store_path, store_format="dao")
+    assert store.shape == store2.shape
+    assert np.all([np.all(v == store2.indices[k]) for k, v in store.indices.items()])
+
+
+def test_dao_lazy():
+    """
+    Test that data sets declared in the store catalog are only opened once selected observations are accessed.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=False)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    datasets = store.adata_by_key
+    keys = [x.uns["id"] for x in adatas]
+    # Meta data and meta data used for sub-setting are served by the catalog:
+    uns, obs_columns, _, _, n_obs = store._subset_meta_by_key(keys[0])
+    assert uns["organism"] == "Mus musculus"
+    assert "cell_type" in obs_columns
+    assert n_obs == adatas[0].n_obs
+    assert store.n_obs == np.sum([x.n_obs for x in adatas])
+    assert store.n_vars == adatas[0].n_vars
+    assert store.organism == "Mus musculus"
+    # Cell-wise annotations are queried on disk:
+    assert set(datasets.obs_unique(keys[0], "cell_type")) == {"B cell", "T cell"}
+    assert np.all(datasets.obs_where(keys[0], "cell_type", ["T cell"]) ==
+                  np.where(adatas[0].obs["cell_type"].values == "T cell")[0])
+    assert not np.any([datasets.is_open(k) for k in keys])
+    # Only selected data sets are opened:
+    store.indices = {keys[0]: np.arange(0, 10), keys[1]: np.arange(5, 20)}
+    x = store.data_by_key
+    assert np.all(x[keys[0]].compute().toarray() == adatas[0].X[:10].toarray())
+    assert np.all(x[keys[1]].compute().toarray() == adatas[1].X[5:20].toarray())
+    assert store._obs.shape[0] == 25
+    assert datasets.is_open(keys[0]) and datasets.is_open(keys[1]) and not datasets.is_open(keys[2])
+    # Data sets that are not selected anymore are released:
+    store.indices = {keys[1]: np.arange(0, 10)}
+    assert not datasets.is_open(keys[0]) and datasets.is_open(keys[1])
+
+
+def test_dao_obs():
+    """
+    Test that .obs keeps numeric types, is written in row groups aligned to chunks of .X and can be queried by value.
+    """
+    adata = _get_synthetic_adata(n_obs=300)
+    adata.obs["n_counts"] = np.asarray(adata.X.sum(axis=1)).flatten()
+    adata.obs["is_doublet"] = adata.obs["n_counts"].values > 20.
+    # Sorted column so that row group statistics exclude row groups:
+    adata.obs["donor"] = np.repeat(["donor_a", "donor_b", "donor_c"], 100)
+    store = os.path.join(DIR_DATA_STORE_SYNTHETIC, "obs")
+    write_dao(store=store, adata=adata, chunks=(64, adata.n_vars), compression_kwargs={}, dense=False)
+    obs = read_dao(store=store, use_dask=True).obs
+    assert obs["n_counts"].dtype == adata.obs["n_counts"].dtype
+    assert obs["is_doublet"].dtype == bool
+    assert obs["cell_type"].dtype == "category"
+    assert pq.ParquetFile(path_obs(store)).metadata.num_row_groups == int(np.ceil(adata.n_obs / 64))
+    for column, values in [("cell_type", ["T cell"]), ("donor", ["donor_a", "donor_c"]), ("donor", ["donor_x"]),
+                           ("n_counts", [adata.obs["n_counts"].values[0]])]:
+        assert np.all(read_obs_where(store=store, column=column, values=values) ==
+                      np.where(np.isin(adata.obs[column].values, values))[0])
+
+
+def test_dao_ontology_index():
+    """
+    Test that sub-setting by ontology terms reads the ontology-closure index instead of the ontologies.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=False)
+    fn_obo = os.path.join(DIR_TEMP, "ontology_index.obo")
+    with open(fn_obo, "w") as f:
+        f.write("format-version: 1.2\nontology: test\n")
+        for term_id, name, parent in [("CL:0000000", "cell", None), ("CL:0000542", "lymphocyte", "CL:0000000"),
+                                      ("CL:0000084", "T cell", "CL:0000542"), ("CL:0000236", "B cell", "CL:0000542")]:
+            f.write(f"\n[Term]\nid: {term_id}\nname: {name}\n" + (f"is_a: {parent}\n" if parent else ""))
+    ontology_container = types.SimpleNamespace(cell_type=OntologyOboCustom(obo=fn_obo))
+    for adata in adatas:
+        write_ontology_index(store=os.path.join(store_path, adata.uns["id"]), keys=["cell_type"],
+                             ontology_container=ontology_container)
+    index = read_ontology_index(os.path.join(store_path, adatas[0].uns["id"]))
+    assert index.columns == ["cell_type"]
+    assert index.closure("cell_type")["T cell"] == {"T cell", "CL:0000084", "lymphocyte", "CL:0000542", "cell",
+                                                    "CL:0000000"}
+    assert np.all(index.where("cell_type", ["B cell"]) == np.where(adatas[0].obs["cell_type"] == "B cell")[0])
+    assert np.all(index.where("cell_type", ["T cell", "B cell"]) ==
+                  np.where(adatas[0].obs["cell_type"].isin(["T cell", "B cell"]))[0])
+    # Rewriting the index replaces the observation indices of the previous index, open indices remain readable:
+    write_ontology_index(store=os.path.join(store_path, adatas[0].uns["id"]), keys=["cell_type"],
+                         ontology_container=ontology_container)
+    assert len([x for x in os.listdir(os.path.join(store_path, adatas[0].uns["id"], "index"))
+                if x.startswith("ontology_rows_")]) == 1
+    assert np.all(index.where("cell_type", ["B cell"]) == np.where(adatas[0].obs["cell_type"] == "B cell")[0])
+    for values, excluded_values, selected in [(["lymphocyte"], None, ["T cell", "B cell"]),
+                                              (["CL:0000084"], None, ["T cell"]),
+                                              (None, ["T cell"], ["B cell"])]:
+        store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+        # The ontologies are not used if the data sets have an index:
+        store.ontology_container = None
+        store.subset(attr_key="cell_type", values=values, excluded_values=excluded_values)
+        for adata in adatas:
+            assert np.all(store.indices[adata.uns["id"]] == np.where(adata.obs["cell_type"].isin(selected))[0])
+        assert not np.any([store.adata_by_key.is_open(adata.uns["id"]) for adata in adatas])
+
+
+@pytest.mark.parametrize("store_format", ["dao_dense", "dao_sparse", "memmap"])
+def test_packed_counts(store_format: str):
+    """
+    Test that count matrices are packed into small unsigned integer types and are emitted as float32 by carts.
+    """
+    store_path, adatas = _prepare_synthetic_store(n_datasets=0)
+    adata = _get_synthetic_adata(n_obs=300)
+    adata.X[0, 0] = 300.
+    store = os.path.join(store_path, adata.uns["id"])
+    if store_format == "memmap":
+        write_memmap(store=store, adata=adata, dtype="counts", block_size=64)
+    else:
+        write_dao(store=store, adata=adata, chunks=(64, adata.n_vars), compression_kwargs={},
+                  dense=store_format == "dao_dense", dtype="counts", catalog=True)
+        assert read_catalog(store_path)[adata.uns["id"]]["dtype"] == np.dtype(np.uint16).str
+    store = load_store(cache_path=store_path, store_format=store_format.split("_")[0]).stores["Mus musculus"]
+    assert store.data_by_key[adata.uns["id"]].dtype == np.uint16
+    cart = store.checkout(map_fn=lambda x_, obs_: ((x_, ), ), batch_size=0, retrieval_batch_size=50,
+                          return_dense=True)
+    x = [np.asarray(z[0][0]) for z in cart.iterator()]
+    assert np.all([x_i.dtype == np.float32 for x_i in x])
+    assert np.all(np.concatenate(x, axis=0) == adata.X.toarray())
+    # Non-integer matrices cannot be packed:
+    adata.X[0, 0] = 0.5
+    with pytest.raises(ValueError):
+        write_dao(store=os.path.join(store_path, "not_counts"), adata=adata, chunks=(64, adata.n_vars),
+                  compression_kwargs={}, dtype="counts")
+    # Explicit data types must hold the range of .X:
+    adata.X[0, 0] = 1e5
+    with pytest.raises(ValueError):
+        write_dao(store=os.path.join(store_path, "float16"), adata=adata, chunks=(64, adata.n_vars),
+                  compression_kwargs={}, dtype="float16")
+
+
+@pytest.mark.parametrize("shuffle_data", [True, False])
+def test_memmap_io(shuffle_data: bool):
+    """
+    Test that .X written into memory-mapped stores is recovered by the store and its carts.
+    """
+    store_path = os.path.join(DIR_DATA_STORE_SYNTHETIC, "memmap")
+    if os.path.exists(store_path):
+        save_delete(store_path)
+    adatas = [_get_synthetic_adata(n_obs=200 + 100 * i, seed=i) for i in range(3)]
+    for adata in adatas:
+        write_memmap(store=os.path.join(store_path, adata.uns["id"]), adata=adata, shuffle_data=shuffle_data,
+                     block_size=64)
+    store = load_store(cache_path=store_path, store_format="memmap").stores["Mus musculus"]
+    x_ref = {}
+    for adata in adatas:
+        x_k = adata.X.toarray()
+        if shuffle_data:
+            perm = store.adata_by_key[adata.uns["id"]].obs["permutation_original_data"].values
+            x_k = x_k[_invert_permutation(perm), :]
+        x_ref[adata.uns["id"]] = x_k
+    assert isinstance(store.adata_by_key[adatas[0].uns["id"]].X, np.memmap)
+    # Select a subset of observations in each data set:
+    store.indices = dict([(k, np.arange(10, 150)) for k in x_ref.keys()])
+    x_ref = np.concatenate([v[10:150, :] for v in x_ref.values()], axis=0)
+    for random_access in [True, False]:
+        cart = store.checkout(map_fn=lambda x_, obs_: ((x_, obs_.index.values), ), batch_size=0,
+                              retrieval_batch_size=50, random_access=random_access)
+        n = 0
+        for z in cart.iterator():
+            x_i, idx_i = z[0]
+            assert np.all(x_i == x_ref[idx_i, :])
+            n += x_i.shape[0]
+        assert n == x_ref.shape[0]
+    # Contiguous batches are views on the memory-mapped arrays:
+    cart = store.checkout(map_fn=lambda x_, obs_: ((x_, ), ), batch_size=0, retrieval_batch_size=20)
+    assert isinstance(next(cart.iterator())[0][0], np.memmap)
+
+
+def test_dao_update():
+    """
+    Test that data sets can be appended, replaced and removed while readers keep a consistent snapshot of the store.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=False)
+    kwargs = {"chunks": (64, adatas[0].n_vars), "compression_kwargs": {}, "dense": False}
+    version = read_catalog_version(store_path)
+    # Reader of snapshot of store before updates, no data set is opened yet:
+    store_before = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    # Append:
+    adata_new = _get_synthetic_adata(n_obs=50, seed=3)
+    append_dao(path_store=store_path, adata=adata_new, **kwargs)
+    with pytest.raises(ValueError):
+        append_dao(path_store=store_path, adata=adata_new, **kwargs)
+    # Replace:
+    adata_replaced = _get_synthetic_adata(n_obs=120, seed=10)
+    adata_replaced.uns["id"] = adatas[0].uns["id"]
+    name_replaced = replace_dao(path_store=store_path, adata=adata_replaced, **kwargs)
+    # Remove:
+    remove_dao(path_store=store_path, dataset_id=adatas[1].uns["id"])
+    assert read_catalog_version(store_path) == version + 3
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    assert sorted(store.indices.keys()) == sorted([adatas[0].uns["id"], adatas[2].uns["id"], adata_new.uns["id"]])
+    assert store.adata_by_key.n_obs(adatas[0].uns["id"]) == 120
+    assert np.all(store.data_by_key[adatas[0].uns["id"]].compute().toarray() == adata_replaced.X.toarray())
+    # Snapshot from before the updates still reads the previous versions of the data sets:
+    assert sorted(store_before.indices.keys()) == sorted([x.uns["id"] for x in adatas])
+    assert np.all(store_before.data_by_key[adatas[0].uns["id"]].compute().toarray() == adatas[0].X.toarray())
+    # Vacuum deletes directories of replaced and removed data sets only:
+    deleted = vacuum_dao(path_store=store_path)
+    assert sorted(deleted) == sorted([adatas[0].uns["id"], adatas[1].uns["id"]])
+    assert os.path.exists(os.path.join(store_path, name_replaced))
+    assert not os.path.exists(os.path.join(store_path, adatas[1].uns["id"]))
+
+
+def test_dao_update_concurrent():
+    """
+    Test that concurrent writers of the same data set do not write into the same directory: One writer wins, the others
+    fail without touching the data of the winner.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=False)
+    kwargs = {"chunks": (64, adatas[0].n_vars), "compression_kwargs": {}, "dense": False}
+    adatas_new = [_get_synthetic_adata(n_obs=40 + 10 * i, seed=20 + i) for i in range(4)]
+    for x in adatas_new:
+        x.uns["id"] = "concurrent"
+
+    def run(fn):
+        with ThreadPoolExecutor(max_workers=len(adatas_new)) as pool:
+            futures = [pool.submit(fn, x) for x in adatas_new]
+        winners = [i for i, x in enumerate(futures) if x.exception() is None]
+        assert len(winners) >= 1
+        assert np.all([isinstance(x.exception(), ValueError) for x in futures if x.exception() is not None])
+        return winners
+
+    winners = run(lambda x: append_dao(path_store=store_path, adata=x, **kwargs))
+    assert len(winners) == 1
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    assert np.all(store.data_by_key["concurrent"].compute().toarray() == adatas_new[winners[0]].X.toarray())
+    # Concurrent replacements are serialised by the catalog, the last successful replacement is in the store:
+    version = read_catalog_version(store_path)
+    winners = run(lambda x: replace_dao(path_store=store_path, adata=x, **kwargs))
+    assert read_catalog_version(store_path) == version + len(winners)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    x = store.data_by_key["concurrent"].compute().toarray()
+    assert np.any([x.shape == adatas_new[i].X.shape and np.all(x == adatas_new[i].X.toarray()) for i in winners])
+    # Staging directories are not left behind:
+    assert not np.any([x.startswith(".staging_") for x in os.listdir(store_path)])
+    remove_dao(path_store=store_path, dataset_id="concurrent")
+    vacuum_dao(path_store=store_path)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_dao_build(processes: int):
+    """
+    Test that stores are built from a directory of h5ad files in parallel and that interrupted builds are resumed.
+    """
+    dir_h5ad = os.path.join(DIR_DATA_STORE_SYNTHETIC, "build_h5ad")
+    store_path = os.path.join(DIR_DATA_STORE_SYNTHETIC, f"build_dao_{processes}")
+    for x in [dir_h5ad, store_path]:
+        if os.path.exists(x):
+            save_delete(x)
+    pathlib.Path(dir_h5ad).mkdir(parents=True, exist_ok=True)
+    adatas = [_get_synthetic_adata(n_obs=50 + 20 * i, seed=20 + i) for i in range(3)]
+    for i, adata in enumerate(adatas):
+        adata.write_h5ad(os.path.join(dir_h5ad, f"dataset_{i}.h5ad"))
+    # Interrupted build: one data set is in the store and another one was partially written.
+    append_dao(path_store=store_path, adata=adatas[0], chunks=(32, adatas[0].n_vars), compression_kwargs={},
+               dense=False)
+    pathlib.Path(os.path.join(store_path, adatas[1].uns["id"], "zarr")).mkdir(parents=True, exist_ok=True)
+    report = build_dao_store(path_store=store_path, source=dir_h5ad, processes=processes, max_memory=1., chunks=32,
+                             dense=False, verbose=False)
+    assert report.set_index("id").loc[[x.uns["id"] for x in adatas], "status"].tolist() == \
+        ["skipped", "written", "written"], report
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    assert sorted(store.indices.keys()) == sorted([x.uns["id"] for x in adatas])
+    for adata in adatas:
+        assert np.all(store.data_by_key[adata.uns["id"]].compute().toarray() == adata.X.toarray())
+    # Building again does not touch the store:
+    version = read_catalog_version(store_path)
+    report = build_dao_store(path_store=store_path, source=dir_h5ad, processes=processes, verbose=False)
+    assert np.all(report["status"].values == "skipped")
+    assert read_catalog_version(store_path) == version
+
+
+@pytest.mark.parametrize("dense", [True, False])
+def test_dao_rechunk(dense: bool):
+    """
+    Test that rechunking a store rewrites .X with the new chunking, compressor and layout but keeps the data.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=dense, n_datasets=2)
+    names = rechunk_store(path_store=store_path, chunks_obs=100,
+                          compression_kwargs=compression_kwargs_from_name("zstd"), dense=not dense, num_workers=2,
+                          max_memory=1.)
+    assert sorted(names.keys()) == sorted([x.uns["id"] for x in adatas])
+    catalog = read_catalog(store_path)
+    for adata in adatas:
+        entry = catalog[names[adata.uns["id"]]]
+        assert entry["chunks_obs"] == 100
+        assert entry["dense"] == (not dense)
+        # Row groups of .obs and of the statistics are aligned to the new chunks:
+        for fn in [path_obs, path_stats]:
+            assert pq.ParquetFile(fn(os.path.join(store_path, names[adata.uns["id"]]))).metadata.num_row_groups == \
+                int(np.ceil(adata.n_obs / 100))
+        x = read_dao(os.path.join(store_path, names[adata.uns["id"]]), use_dask=False).X
+        x = x.toarray() if isinstance(x, scipy.sparse.spmatrix) else x
+        x_ref = adata.X.toarray() if isinstance(adata.X, scipy.sparse.spmatrix) else adata.X
+        assert np.all(x == x_ref)
+    # Data sets that already have the requested chunking are not rewritten:
+    assert rechunk_store(path_store=store_path, chunks_obs=100) == {}
+    chunks_obs, throughput = benchmark_chunks(store=os.path.join(store_path, names[adatas[0].uns["id"]]),
+                                              chunks_obs=(16, 64), batch_size=32, n_batches=2)
+    assert chunks_obs in [16, 64]
+    assert sorted(throughput.keys()) == [16, 64]
+
+
+@pytest.mark.parametrize("dense", [True, False])
+def test_compressor_benchmark(dense: bool):
+    """
+    Test that compressors are benchmarked on a sample of a data set and that a compressor is selected per objective.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=dense, n_datasets=1)
+    np.random.seed(1)
+    state = np.random.get_state()[1].copy()
+    results = benchmark_compressors(x=os.path.join(store_path, adatas[0].uns["id"]), compressors=("none", "zstd"),
+                                    clevels=(1, 5), n_obs=128, batch_size=32)
+    # The benchmark does not reseed numpy's global random state, e.g. before shuffled writes:
+    assert np.all(np.random.get_state()[1] == state)
+    assert results[["compressor", "clevel"]].values.tolist() == [["none", None], ["zstd", 1], ["zstd", 5]]
+    assert np.all(results[["write_s", "size_mb", "random_obs_per_s", "sequential_obs_per_s"]].values > 0)
+    for objective in COMPRESSION_OBJECTIVES:
+        assert select_compressor(results=results, objective=objective) in [("none", None), ("zstd", 1), ("zstd", 5)]
+    assert select_compressor(results=results, objective="size")[0] == "zstd"
+    compression_kwargs = auto_compression_kwargs(x=adatas[0].X, objective="size", compressors=("none", "zstd"),
+                                                 n_obs=128, dense=dense)
+    assert compression_kwargs["compressor"].codec_id == "zstd"
+
+
+@pytest.mark.parametrize("dense", [True, False])
+def test_dao_csc(dense: bool):
+    """
+    Test that queries of a few features are read from the feature-major copy of .X and match queries of .X.
+    """
+    store_path, adatas = _prepare_synthetic_store(dense=dense, csc=True)
+    store = load_store(cache_path=store_path, store_format="dao").stores["Mus musculus"]
+    keys = [x.uns["id"] for x in adatas]
+    store.indices = {keys[0]: np.arange(0, 50), keys[2]: np.arange(100, 300, 2)}
+    var_idx = np.array([1, 2, 3, 17, 40])
+    assert store._route_to_csc(var_idx=var_idx)
+    assert not store._route_to_csc(var_idx=None)
+    x_ref = scipy.sparse.vstack([adatas[0].X[:50], adatas[2].X[100:300:2]])[:, var_idx].toarray()
+    for max_features_csc in [256, 0]:
+        store.max_features_csc = max_features_csc
+        cart = store._get_cart(batch_schedule="base", batch_size=0, map_fn=lambda x_, obs_: (np.asarray(x_),),
+                               obs_idx=None, obs_keys=[], return_dense=True, var=store.var, var_idx=var_idx,
+                               randomized_batch_access=False, random_access=False, retrieval_batch_size=64)
+        x = np.concatenate([x_i[0] for x_i in cart.iterator()], axis=0)
+        assert np.all(x == x_ref)
+
+
+@pytest.mark.parametrize("max_memory", [None, 0.002])
+def test_dao_csc_transpose(max_memory: Union[None, float]):
+    """
+    Test that the feature-major copy of .X is recovered when .X is transposed in blocks of observations and in
+    several groups of features.
+    """
+    x = _get_synthetic_adata(n_obs=300).X
+    f = zarr.group()
+    _write_x_csc(f=f, x=x, chunks_var=4, compression_kwargs={}, max_memory=max_memory, block_size=64)
+    assert np.all(f["X_csc"]["indptr"][...] == x.tocsc().indptr)
+    # Observations are sorted within each feature:
+    assert np.all(f["X_csc"]["indices"][...] == x.tocsc().sorted_indices().indices)
+    assert np.all(_read_csc_features(g=f["X_csc"], var_idx=np.arange(0, x.shape[1])).toarray() == x.toarray())
+
+
+@pytest.mark.parametrize("store_format", ["dao", "memmap"])
+def test_stats(store_format: str):
+    """
+    Test that per-cell statistics are saved by the store writers and are emitted by stores and carts.
+    """
+    store_path = os.path.join(DIR_DATA_STORE_SYNTHETIC, "stats")
+    if os.path.exists(store_path):
+        save_delete(store_path)
+    adatas = [_get_synthetic_adata(n_obs=200 + 100 * i, seed=i) for i in range(2)]
+    for adata in adatas:
+        if store_format == "dao":
+            write_dao(store=os.path.join(store_path, adata.uns["id"]), adata=adata, chunks=(64, adata.n_vars),
+                      compression_kwargs={}, dense=False, catalog=True)
+        else:
+            write_memmap(store=os.path.join(store_path, adata.uns["id"]), adata=adata, block_size=64)
+    # Statistics can be added to data sets that were written without them:
+    os.remove(os.path.join(store_path, adatas[1].uns["id"], "parquet", "stats.parquet"))
+    write_stats(store=os.path.join(store_path, adatas[1].uns["id"]))
+    store = load_store(cache_path=store_path, store_format=store_format).stores["Mus musculus"]
+    store.indices = {adatas[0].uns["id"]: np.arange(0, 100), adatas[1].uns["id"]: np.arange(50, 300)}
+    x_ref = scipy.sparse.vstack([adatas[0].X[:100], adatas[1].X[50:300]])
+    total_counts = np.asarray(x_ref.sum(axis=1)).flatten()
+    assert store.has_stats
+    assert np.allclose(store.stats[STATS_TOTAL_COUNTS].values, total_counts)
+    assert np.all(store.stats[STATS_N_GENES].values == x_ref.getnnz(axis=1))
+    assert np.allclose(store.stats[STATS_SIZE_FACTORS].values, total_counts / 1e4)
+    cart = store.checkout(map_fn=lambda x_, obs_: ((np.asarray(x_), obs_[STATS_TOTAL_COUNTS].values), ),
+                          obs_keys=[STATS_TOTAL_COUNTS], batch_size=0, retrieval_batch_size=64)
+    for z in cart.iterator():
+        x_i, total_counts_i = z[0]
+        assert np.allclose(x_i.sum(axis=1), total_counts_i)
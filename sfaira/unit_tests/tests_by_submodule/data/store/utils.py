@@ -1,9 +1,16 @@
+import anndata
 import numpy as np
+import os
+import pandas as pd
+import pathlib
+import scipy.sparse
 
 from sfaira.data import load_store
+from sfaira.data.store.io.io_dao import write_dao
 from sfaira.versions.genomes.genomes import GenomeContainer
 
 from sfaira.unit_tests.data_for_tests.loaders import RELEASE_MOUSE, PrepareData
+from sfaira.unit_tests.directories import DIR_DATA_STORE_SYNTHETIC, save_delete
 
 
 def _get_cart(store_format, feature_space, map_fn=None, batch_size=1, **kwargs):
@@ -29,3 +36,38 @@ def _get_cart(store_format, feature_space, map_fn=None, batch_size=1, **kwargs):
 
     g = store.checkout(map_fn=map_fn, batch_size=batch_size, **kwargs)
     return g
+
+
+def _get_synthetic_adata(n_obs: int, n_var: int = 50, seed: int = 0) -> anndata.AnnData:
+    """
+    Small count matrix with sfaira-like meta data that does not require data loaders or ontologies.
+    """
+    np.random.seed(seed)
+    x = scipy.sparse.random(n_obs, n_var, density=0.1, format="csr", dtype=np.float32, random_state=seed)
+    x.data = np.round(x.data * 10.) + 1.
+    obs = pd.DataFrame({
+        "cell_type": np.random.choice(["T cell", "B cell"], size=n_obs),
+        "organ": np.random.choice(["lung", "liver"], size=n_obs),
+    }, index=[f"cell_{seed}_{i}" for i in range(n_obs)])
+    var = pd.DataFrame({"symbol": [f"gene_{i}" for i in range(n_var)]}, index=[f"ENSG{i}" for i in range(n_var)])
+    adata = anndata.AnnData(X=x, obs=obs, var=var)
+    adata.uns["id"] = f"dataset_{seed}"
+    adata.uns["organism"] = "Mus musculus"
+    return adata
+
+
+def _prepare_synthetic_store(dense: bool = True, n_datasets: int = 3, chunks: int = 64, **kwargs):
+    """
+    Writes a dao store of synthetic data sets and returns the path to the store and the written data sets.
+    """
+    store_path = DIR_DATA_STORE_SYNTHETIC
+    if os.path.exists(store_path):
+        save_delete(store_path)
+    pathlib.Path(store_path).mkdir(parents=True, exist_ok=True)
+    adatas = []
+    for i in range(n_datasets):
+        adata = _get_synthetic_adata(n_obs=200 + 100 * i, seed=i)
+        write_dao(store=os.path.join(store_path, adata.uns["id"]), adata=adata, chunks=(chunks, adata.n_vars),
+                  compression_kwargs={}, dense=dense, catalog=True, **kwargs)
+        adatas.append(adata)
+    return store_path, adatas